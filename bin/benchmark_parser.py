@@ -0,0 +1,184 @@
+import argparse
+import BaseHTTPServer
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import generate_course
+import parse_course
+
+# Synthetic course sizes, as arguments to generate_course.CourseGenerator.
+SCALES = {
+    'small': dict(chapters=5, sequentials=4, verticals=4, components=4),
+    'medium': dict(chapters=20, sequentials=6, verticals=6, components=6),
+    'large': dict(chapters=40, sequentials=8, verticals=8, components=8),
+}
+
+OPERATIONS = ('get_course', 'upload_course')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark bin/parse_course.py. Records wall time, peak '
+                    'RSS and output size for parsing (get_course) and '
+                    'uploading (upload_course) each course.'
+    )
+    parser.add_argument(
+        'exports', nargs='*',
+        help='Course exports to benchmark. If none are given, synthetic '
+             'courses are generated at each --scale.'
+    )
+    parser.add_argument(
+        '--scale', action='append', choices=sorted(SCALES),
+        help='Size of synthetic course to generate. May be given more than '
+             'once (default: small and medium).'
+    )
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Passed on to the parser (default: 1).')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='Passed on to the parser.')
+    parser.add_argument('--engine', choices=sorted(parse_course.ENGINES),
+                        help='Passed on to the parser.')
+    parser.add_argument('--repeat', type=int, default=3, metavar='N',
+                        help='Run each measurement N times and keep the fastest (default: 3).')
+    parser.add_argument('--json', metavar='FILE',
+                        help='Also write the results to FILE as JSON, for comparing runs.')
+    parser.add_argument('--measure', nargs=2, metavar=('OPERATION', 'EXPORT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        operation, path = args.measure
+        # The result must be the last line of output; upload_course prints too.
+        print json.dumps(measure(operation, path, args.workers, args.cache_dir, args.engine))
+        return
+
+    tmp_dir = None
+    exports = [(os.path.basename(export), export) for export in args.exports]
+    if not exports:
+        tmp_dir = tempfile.mkdtemp()
+        for scale in args.scale or ['small', 'medium']:
+            path = os.path.join(tmp_dir, '{}.tgz'.format(scale))
+            generate_course.CourseGenerator(**SCALES[scale]).write_tarball(path)
+            exports.append((scale, path))
+    try:
+        results = []
+        for name, path in exports:
+            for operation in OPERATIONS:
+                runs = [run_measurement(operation, path, args) for __ in range(args.repeat)]
+                result = min(runs, key=lambda run: run['wall_time'])
+                result.update(export=name, operation=operation)
+                results.append(result)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=4)
+
+
+def run_measurement(operation, path, args):
+    """
+    Run one measurement in a fresh interpreter, so that its peak RSS is not
+    affected by anything that has run before it.
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--measure', operation, path,
+               '--workers', str(args.workers)]
+    if args.cache_dir:
+        command += ['--cache-dir', args.cache_dir]
+    if args.engine:
+        command += ['--engine', args.engine]
+    output = subprocess.check_output(command)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(operation, path, workers, cache_dir, engine):
+    cache = parse_course.ParseCache(cache_dir) if cache_dir else None
+    if operation == 'get_course':
+        start = time.time()
+        parser = parse_course.EdXMLParser(
+            parse_course.open_course_source(path), workers=workers, cache=cache, engine=engine
+        )
+        course = parser.get_course()
+        wall_time = time.time() - start
+        output_size = len(json.dumps(course))
+    elif operation == 'upload_course':
+        parser = parse_course.EdXMLParser(
+            parse_course.open_course_source(path), workers=workers, cache=cache, engine=engine
+        )
+        course = parser.get_course()
+        server = UploadSink()
+        try:
+            start = time.time()
+            parse_course.upload_course(parser, server.url)
+            wall_time = time.time() - start
+        finally:
+            server.stop()
+        output_size = server.bytes_received
+    else:
+        raise ValueError("Unknown operation: {}".format(operation))
+    nodes, problems = parse_course.count_nodes(course)
+    return {
+        'wall_time': wall_time,
+        # ru_maxrss is in kilobytes on Linux. Pool workers count as children.
+        'peak_rss_kb': max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        ),
+        'output_bytes': output_size,
+        'nodes': nodes,
+        'problems': problems,
+    }
+
+
+class UploadSink:
+    """
+    A local HTTP server that accepts course uploads and discards them, so that
+    upload_course can be timed without a real edx-in-canvas server.
+    """
+    def __init__(self):
+        sink = self
+        self.bytes_received = 0
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_POST(self):
+                sink.bytes_received += len(self.rfile.read(int(self.headers['Content-Length'])))
+                self.send_response(201)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def print_results(results):
+    row = "{:<20} {:<14} {:>8} {:>8} {:>10} {:>13} {:>12}"
+    print row.format('Export', 'Operation', 'Nodes', 'Problems', 'Wall (s)', 'Peak RSS (MB)', 'Output (KB)')
+    for result in results:
+        print row.format(
+            result['export'][:20], result['operation'], result['nodes'], result['problems'],
+            '{:.3f}'.format(result['wall_time']),
+            '{:.1f}'.format(result['peak_rss_kb'] / 1024.0),
+            '{:.1f}'.format(result['output_bytes'] / 1024.0)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import io
+import os
+import random
+import tarfile
+import time
+
+# Response types that synthetic problems are built from.
+RESPONSE_TYPES = (
+    'choiceresponse',
+    'multiplechoiceresponse',
+    'numericalresponse',
+    'optionresponse',
+    'stringresponse',
+)
+
+# Relative frequency of each kind of component in a generated unit.
+COMPONENT_WEIGHTS = (
+    ('problem', 4),
+    ('html', 3),
+    ('video', 2),
+    ('discussion', 1),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic edX course export (OLX) for testing '
+                    'and benchmarking bin/parse_course.py.'
+    )
+    parser.add_argument(
+        'output',
+        help='The .tgz file to write, or a directory to write the export into '
+             'if it ends with "/".'
+    )
+    parser.add_argument('--chapters', type=int, default=10, metavar='N')
+    parser.add_argument('--sequentials', type=int, default=5, metavar='N',
+                        help='Sequentials per chapter (default: 5).')
+    parser.add_argument('--verticals', type=int, default=5, metavar='N',
+                        help='Verticals per sequential (default: 5).')
+    parser.add_argument('--components', type=int, default=5, metavar='N',
+                        help='Components per vertical (default: 5).')
+    parser.add_argument('--problem-size', type=int, nargs=2, default=(1, 20), metavar=('MIN', 'MAX'),
+                        help='Range of problem file sizes, in KB (default: 1 20).')
+    parser.add_argument('--static-files', type=int, default=0, metavar='N',
+                        help='Number of static asset files to include (default: 0).')
+    parser.add_argument('--static-size', type=int, default=100, metavar='KB',
+                        help='Size of each static asset file, in KB (default: 100).')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the random number generator (default: 0).')
+    args = parser.parse_args()
+
+    generator = CourseGenerator(
+        chapters=args.chapters, sequentials=args.sequentials,
+        verticals=args.verticals, components=args.components,
+        problem_size=args.problem_size, static_files=args.static_files,
+        static_size=args.static_size, seed=args.seed
+    )
+    if args.output.endswith('/'):
+        generator.write_directory(args.output)
+    else:
+        generator.write_tarball(args.output)
+    print "Generated {} files ({} components)".format(generator.file_count, generator.component_count)
+
+
+class CourseGenerator:
+    """
+    Generates an edX course export with a configurable number of chapters,
+    sequentials, verticals and components. Problems are written to their own
+    files (with a random number of responses and a random amount of HTML
+    padding); other components are inline in their verticals, as they are in
+    real exports.
+    """
+    def __init__(self, chapters=10, sequentials=5, verticals=5, components=5,
+                 problem_size=(1, 20), static_files=0, static_size=100,
+                 org='SyntheticX', course='BENCH101', run='2016', seed=0):
+        self.chapters = chapters
+        self.sequentials = sequentials
+        self.verticals = verticals
+        self.components = components
+        self.problem_size = problem_size
+        self.static_files = static_files
+        self.static_size = static_size
+        self.org = org
+        self.course = course
+        self.run = run
+        self.random = random.Random(seed)
+        self.file_count = 0
+        self.component_count = 0
+
+    def files(self):
+        """
+        Yield (path, content) for each file in the export, with paths relative
+        to the root directory of the export.
+        """
+        self.file_count = 0
+        self.component_count = 0
+        for path, content in self._files():
+            self.file_count += 1
+            yield path, content
+
+    def write_tarball(self, path, root='course'):
+        archive = tarfile.open(path, 'w:gz')
+        try:
+            for file_path, content in self.files():
+                info = tarfile.TarInfo('{}/{}'.format(root, file_path))
+                info.size = len(content)
+                info.mtime = time.time()
+                archive.addfile(info, io.BytesIO(content))
+        finally:
+            archive.close()
+
+    def write_directory(self, directory):
+        for file_path, content in self.files():
+            path = os.path.join(directory, file_path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as output:
+                output.write(content)
+
+    def _files(self):
+        yield 'course.xml', '<course url_name="{}" org="{}" course="{}"/>\n'.format(
+            self.run, self.org, self.course
+        )
+        chapter_ids = ['chapter{}'.format(c) for c in range(self.chapters)]
+        yield 'course/{}.xml'.format(self.run), self._element(
+            'course', {'display_name': 'Synthetic Course {}'.format(self.course)},
+            [self._reference('chapter', chapter_id) for chapter_id in chapter_ids] +
+            ['<wiki slug="{}.{}.{}"/>'.format(self.org, self.course, self.run)]
+        )
+        for c, chapter_id in enumerate(chapter_ids):
+            sequential_ids = ['{}_seq{}'.format(chapter_id, s) for s in range(self.sequentials)]
+            yield 'chapter/{}.xml'.format(chapter_id), self._element(
+                'chapter', {'display_name': 'Chapter {}'.format(c + 1)},
+                [self._reference('sequential', sequential_id) for sequential_id in sequential_ids]
+            )
+            for s, sequential_id in enumerate(sequential_ids):
+                vertical_ids = ['{}_vert{}'.format(sequential_id, v) for v in range(self.verticals)]
+                yield 'sequential/{}.xml'.format(sequential_id), self._element(
+                    'sequential', {'display_name': 'Subsection {}.{}'.format(c + 1, s + 1), 'graded': 'true'},
+                    [self._reference('vertical', vertical_id) for vertical_id in vertical_ids]
+                )
+                for v, vertical_id in enumerate(vertical_ids):
+                    children = []
+                    for n in range(self.components):
+                        component_id = '{}_{}'.format(vertical_id, n)
+                        self.component_count += 1
+                        kind = self._component_kind()
+                        if kind == 'problem':
+                            children.append(self._reference('problem', component_id))
+                            yield 'problem/{}.xml'.format(component_id), self._problem(component_id)
+                        else:
+                            children.append(self._element(kind, {
+                                'url_name': component_id,
+                                'display_name': '{} {}'.format(kind.title(), n + 1)
+                            }))
+                    yield 'vertical/{}.xml'.format(vertical_id), self._element(
+                        'vertical', {'display_name': 'Unit {}.{}.{}'.format(c + 1, s + 1, v + 1)}, children
+                    )
+        for n in range(self.static_files):
+            yield 'static/asset{}.bin'.format(n), os.urandom(self.static_size * 1024)
+
+    def _component_kind(self):
+        total = sum(weight for __, weight in COMPONENT_WEIGHTS)
+        choice = self.random.randint(1, total)
+        for kind, weight in COMPONENT_WEIGHTS:
+            choice -= weight
+            if choice <= 0:
+                return kind
+
+    def _problem(self, problem_id):
+        responses = [
+            '<{0}><p>Question {1}</p><textline/></{0}>'.format(self.random.choice(RESPONSE_TYPES), n)
+            for n in range(self.random.randint(0, 4))
+        ]
+        size = self.random.randint(*self.problem_size) * 1024
+        padding = []
+        while sum(len(p) for p in padding) < size:
+            padding.append('<p>Explanatory text for {}, paragraph {}.</p>'.format(problem_id, len(padding)))
+        return self._element(
+            'problem', {'display_name': 'Problem {}'.format(problem_id), 'markdown': 'null'},
+            ['<div class="explanation">{}</div>'.format(''.join(padding))] + responses
+        )
+
+    def _reference(self, tag, url_name):
+        return '<{} url_name="{}"/>'.format(tag, url_name)
+
+    def _element(self, tag, attributes, children=()):
+        attrs = ''.join(' {}="{}"'.format(name, value) for name, value in sorted(attributes.items()))
+        return '<{0}{1}>\n{2}\n</{0}>\n'.format(tag, attrs, '\n'.join(children))
+
+
+if __name__ == '__main__':
+    main()
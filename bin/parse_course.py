@@ -1,26 +1,60 @@
 import argparse
+import cPickle
+import glob
+import hashlib
+import io
 import json
+import multiprocessing
 import os
 import requests
+import sys
+import tarfile
 import tempfile
+import time
+import zlib
 from xml.etree import ElementTree
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# How long to wait for the server to store an uploaded course, in seconds.
+JOB_TIMEOUT = 30 * 60
+
+# Reported for an upload that was accepted when the server will not say how
+# storing it went.
+STATUS_UNAVAILABLE = 'queued, status unavailable'
+
+# The XML libraries that the parser can use, by name.
+ENGINES = {'etree': ElementTree}
+if lxml_etree is not None:
+    ENGINES['lxml'] = lxml_etree
+
 def main():
-    parser = argparse.ArgumentParser(description='Parse and upload an exported edX course.')
+    if sys.argv[1:2] == ['batch']:
+        return batch_main(sys.argv[2:])
+    parser = argparse.ArgumentParser(
+        description='Parse and upload an exported edX course.',
+        epilog='Use "%(prog)s batch" to parse and upload several courses at once.'
+    )
     parser.add_argument(
-        'tar_file', type=argparse.FileType('r'),
-        help='The .tgz file containing the exported edX course.'
+        'tar_file',
+        help='The .tgz file containing the exported edX course, "-" to read '
+             'it from stdin, or the directory of an already-extracted export.'
     )
     parser.add_argument(
         'url_base',
         help='Base of the server URL (eg "http://example.com/").'
     )
+    parser.add_argument(
+        '--workers', type=int, default=1, metavar='N',
+        help='Number of processes to parse chapters with (default: 1).'
+    )
+    add_parser_arguments(parser)
     args = parser.parse_args()
 
-    tmp_dir = tempfile.mkdtemp()
-    os.system("tar -zxf {} -C {}".format(args.tar_file.name, tmp_dir))
-    root_dir = "{}/{}".format(tmp_dir, os.listdir(tmp_dir)[0])
-    parser = EdXMLParser(root_dir)
+    parser = create_parser(open_course_source(args.tar_file), args, workers=args.workers)
     upload_course(parser, args.url_base)
     settings = """
     Edx course settings:
@@ -32,6 +66,158 @@ def main():
     print settings
 
 
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='{} batch'.format(os.path.basename(sys.argv[0])),
+        description='Parse and upload several exported edX courses. Courses '
+                    'are parsed concurrently and uploaded as they are ready; '
+                    'a course that fails does not stop the others.'
+    )
+    parser.add_argument(
+        'exports', nargs='+',
+        help='The .tgz files to upload, directories containing them, or glob '
+             'patterns matching them.'
+    )
+    parser.add_argument(
+        'url_base',
+        help='Base of the server URL (eg "http://example.com/").'
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=multiprocessing.cpu_count(), metavar='N',
+        help='Number of courses to parse at once (default: one per CPU).'
+    )
+    add_parser_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = find_exports(args.exports)
+    session = requests.Session()
+    results = []
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        for result in pool.imap_unordered(_parse_export, [(path, args) for path in paths]):
+            if not result['error']:
+                start = time.time()
+                try:
+                    result['job'] = post_course(result.pop('parser'), args.url_base, session)
+                except (UploadError, requests.RequestException) as e:
+                    result['error'] = 'upload failed: {}'.format(e)
+                result['upload_time'] = time.time() - start
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    # The server stores the courses in the background, so wait for them all
+    # once they have all been sent.
+    for result in results:
+        if result.get('job') is not None:
+            try:
+                if wait_for_job(result['job'], args.url_base, session) is None:
+                    result['note'] = STATUS_UNAVAILABLE
+            except (UploadError, requests.RequestException) as e:
+                result['error'] = 'upload failed: {}'.format(e)
+
+    results.sort(key=lambda result: paths.index(result['path']))
+    print_batch_summary(results)
+    if any(result['error'] for result in results):
+        sys.exit(1)
+
+
+def add_parser_arguments(parser):
+    parser.add_argument(
+        '--response-tag', action='append', default=[], metavar='TAG',
+        help='An additional element that counts as a scored response in a '
+             'problem (e.g. for a custom XBlock). May be given more than once.'
+    )
+    parser.add_argument(
+        '--cache-dir', metavar='DIR',
+        help='Directory in which to keep parsed XML files between runs. Files '
+             'whose content has not changed since a previous run are not '
+             're-parsed.'
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(ENGINES),
+        help='XML library to parse with (default: lxml if it is installed, '
+             'otherwise the standard library\'s ElementTree).'
+    )
+
+
+def create_parser(source, args, workers=1):
+    return EdXMLParser(
+        source, workers=workers,
+        response_tags=RESPONSE_TAGS.union(args.response_tag),
+        cache=ParseCache(args.cache_dir) if args.cache_dir else None,
+        engine=args.engine
+    )
+
+
+def find_exports(patterns):
+    """
+    Expand the export arguments of a batch run into a list of files.
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.tgz')) + glob.glob(os.path.join(pattern, '*.tar.gz'))
+        else:
+            matches = glob.glob(pattern) or [pattern]
+        paths.extend(path for path in sorted(matches) if path not in paths)
+    return paths
+
+
+def _parse_export(args):
+    """
+    Parse one course of a batch run in a pool worker. Errors are returned
+    rather than raised, so that one bad export does not abort the batch.
+    """
+    path, options = args
+    result = {'path': path, 'error': None, 'title': None, 'parse_time': None, 'upload_time': None}
+    start = time.time()
+    try:
+        parser = create_parser(open_course_source(path), options)
+        course = parser.get_course()
+        # The source holds the course files, which the parent doesn't need.
+        parser.source = None
+        result['parser'] = parser
+        result['title'] = course.get('display_name')
+        result['nodes'], result['problems'] = count_nodes(course)
+        result['score'] = course['score']
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['parse_time'] = time.time() - start
+    return result
+
+
+def count_nodes(node):
+    """
+    Return the number of nodes, and the number of problems, in a course tree.
+    """
+    nodes = 1
+    problems = 1 if node['type'] == 'problem' else 0
+    for child in node.get('children', []):
+        child_nodes, child_problems = count_nodes(child)
+        nodes += child_nodes
+        problems += child_problems
+    return nodes, problems
+
+
+def print_batch_summary(results):
+    row = "{:<40} {:>7} {:>8} {:>6} {:>9} {:>10}  {}"
+    print row.format('Course', 'Nodes', 'Problems', 'Score', 'Parse (s)', 'Upload (s)', 'Result')
+    for result in results:
+        print row.format(
+            (result['title'] or os.path.basename(result['path']))[:40].encode('utf-8'),
+            result.get('nodes', '-'),
+            result.get('problems', '-'),
+            result.get('score', '-'),
+            '{:.2f}'.format(result['parse_time']) if result['parse_time'] is not None else '-',
+            '{:.2f}'.format(result['upload_time']) if result['upload_time'] is not None else '-',
+            result['error'] or result.get('note') or 'OK'
+        )
+    failures = len([result for result in results if result['error']])
+    print "{} courses, {} uploaded, {} failed".format(len(results), len(results) - failures, failures)
+
+
 def check_scores(node):
     if 'children' not in node:
         return
@@ -40,28 +226,238 @@ def check_scores(node):
             print "No score in {}".format(child)
         check_scores(child)
 
-def upload_course(parser, url_base):
+class UploadError(Exception):
+    pass
+
+def upload_course(parser, url_base, session=requests):
+    """
+    Upload a parsed course, and wait for the server to finish storing it.
+    Returns True if the course was stored successfully.
+    """
+    title = parser.get_course()['display_name']
+    try:
+        job = post_course(parser, url_base, session)
+        if job is not None and wait_for_job(job, url_base, session) is None:
+            print "Uploaded course {}: {}".format(title, STATUS_UNAVAILABLE)
+            return True
+    except UploadError as e:
+        print "Error uploading {}: {}".format(title, e)
+        return False
+    print "Successfully uploaded course {}".format(title)
+    return True
+
+def post_course(parser, url_base, session=requests):
+    """
+    Send a parsed course to the server. The server stores courses in the
+    background; this returns the job that is storing the course (its job_id
+    and token), or None if the server stored it straight away (as older
+    servers do). Raises UploadError if the upload is rejected.
+    """
     data = dict(
         title=parser.get_course()['display_name'],
         org=parser.org,
         course=parser.course,
         run=parser.url_name,
         key_version=1,
-        body=json.dumps(parser.get_course())
+        body=parser.get_course()
     )
     url = "{}/edx2canvas/edx_course/new".format(url_base)
-    headers = {'Content-Type': 'application/json'}
-    r = requests.post(url, data=json.dumps(data), headers=headers)
+    headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    r = session.post(url, data=gzip_json(data), headers=headers)
+    if r.status_code == 202:
+        return r.json()
     if r.status_code == 201:
-        print "Successfully uploaded course {}".format(data['title'])
-    else:
-        print "Error uploading {}: {}".format(data['title'], r)
+        return None
+    raise UploadError(r)
 
-class EdXMLParser:
+def wait_for_job(job, url_base, session=requests, timeout=JOB_TIMEOUT):
+    """
+    Poll the status of an upload job, as returned by post_course, until it
+    finishes, and return its final status. Returns None if the server will not
+    report the status (as it may not without a token for the job). Raises
+    UploadError if the job fails or does not finish within timeout seconds.
+    """
+    url = "{}/edx2canvas/edx_course/job".format(url_base)
+    job_id = job['job_id']
+    params = {'job_id': job_id, 'token': job.get('token', '')}
+    deadline = time.time() + timeout
+    interval = 0.5
+    while True:
+        r = session.get(url, params=params)
+        if r.status_code == 403:
+            return None
+        if r.status_code != 200:
+            raise UploadError(r)
+        job = r.json()
+        if job['status'] == 'succeeded':
+            return job
+        if job['status'] == 'failed':
+            raise UploadError(job['error'])
+        if time.time() > deadline:
+            raise UploadError("timed out waiting for job {}".format(job_id))
+        time.sleep(interval)
+        interval = min(interval * 2, 5)
+
+def gzip_json(data):
+    """
+    Encode data as gzip-compressed JSON. The JSON is compressed as it is
+    generated, so the uncompressed text is never held in memory in full.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    chunks = [compressor.compress(chunk) for chunk in json.JSONEncoder().iterencode(data)]
+    chunks.append(compressor.flush())
+    return ''.join(chunks)
+
+def open_course_source(path):
+    """
+    Return a source for the course export at path. A tarball (or "-" for a
+    tarball on stdin) is read straight from the archive; a directory is taken
+    to be an export that has already been extracted.
+    """
+    if path == '-':
+        return TarballSource(sys.stdin)
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, 'course.xml')):
+            path = os.path.join(path, os.listdir(path)[0])
+        return DirectorySource(path)
+    with open(path, 'rb') as tar_file:
+        return TarballSource(tar_file)
+
+
+class DirectorySource:
+    """
+    Reads course XML files from an extracted export directory.
+    """
     def __init__(self, directory):
-        self.parsed_course = None
         self.directory = directory
 
+    def open(self, path):
+        return open(os.path.join(self.directory, path), 'rb')
+
+
+class TarballSource:
+    """
+    Reads course XML files straight from an exported .tgz file.
+
+    The archive is read in a single streaming pass, so it does not need to be
+    seekable. Only the XML files that make up the course structure are kept,
+    indexed by their path relative to the root of the export; static assets and
+    everything else are skipped without being written anywhere.
+    """
+    STRUCTURE_DIRS = ('course', 'chapter', 'sequential', 'vertical', 'problem')
+
+    def __init__(self, fileobj):
+        self.files = {}
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+        for member in archive:
+            path = self._relative_path(member.name)
+            if member.isfile() and self._is_structure_file(path):
+                self.files[path] = archive.extractfile(member).read()
+            # A streaming TarFile remembers every member it has seen.
+            archive.members = []
+        archive.close()
+
+    def open(self, path):
+        try:
+            return io.BytesIO(self.files[path])
+        except KeyError:
+            raise IOError("No such file in course export: {}".format(path))
+
+    def _relative_path(self, name):
+        parts = [part for part in name.split('/') if part not in ('', '.')]
+        return '/'.join(parts[1:])
+
+    def _is_structure_file(self, path):
+        if path == 'course.xml':
+            return True
+        directory, __, file_name = path.partition('/')
+        return directory in self.STRUCTURE_DIRS and file_name.endswith('.xml') and '/' not in file_name
+
+
+class ParseCache:
+    """
+    A persistent cache of parsed course XML files, keyed by a hash of each
+    file's content. Entries are written atomically, one file per key, so the
+    cache can be shared by concurrent parser processes.
+    """
+    # Bump this whenever the format of the cached entries changes.
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def key(self, data, *context):
+        digest = hashlib.sha1("{}\0".format(self.VERSION))
+        for value in context:
+            digest.update("{}\0".format(value))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as cache_file:
+                return cPickle.load(cache_file)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as cache_file:
+            cPickle.dump(value, cache_file, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+
+# Problem elements that each count for one point.
+RESPONSE_TAGS = frozenset([
+    'coderesponse',
+    'choiceresponse',
+    'customresponse',
+    'formularesponse',
+    'imageresponse',
+    'jsmeresponse',
+    'multiplechoiceresponse',
+    'numericalresponse',
+    'optionresponse',
+    'schematicresponse',
+    'stringresponse',
+])
+
+# The parser that pool workers use. It is set before the pool is started, so
+# forked workers inherit it (along with any course files it holds in memory).
+_pool_parser = None
+
+
+def _parse_element_in_pool(args):
+    tag, attrib, parent_id = args
+    return _pool_parser._parse_child(ElementTree.Element(tag, attrib), parent_id)
+
+
+class EdXMLParser:
+    # Elements that refer to a file of their own (in a directory named after
+    # the tag), which in turn lists the element's children.
+    STRUCTURE_TAGS = frozenset(['chapter', 'sequential', 'vertical'])
+
+    def __init__(self, source, workers=1, response_tags=RESPONSE_TAGS, cache=None, engine=None):
+        self.parsed_course = None
+        self.workers = workers
+        self.response_tags = response_tags
+        self.cache = cache
+        self.engine = engine or ('lxml' if 'lxml' in ENGINES else 'etree')
+        if isinstance(source, basestring):
+            source = DirectorySource(source)
+        self.source = source
+
     def get_course(self):
         if not self.parsed_course:
             self._parse_course()
@@ -75,25 +471,132 @@ class EdXMLParser:
             content[attr] = root.attrib.get(attr)
         return content
 
-    def _parse_structure(self, label, instance_id, usage_id, parent_id=None):
-        file_name = "{}/{}/{}.xml".format(self.directory, label, instance_id)
-        root = ElementTree.parse(file_name).getroot()
+    def _open_structure(self, label, instance_id, usage_id, parent_id=None):
+        """
+        Read the file for a structure element. Returns the element's content
+        (without children) and the list of its child elements.
+        """
+        root = self._read_structure("{}/{}.xml".format(label, instance_id))
         content = self._populate_attributes(root, parent_id)
         if instance_id:
             content['id'] = instance_id
             content['usage_id'] = usage_id
+        # lxml includes comments and processing instructions as children.
+        return content, [child for child in root if isinstance(child.tag, basestring)]
 
-        for child in root:
-            try:
-                child_parser = getattr(EdXMLParser, '_parse_' + child.tag)
-            except AttributeError:
-                child_parser = getattr(EdXMLParser, '_parse_leaf')
+    def _parse_structure(self, label, instance_id, usage_id, parent_id=None):
+        """
+        Parse a structure element and everything below it. The tree is walked
+        depth first with an explicit stack rather than by recursion; each stack
+        frame holds a node's content, its instance ID and an iterator over the
+        child elements that are still to be parsed.
+        """
+        content, children = self._open_structure(label, instance_id, usage_id, parent_id)
+        stack = [(content, instance_id, iter(children))]
+        while stack:
+            content, instance_id, children = stack[-1]
+            element = next(children, None)
+            if element is None:
+                stack.pop()
+                if stack:
+                    parent = stack[-1][0]
+                    parent['score'] = parent['score'] + content['score']
+                continue
+            tag = element.tag
+            if tag in self.STRUCTURE_TAGS:
+                child_instance_id = self._get_instance_id(element)
+                child, grandchildren = self._open_structure(
+                    tag, child_instance_id,
+                    self._calculate_usage_id(element.attrib.get('url_name'), tag),
+                    instance_id
+                )
+                stack.append((child, child_instance_id, iter(grandchildren)))
+            else:
+                child = self.CHILD_PARSERS.get(tag, EdXMLParser._parse_leaf)(self, element, instance_id, tag)
+                content['score'] = content['score'] + child['score']
             content['children'] = content.get('children', [])
-            child = child_parser(self, child, instance_id, child.tag)
             content['children'].append(child)
-            content['score'] = content['score'] + child['score']
         return content
 
+    def _parse_child(self, element, parent_id):
+        child_parser = self.CHILD_PARSERS.get(element.tag, EdXMLParser._parse_leaf)
+        return child_parser(self, element, parent_id, element.tag)
+
+    def _parse_children_in_pool(self, elements, parent_id):
+        """
+        Parse the top-level children of the course (i.e. the chapters) in a pool
+        of worker processes. Each chapter subtree is independent of the others,
+        and the results come back in the same order as the elements.
+        """
+        global _pool_parser
+        _pool_parser = self
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            return pool.map(
+                _parse_element_in_pool,
+                [(element.tag, dict(element.attrib), parent_id) for element in elements],
+                chunksize=1
+            )
+        finally:
+            pool.close()
+            pool.join()
+            _pool_parser = None
+
+    def _parse_xml(self, path):
+        xml_file = self.source.open(path)
+        try:
+            return ENGINES[self.engine].parse(xml_file).getroot()
+        finally:
+            xml_file.close()
+
+    def _read_file(self, path):
+        xml_file = self.source.open(path)
+        try:
+            return xml_file.read()
+        finally:
+            xml_file.close()
+
+    def _read_structure(self, path):
+        """
+        Return the root element of a course structure file. When the parser has
+        a cache, only the attributes of the root and of its children are kept
+        (which is all that the structure parsers look at), and those are reused
+        for as long as the file's content is unchanged.
+        """
+        if self.cache is None:
+            return self._parse_xml(path)
+        data = self._read_file(path)
+        key = self.cache.key(data, 'structure')
+        entry = self.cache.get(key)
+        if entry is None:
+            root = ENGINES[self.engine].fromstring(data)
+            entry = (root.tag, dict(root.attrib), [
+                (child.tag, dict(child.attrib)) for child in root if isinstance(child.tag, basestring)
+            ])
+            self.cache.put(key, entry)
+        tag, attrib, children = entry
+        root = ElementTree.Element(tag, attrib)
+        for child_tag, child_attrib in children:
+            ElementTree.SubElement(root, child_tag, child_attrib)
+        return root
+
+    def _read_problem(self, path):
+        """
+        Return the root element and score of a problem file, from the cache if
+        the file's content (and the set of response tags) is unchanged.
+        """
+        if self.cache is None:
+            return self._scan_problem(self.source.open(path))
+        data = self._read_file(path)
+        key = self.cache.key(data, 'problem', *sorted(self.response_tags))
+        entry = self.cache.get(key)
+        if entry is None:
+            root, score = self._scan_problem(io.BytesIO(data))
+            entry = (root.tag, dict(root.attrib), score)
+            self.cache.put(key, entry)
+        tag, attrib, score = entry
+        return ElementTree.Element(tag, attrib), score
+
     def _calculate_usage_id(self, instance_id, label):
         # This method returns a usage ID for a split-mongo installation. For
         # the mongo DB in the Devstack or Full Stack installations, use:
@@ -107,8 +610,7 @@ class EdXMLParser:
         )
 
     def _parse_course_xml(self):
-        file_name = "{}/course.xml".format(self.directory)
-        root = ElementTree.parse(file_name).getroot()
+        root = self._parse_xml("course.xml")
         self.url_name = root.attrib.get('url_name')
         self.course = root.attrib.get('course')
         self.org = root.attrib.get('org')
@@ -116,19 +618,17 @@ class EdXMLParser:
     def _parse_course(self):
         self._parse_course_xml()
         usage_id = self._calculate_usage_id(self.url_name, 'course')
-        self.parsed_course = self._parse_structure('course', self.url_name, usage_id)
-
-    def _parse_chapter(self, element, parent_id, tag):
-        instance_id = self._get_instance_id(element)
-        usage_id = self._calculate_usage_id(element.attrib.get('url_name'), tag)
-        return self._parse_structure(tag, instance_id=instance_id, usage_id=usage_id, parent_id=parent_id)
-
-    def _parse_sequential(self, element, parent_id, tag):
-        instance_id = self._get_instance_id(element)
-        usage_id = self._calculate_usage_id(element.attrib.get('url_name'), tag)
-        return self._parse_structure(tag, instance_id=instance_id, usage_id=usage_id, parent_id=parent_id)
+        if self.workers > 1:
+            content, children = self._open_structure('course', self.url_name, usage_id)
+            for child in self._parse_children_in_pool(children, self.url_name):
+                content['children'] = content.get('children', [])
+                content['children'].append(child)
+                content['score'] = content['score'] + child['score']
+            self.parsed_course = content
+        else:
+            self.parsed_course = self._parse_structure('course', self.url_name, usage_id)
 
-    def _parse_vertical(self, element, parent_id, tag):
+    def _parse_reference(self, element, parent_id, tag):
         instance_id = self._get_instance_id(element)
         usage_id = self._calculate_usage_id(element.attrib.get('url_name'), tag)
         return self._parse_structure(tag, instance_id=instance_id, usage_id=usage_id, parent_id=parent_id)
@@ -140,26 +640,41 @@ class EdXMLParser:
         else:
             instance_id = self._get_instance_id(element)
             # instance_id = element.attrib.get('url_name')
-            file_name = "{}/problem/{}.xml".format(self.directory, instance_id)
-            root = ElementTree.parse(file_name).getroot()
+            root, score = self._read_problem("problem/{}.xml".format(instance_id))
             content = self._populate_attributes(root, parent_id)
             content['id'] = instance_id
             content['usage_id'] = self._calculate_usage_id(content['id'], tag)
-            score = 0
-            score += len(root.findall('.//coderesponse'))
-            score += len(root.findall('.//choiceresponse'))
-            score += len(root.findall('.//customresponse'))
-            score += len(root.findall('.//formularesponse'))
-            score += len(root.findall('.//imageresponse'))
-            score += len(root.findall('.//jsmeresponse'))
-            score += len(root.findall('.//multiplechoiceresponse'))
-            score += len(root.findall('.//numericalresponse'))
-            score += len(root.findall('.//optionresponse'))
-            score += len(root.findall('.//schematicresponse'))
-            score += len(root.findall('.//stringresponse'))
             content['score'] = score if score else 1
         return content
 
+    def _scan_problem(self, xml_file):
+        """
+        Read a problem file in a single streaming pass. Returns the root element
+        (with its attributes but none of its content) and the number of scored
+        responses below it. Elements are discarded as soon as they have been
+        counted, so large problems are never held in memory in full.
+        """
+        try:
+            parse_root = root = None
+            score = 0
+            depth = 0
+            for event, element in ENGINES[self.engine].iterparse(xml_file, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        parse_root = element
+                        root = ElementTree.Element(element.tag, dict(element.attrib))
+                    elif element.tag in self.response_tags:
+                        score += 1
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 1:
+                        # Drop each top-level child once it has been read.
+                        parse_root.clear()
+            return root, score
+        finally:
+            xml_file.close()
+
     def _parse_leaf(self, element, parent_id, tag):
         content = self._populate_attributes(element, parent_id)
         content['id'] = self._get_instance_id(element)
@@ -172,4 +687,13 @@ class EdXMLParser:
             instance_id = instance_id.replace('.', '_')
         return instance_id
 
-main()
+    # Parsers for child elements, by tag. Anything else is parsed as a leaf.
+    CHILD_PARSERS = {
+        'chapter': _parse_reference,
+        'sequential': _parse_reference,
+        'vertical': _parse_reference,
+        'problem': _parse_problem,
+    }
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Filling a Canvas course with the content of an edX course in the background.
+
+populate.start_populate_job plans the modules and items to create from the
+index of the edX course (see course_index.py), and queues them as a
+PopulateJob. A worker (the process_jobs management command) then creates the
+modules one at a time, and their items with populate.create_module_items.
+Each module and item is marked as created as soon as it has been, so a job
+whose worker died part of the way through is resumed, when it is claimed
+again, from where it stopped.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+import canvas_api
+import course_index
+import module_cache
+import populate
+from models import CanvasApiAuthorization, EdxCourseNode, PopulateJob, PopulateJobItem
+
+log = logging.getLogger("edx2canvas.log")
+
+# The depth in the course structure of the nodes that become module items at
+# each granularity. Chapters, at depth 1, become modules.
+LEAF_DEPTHS = {
+    PopulateJob.SUBSECTION: 2,
+    PopulateJob.UNIT: 3,
+    PopulateJob.COMPONENT: 4,
+}
+
+# Content that is not added to Canvas.
+SKIPPED_TYPES = ('discussion',)
+
+
+def queue_populate(edx_course, canvas_course_id, lti_user_id, granularity, create_assignments):
+    """
+    Plan the modules and items that fill a Canvas course with an edX course,
+    and queue them to be created. Returns the job.
+    """
+    course_index.ensure_index(edx_course)
+    with transaction.atomic():
+        job = PopulateJob.objects.create(
+            edx_course=edx_course, canvas_course_id=canvas_course_id, lti_user_id=lti_user_id,
+            granularity=granularity, create_assignments=create_assignments
+        )
+        job.item_count = _plan(job)
+        job.save(update_fields=['item_count'])
+    return job
+
+
+def _plan(job):
+    """
+    Create the PopulateJobItems of a job: a module for each chapter of the
+    course, with an item for each of its nodes at the granularity of the job.
+    Returns the number of them.
+    """
+    leaf_depth = LEAF_DEPTHS[job.granularity]
+    nodes = EdxCourseNode.objects.filter(
+        edx_course=job.edx_course, depth__in=(1, leaf_depth)
+    ).order_by('index')
+    chapters = []
+    for node in nodes:
+        if node.depth == 1:
+            chapters.append((node, []))
+        elif chapters and node.node_type not in SKIPPED_TYPES:
+            chapters[-1][1].append(node)
+
+    index = 0
+    for module_position, (chapter, leaves) in enumerate(chapters, 1):
+        index += 1
+        module = PopulateJobItem.objects.create(
+            job=job, index=index, position=module_position,
+            title=chapter.title()[:255], usage_id=chapter.usage_id
+        )
+        items = []
+        for position, leaf in enumerate(leaves, 1):
+            index += 1
+            items.append(PopulateJobItem(
+                job=job, index=index, module=module, position=position,
+                title=leaf.title()[:255], usage_id=leaf.usage_id,
+                graded=job.create_assignments and leaf.score != 0, points=leaf.score
+            ))
+        PopulateJobItem.objects.bulk_create(items, batch_size=course_index.BATCH_SIZE)
+    return index
+
+
+def run_job(job):
+    """
+    Create the modules and items of a claimed job that have not been created
+    yet, and record the outcome on the job.
+    """
+    try:
+        failed = populate_course(job)
+    except Exception as e:
+        log.exception("Failed to populate Canvas course {} (job {})".format(job.canvas_course_id, job.id))
+        job.status = PopulateJob.FAILED
+        job.error = "{}: {}".format(type(e).__name__, e)
+    else:
+        job.status = PopulateJob.SUCCEEDED
+        if failed:
+            job.error = "{} items could not be created".format(failed)
+    job.finished = timezone.now()
+    job.save()
+
+
+def populate_course(job):
+    """
+    Create whatever a job has left to create, and return the number of its
+    items that could not be created.
+    """
+    canvas_auth = CanvasApiAuthorization.objects.get(lti_user_id=job.lti_user_id)
+    items = list(job.items.order_by('index'))
+    modules = dict((item.id, item) for item in items if item.module_id is None)
+
+    # Modules are created in order, so that each ends up at its position.
+    for module in sorted(modules.values(), key=lambda module: module.index):
+        if module.canvas_id is None:
+            created = canvas_api.create_canvas_module(
+                canvas_auth, job.canvas_course_id, module.title, module.position
+            )
+            module.canvas_id = created['id']
+            _checkpoint(job, module)
+
+    pending = [
+        item for item in items
+        if item.module_id is not None and item.canvas_id is None and not item.error
+    ]
+    if pending:
+        edx_course_key = job.edx_course.course_key()
+        plans = [{
+            'module_id': modules[item.module_id].canvas_id,
+            'position': item.position,
+            'graded': item.graded,
+            'title': item.title,
+            'points': item.points,
+            'lti_url': populate.get_lti_url_for_usage_id(edx_course_key, item.usage_id),
+        } for item in pending]
+
+        def checkpoint(index, result):
+            item = pending[index]
+            if result['status'] == 'created':
+                item.canvas_id = result['item']['id']
+            else:
+                item.error = result['error']
+            _checkpoint(job, item)
+
+        external_tool_id = canvas_api.get_external_tool_id(canvas_auth, job.canvas_course_id)
+        populate.create_module_items(
+            canvas_auth, job.canvas_course_id, plans, external_tool_id, checkpoint=checkpoint
+        )
+
+    # The module list has changed too much to be worth patching.
+    module_cache.get_modules(canvas_auth, job.canvas_course_id, refresh=True)
+    log.info("Populated Canvas course {} (job {}): {}".format(
+        job.canvas_course_id, job.id, canvas_api.throttle_state(canvas_auth)
+    ))
+    return job.items.exclude(error='').count()
+
+
+def _checkpoint(job, item):
+    item.save(update_fields=['canvas_id', 'error'])
+    # Moving the start time on keeps a long job from being taken for one whose
+    # worker has died (see jobs.JOB_TIMEOUT).
+    PopulateJob.objects.filter(id=job.id).update(started=timezone.now())
+
+
+def progress(job):
+    """
+    Return (created, failed), the numbers of a job's items that have been
+    created and that could not be.
+    """
+    created = job.items.filter(canvas_id__isnull=False).count()
+    failed = job.items.exclude(error='').count()
+    return created, failed
@@ -1,15 +1,41 @@
+import hashlib
 import json
+import logging
+import random
+import threading
+import time
+import urllib
+import urlparse
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
 import requests
+from requests.adapters import HTTPAdapter
 
+from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from django.core.urlresolvers import reverse
 from django.shortcuts import (render, redirect)
 from django.conf import settings
 
 from canvas_sdk.methods import assignments, courses, modules, external_tools
-from canvas_sdk.utils import get_all_list_data
-from canvas_sdk import RequestContext
-from models import CanvasApiAuthorization
+from canvas_sdk import client, RequestContext
+from canvas_sdk.exceptions import CanvasAPIError
+from models import CanvasApiAuthorization, CanvasExternalTool
+from throttle import Throttle
+
+log = logging.getLogger("edx2canvas.log")
+
+# Calls that are throttled, and reads that fail with a server error, are made
+# up to MAX_ATTEMPTS times in all, waiting a random time of up to
+# RETRY_DELAY * 2 ** attempt seconds between them.
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.5
+
+# Lists are fetched PER_PAGE entries at a time, the most Canvas allows, and up
+# to PAGE_CONCURRENCY pages at once.
+PER_PAGE = 100
+PAGE_CONCURRENCY = getattr(settings, 'CANVAS_PAGE_CONCURRENCY', 4)
 
 @require_http_methods(['GET'])
 def start_oauth(request, canvas_user_id):
@@ -40,27 +66,52 @@ def oauth_redirect(request):
     token = response.json().get('access_token', None)
 
     auth, created = CanvasApiAuthorization.objects.get_or_create(lti_user_id=state)
+    if auth.canvas_api_token:
+        forget_token(auth.canvas_api_token)
     auth.canvas_api_token = token
     auth.save()
 
     return redirect('edx2canvas:main')
 
 def get_courses(api_auth):
-    context = _get_context(api_auth)
-    get_all_list_data(context, courses.list_your_courses, 'term')
+    return _get_all_pages(api_auth, courses.list_your_courses, 'term')
 
 def get_module_list(api_token, canvas_course_id):
-    context = _get_context(api_token)
-    return get_all_list_data(context, modules.list_modules, canvas_course_id, 'items')
+    return _get_all_pages(api_token, modules.list_modules, canvas_course_id, 'items')
 
-def get_external_tool_id(api_auth, canvas_course_id):
-    context = _get_context(api_auth)
-    tools = get_all_list_data(context, external_tools.list_external_tools_courses, canvas_course_id)
+def get_external_tool_id(api_auth, canvas_course_id, refresh=False):
+    """
+    Return the ID of the Open edX LTI tool in a Canvas course, installing the
+    tool if it is not there. The ID is remembered in a CanvasExternalTool, and
+    only looked up in Canvas again if refresh is True (for when the tool may
+    have been removed from the course).
+    """
     domain = settings.EXTERNAL_TOOL_DOMAIN
+    tools = CanvasExternalTool.objects.filter(canvas_course_id=canvas_course_id, domain=domain)
+    if not refresh:
+        tool_id = tools.values_list('tool_id', flat=True).first()
+        if tool_id:
+            return tool_id
+
+    # The row lock makes concurrent callers wait for the first one to find or
+    # install the tool, so that it is never installed twice.
+    with transaction.atomic():
+        record, created = tools.select_for_update().get_or_create(
+            canvas_course_id=canvas_course_id, domain=domain
+        )
+        if record.tool_id and not refresh:
+            return record.tool_id
+        record.tool_id = _find_or_install_external_tool(api_auth, canvas_course_id, domain)
+        record.save(update_fields=['tool_id'])
+    return record.tool_id
+
+def _find_or_install_external_tool(api_auth, canvas_course_id, domain):
+    tools = _get_all_pages(api_auth, external_tools.list_external_tools_courses, canvas_course_id)
     tool_id = next((x['id'] for x in tools if x.get('domain', None) == domain), None)
     if not tool_id:
-        tool = external_tools.create_external_tool_courses(
-            context, canvas_course_id, 'Open edX at Harvard', 'anonymous',
+        tool = _write(
+            api_auth, external_tools.create_external_tool_courses,
+            canvas_course_id, 'Open edX at Harvard', 'anonymous',
             settings.EDX_LTI_KEY, settings.EDX_LTI_SECRET, domain=domain
         )
         tool_id = tool.json().get('id', None)
@@ -68,40 +119,237 @@ def get_external_tool_id(api_auth, canvas_course_id):
     return tool_id
 
 def create_canvas_module(api_auth, canvas_course_id, module_name, position):
-    context = _get_context(api_auth)
-    response = modules.create_module(context, canvas_course_id, module_name, module_position=position)
+    response = _write(api_auth, modules.create_module, canvas_course_id, module_name, module_position=position)
     return response.json()
 
 def create_canvas_module_item(
         api_auth, title, canvas_course_id,
         module_id, position, external_tool_id, external_url
 ):
-    context = _get_context(api_auth)
-    modules.create_module_item(
-        context, canvas_course_id, module_id, 'ExternalTool', external_tool_id,
+    response = _write(
+        api_auth, modules.create_module_item,
+        canvas_course_id, module_id, 'ExternalTool', external_tool_id,
         module_item_external_url=external_url, module_item_title=title,
         module_item_position=position
     )
+    return response.json()
 
-def create_assignment_with_module_item(
-        api_auth, title, canvas_course_id,
-        module_id, position, external_tool_id, external_url, points
-):
-    context = _get_context(api_auth)
-    response = assignments.create_assignment(
-        context, canvas_course_id, title, 'external_tool',
+def create_assignment(api_auth, title, canvas_course_id, external_tool_id, external_url, points):
+    response = _write(
+        api_auth, assignments.create_assignment,
+        canvas_course_id, title, 'external_tool',
         assignment_external_tool_tag_attributes={'url': external_url},
         assignment_integration_id=external_tool_id,
         assignment_points_possible=points
     )
-    assignment_id = response.json()['id']
+    return response.json()
 
-    modules.create_module_item(
-        context, canvas_course_id, module_id, 'Assignment', assignment_id,
+def create_assignment_module_item(api_auth, title, canvas_course_id, module_id, position, assignment_id):
+    response = _write(
+        api_auth, modules.create_module_item,
+        canvas_course_id, module_id, 'Assignment', assignment_id,
         module_item_title=title, module_item_position=position
     )
+    return response.json()
+
+def throttle_state(api_auth):
+    """
+    Return the state of the throttle on calls made with a token (see
+    throttle.py), for logging.
+    """
+    return _get_context(api_auth).throttle.state()
+
+def forget_token(api_token):
+    """
+    Discard the cached request context for a token that has been replaced or
+    rejected by Canvas.
+    """
+    _contexts.evict(api_token)
+
 
 def _get_context(api_auth):
-    api_config = settings.CANVAS_SDK_SETTINGS.copy()
-    api_config['auth_token'] = api_auth.canvas_api_token
-    return RequestContext(**api_config)
+    return _contexts.get(api_auth.canvas_api_token)
+
+
+def _get_all_pages(api_auth, method, *args, **kwargs):
+    """
+    Return the entries on every page of a list, fetched with a canvas_sdk list
+    method. Once the first page shows how many pages there are, the rest are
+    fetched concurrently; otherwise they are fetched one after another.
+    """
+    kwargs['per_page'] = PER_PAGE
+    response = _read(api_auth, method, *args, **kwargs)
+    data = response.json()
+    page_urls = _page_urls(response)
+    if page_urls is None:
+        while 'next' in response.links:
+            response = _read(api_auth, client.get, response.links['next']['url'])
+            data.extend(response.json())
+    elif page_urls:
+        pool = ThreadPool(min(PAGE_CONCURRENCY, len(page_urls)))
+        try:
+            pages = pool.map(lambda url: _read(api_auth, client.get, url).json(), page_urls)
+        finally:
+            pool.close()
+            pool.join()
+        for page in pages:
+            data.extend(page)
+    return data
+
+
+def _page_urls(response):
+    """
+    Return the URLs of the pages of a list after the first, from the Link
+    header of the first page, or None if they cannot be worked out. Canvas
+    leaves out the link to the last page when the pages would be expensive
+    to count, and some lists are paged by bookmark rather than by number.
+    """
+    links = response.links
+    if 'next' not in links:
+        return []
+    if _page_number(links['next']['url']) != 2 or 'last' not in links:
+        return None
+    last_url = links['last']['url']
+    last_page = _page_number(last_url)
+    if last_page is None:
+        return None
+    url = urlparse.urlsplit(last_url)
+    query = urlparse.parse_qsl(url.query, keep_blank_values=True)
+    return [
+        urlparse.urlunsplit(url._replace(query=urllib.urlencode([
+            (name, page if name == 'page' else value) for name, value in query
+        ])))
+        for page in range(2, last_page + 1)
+    ]
+
+
+def _page_number(url):
+    page = urlparse.parse_qs(urlparse.urlsplit(url).query).get('page')
+    try:
+        return int(page[0])
+    except (TypeError, ValueError):
+        return None
+
+
+def _read(api_auth, method, *args, **kwargs):
+    """
+    Call a canvas_sdk method that only reads from Canvas, with the request
+    context for a token. Calls that are throttled or fail with a server error
+    are retried.
+    """
+    return _call(api_auth, True, method, args, kwargs)
+
+
+def _write(api_auth, method, *args, **kwargs):
+    """
+    Call a canvas_sdk method that creates something in Canvas. Only calls that
+    are throttled are retried, as a server error may come after the thing
+    has been created.
+    """
+    return _call(api_auth, False, method, args, kwargs)
+
+
+def _call(api_auth, retry_server_errors, method, args, kwargs):
+    context = _get_context(api_auth)
+    for attempt in range(MAX_ATTEMPTS):
+        with context.throttle:
+            try:
+                return method(context, *args, **kwargs)
+            except CanvasAPIError as e:
+                retry = context.throttle.was_throttled() or (retry_server_errors and e.status_code >= 500)
+                if not retry or attempt == MAX_ATTEMPTS - 1:
+                    raise
+        # Random delays keep threads that were refused together from all
+        # trying again together.
+        delay = random.uniform(0, RETRY_DELAY * 2 ** attempt)
+        log.info("Retrying Canvas API call in %.1fs: %s", delay, context.throttle.state())
+        time.sleep(delay)
+
+
+class PooledRequestContext(RequestContext):
+    """
+    A RequestContext whose session sends its requests through the connection
+    pool shared by every context in the process, so that the keep-alive
+    connections to Canvas (and their TLS handshakes) are reused between
+    requests and between users. Each context has a Throttle, which sees every
+    response to its session.
+    """
+    def __init__(self, adapter, throttle, **kwargs):
+        super(PooledRequestContext, self).__init__(**kwargs)
+        self.adapter = adapter
+        self.throttle = throttle
+        self._pooled_session = None
+
+    @property
+    def session(self):
+        if self._pooled_session is None:
+            session = requests.Session()
+            session.headers['Authorization'] = 'Bearer {}'.format(self.auth_token)
+            session.mount(self.base_api_url, self.adapter)
+            session.hooks['response'].append(self.throttle.record)
+            self._pooled_session = session
+        return self._pooled_session
+
+
+class ContextCache(object):
+    """
+    A thread-safe cache of request contexts by API token. Contexts that have
+    not been used for idle_timeout seconds are discarded, as are the least
+    recently used ones once there are more than max_contexts.
+
+    The sessions of the cached contexts share one HTTPAdapter, and so one pool
+    of connections. Discarded sessions are not closed, as that would close the
+    shared pool too.
+    """
+    def __init__(self, max_contexts, idle_timeout, pool_size, max_concurrency, clock=time.time):
+        self.max_contexts = max_contexts
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        self._adapter = None
+
+    def get(self, api_token):
+        now = self.clock()
+        with self._lock:
+            self._evict_idle(now)
+            context = self._contexts.pop(api_token, (None, None))[0]
+            if context is None:
+                context = self._create_context(api_token)
+            self._contexts[api_token] = (context, now)
+            while len(self._contexts) > self.max_contexts:
+                self._contexts.popitem(last=False)
+            return context
+
+    def evict(self, api_token):
+        with self._lock:
+            self._contexts.pop(api_token, None)
+
+    def _evict_idle(self, now):
+        # Entries are kept in order of last use, so the idle ones come first.
+        for api_token, (context, last_used) in self._contexts.items():
+            if now - last_used < self.idle_timeout:
+                break
+            del self._contexts[api_token]
+
+    def _create_context(self, api_token):
+        api_config = settings.CANVAS_SDK_SETTINGS.copy()
+        api_config['auth_token'] = api_token
+        if self._adapter is None:
+            self._adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_size,
+                max_retries=api_config.get('max_retries') or 0
+            )
+        # The name identifies the token in logs without giving it away.
+        name = hashlib.sha1(api_token or '').hexdigest()[:8]
+        return PooledRequestContext(self._adapter, Throttle(self.max_concurrency, name), **api_config)
+
+
+_contexts = ContextCache(
+    max_contexts=getattr(settings, 'CANVAS_CONTEXT_CACHE_SIZE', 100),
+    idle_timeout=getattr(settings, 'CANVAS_CONTEXT_IDLE_TIMEOUT', 15 * 60),
+    pool_size=getattr(settings, 'CANVAS_CONNECTION_POOL_SIZE', 10),
+    max_concurrency=getattr(settings, 'CANVAS_MAX_CONCURRENCY', 8),
+)
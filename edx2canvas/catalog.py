@@ -0,0 +1,66 @@
+"""
+The catalog of uploaded edX courses offered by the course selector.
+
+The catalog only changes when a course is uploaded, so it is built with one
+query for just the columns that the selector needs, and kept in the Django
+cache named by EDX_COURSE_CATALOG_CACHE until ingest.py invalidates it.
+Filtering and paging are done on the cached copy.
+
+Courses are ingested by the worker, not by the web processes that serve the
+catalog, so the cache must be shared between them for the invalidation to
+reach the web processes. If EDX_COURSE_CATALOG_CACHE is not set, the catalog
+is not cached.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from models import EdxCourse
+
+CACHE_KEY = 'edx2canvas:catalog'
+
+# How long the catalog may be cached, in seconds, in case an invalidation is
+# missed.
+CACHE_TIMEOUT = 5 * 60
+
+FIELDS = ('id', 'title', 'org', 'course', 'run', 'key_version', 'node_count', 'problem_count')
+
+PAGE_SIZE = 100
+
+
+def get_catalog():
+    """
+    Return the catalog, as a list of dicts of FIELDS ordered by title.
+    """
+    cache = _cache()
+    courses = cache.get(CACHE_KEY) if cache is not None else None
+    if courses is None:
+        courses = list(EdxCourse.objects.order_by('title', 'id').values(*FIELDS))
+        if cache is not None:
+            cache.set(CACHE_KEY, courses, CACHE_TIMEOUT)
+    return courses
+
+
+def invalidate():
+    cache = _cache()
+    if cache is not None:
+        cache.delete(CACHE_KEY)
+
+
+def search_catalog(query='', offset=0, limit=PAGE_SIZE):
+    """
+    Return the number of courses whose title, org, course or run contain the
+    query (ignoring case), and one page of them.
+    """
+    courses = get_catalog()
+    query = query.strip().lower()
+    if query:
+        courses = [
+            course for course in courses
+            if any(query in course[field].lower() for field in ('title', 'org', 'course', 'run'))
+        ]
+    return len(courses), courses[offset:offset + limit]
+
+
+def _cache():
+    alias = getattr(settings, 'EDX_COURSE_CATALOG_CACHE', None)
+    return caches[alias] if alias else None
@@ -0,0 +1,113 @@
+"""
+Caching of the serialized course structures served by views.get_edx_course.
+
+Course structures only change when a course is re-uploaded, so the JSON sent
+to the browser is kept in two tiers: a size-bounded LRU cache in each process,
+and (if EDX_COURSE_SHARED_CACHE names one of the Django caches) a cache shared
+between processes. Entries are keyed by course ID, the content hash of the
+stored course and the representation requested, so a re-uploaded course is
+never served stale even by a process that missed the invalidation.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache(object):
+    """
+    A thread-safe cache of byte strings that holds at most max_bytes of data,
+    discarding the least recently used entries first.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return None
+            self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._discard(key)
+
+    def _discard(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+
+
+_local_cache = LRUCache(getattr(settings, 'EDX_COURSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# The representations of a course that get_edx_course can serve.
+FORMATS = ('nested', 'compact', 'outline')
+
+
+def lookup(edx_course, course_format):
+    """
+    Return the cached content for a course, or None if it is not cached. The
+    'compact' representation is cached gzip-compressed, as it is stored.
+    """
+    key = _key(edx_course.id, edx_course.content_hash, course_format)
+    content = _local_cache.get(key)
+    if content is None:
+        shared_cache = _shared_cache()
+        if shared_cache is not None:
+            content = shared_cache.get(_shared_key(key))
+            if content is not None:
+                _local_cache.set(key, content)
+    return content
+
+
+def store(edx_course, course_format, content):
+    key = _key(edx_course.id, edx_course.content_hash, course_format)
+    _local_cache.set(key, content)
+    shared_cache = _shared_cache()
+    if shared_cache is not None:
+        shared_cache.set(_shared_key(key), content)
+
+
+def invalidate(edx_course):
+    """
+    Discard every cached version of a course. This should be called with the
+    course as it was before its content changed.
+    """
+    _local_cache.delete_matching(lambda key: key[0] == edx_course.id)
+    shared_cache = _shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete_many([
+            _shared_key(_key(edx_course.id, edx_course.content_hash, course_format))
+            for course_format in FORMATS
+        ])
+
+
+def _key(course_id, content_hash, course_format):
+    return (course_id, content_hash, course_format)
+
+
+def _shared_key(key):
+    return 'edx2canvas:course:{}:{}:{}'.format(*key)
+
+
+def _shared_cache():
+    alias = getattr(settings, 'EDX_COURSE_SHARED_CACHE', None)
+    return caches[alias] if alias else None
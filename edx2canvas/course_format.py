@@ -0,0 +1,103 @@
+"""
+Conversion between the nested course structure produced by
+bin/parse_course.py and a compact, flattened representation of it.
+
+In the nested form every node carries its own 'type', 'parent' and a full
+usage ID, and its children are nested inside it. The compact form is a table
+of nodes in document order:
+
+    {
+        "format": "compact-v1",
+        "usage_prefix": "block-v1:org+course+run+type@",
+        "types": ["course", "chapter", ...],
+        "nodes": [
+            [parent_index, type_index, score, usage_suffix, attributes],
+            ...
+        ]
+    }
+
+The parent index is -1 for the root node. The usage ID of a node is the
+shared prefix followed by its suffix (or absent if the suffix is null).
+A node's 'parent' attribute is not stored, since the parser always sets it
+to the 'id' of the parent node.
+"""
+import os
+
+COMPACT_FORMAT = 'compact-v1'
+
+_DERIVED_KEYS = ('children', 'parent', 'type', 'score', 'usage_id')
+
+
+def is_compact(course):
+    return isinstance(course, dict) and course.get('format') == COMPACT_FORMAT
+
+
+def compact_course(course):
+    """
+    Flatten a nested course structure into the compact representation.
+    """
+    ordered = []
+    stack = [(course, -1)]
+    while stack:
+        node, parent_index = stack.pop()
+        index = len(ordered)
+        ordered.append((node, parent_index))
+        for child in reversed(node.get('children', [])):
+            stack.append((child, index))
+
+    usage_prefix = os.path.commonprefix(
+        [entry['usage_id'] for entry, __ in ordered if entry.get('usage_id') is not None]
+    )
+    types = []
+    type_indices = {}
+    nodes = []
+    for node, parent_index in ordered:
+        node_type = node.get('type')
+        if node_type not in type_indices:
+            type_indices[node_type] = len(types)
+            types.append(node_type)
+        usage_id = node.get('usage_id')
+        attributes = dict((k, v) for k, v in node.items() if k not in _DERIVED_KEYS)
+        parent = _derived_parent(ordered[parent_index][0]) if parent_index >= 0 else None
+        if 'parent' in node and node['parent'] != parent:
+            attributes['parent'] = node['parent']
+        nodes.append([
+            parent_index,
+            type_indices[node_type],
+            node.get('score', 0),
+            usage_id[len(usage_prefix):] if usage_id is not None else None,
+            attributes,
+        ])
+    return {
+        'format': COMPACT_FORMAT,
+        'usage_prefix': usage_prefix,
+        'types': types,
+        'nodes': nodes,
+    }
+
+
+def expand_course(compact):
+    """
+    Rebuild the nested course structure from its compact representation.
+    Returns the root node.
+    """
+    usage_prefix = compact['usage_prefix']
+    types = compact['types']
+    expanded = []
+    for parent_index, type_index, score, usage_suffix, attributes in compact['nodes']:
+        node = dict(attributes)
+        node['type'] = types[type_index]
+        node['score'] = score
+        if usage_suffix is not None:
+            node['usage_id'] = usage_prefix + usage_suffix
+        if parent_index >= 0:
+            parent = expanded[parent_index]
+            if 'parent' not in node and _derived_parent(parent):
+                node['parent'] = _derived_parent(parent)
+            parent.setdefault('children', []).append(node)
+        expanded.append(node)
+    return expanded[0]
+
+
+def _derived_parent(parent_node):
+    return parent_node.get('id') or None
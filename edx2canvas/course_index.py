@@ -0,0 +1,212 @@
+"""
+An index of the nodes of each stored course structure.
+
+When a course is uploaded, every node of its structure is stored as an
+EdxCourseNode row. This lets views.get_edx_course serve just the outline of a
+course (its chapters and sequentials), and views.get_edx_course_children the
+children of a single node, so that the browser can expand a very large course
+a piece at a time instead of loading the whole of it.
+
+The words of each node's display name, and its type, are also stored as
+EdxCourseNodeTerm rows, an inverted index that views.search_edx_courses uses
+to find nodes across all courses.
+"""
+import json
+import re
+
+from django.db import transaction
+
+import storage
+from models import EdxCourse, EdxCourseNode, EdxCourseNodeTerm
+
+# Depth of the deepest nodes in a course outline. The course itself is at
+# depth 0, its chapters at 1 and their sequentials at 2.
+OUTLINE_DEPTH = 2
+
+BATCH_SIZE = 500
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+# Longest term stored in the search index; longer words are truncated.
+MAX_TERM_LENGTH = 64
+
+# Most search results returned.
+SEARCH_LIMIT = 50
+
+
+def build_index(edx_course, compact):
+    """
+    Replace the node index of a course, given its compact structure (see
+    course_format.py).
+    """
+    usage_prefix = compact['usage_prefix']
+    types = compact['types']
+    rows = compact['nodes']
+    depths = []
+    paths = []
+    child_counts = [0] * len(rows)
+    for parent_index, __, __, __, __ in rows:
+        if parent_index >= 0:
+            depths.append(depths[parent_index] + 1)
+            child_counts[parent_index] += 1
+            if depths[parent_index] > 0:
+                paths.append(paths[parent_index] + [rows[parent_index][4].get('display_name')])
+            else:
+                paths.append([])
+        else:
+            depths.append(0)
+            paths.append([])
+
+    nodes = []
+    for index, (parent_index, type_index, score, usage_suffix, attributes) in enumerate(rows):
+        attributes = dict(attributes)
+        if parent_index >= 0 and 'parent' not in attributes:
+            parent_id = rows[parent_index][4].get('id')
+            if parent_id:
+                attributes['parent'] = parent_id
+        nodes.append(EdxCourseNode(
+            edx_course=edx_course,
+            index=index,
+            parent_index=parent_index,
+            depth=depths[index],
+            usage_id=usage_prefix + usage_suffix if usage_suffix is not None else '',
+            node_type=types[type_index],
+            score=score,
+            child_count=child_counts[index],
+            attributes=json.dumps(attributes),
+            path=json.dumps(paths[index]),
+        ))
+
+    with transaction.atomic():
+        # Requests that index the same course at once take turns, rather than
+        # both inserting its nodes and one of them breaking the unique index.
+        _lock_course(edx_course)
+        EdxCourseNodeTerm.objects.filter(node__edx_course=edx_course).delete()
+        EdxCourseNode.objects.filter(edx_course=edx_course).delete()
+        EdxCourseNode.objects.bulk_create(nodes, batch_size=BATCH_SIZE)
+        # bulk_create does not set primary keys, so fetch them for the terms.
+        node_ids = dict(
+            EdxCourseNode.objects.filter(edx_course=edx_course).values_list('index', 'id')
+        )
+        terms = []
+        for index, row in enumerate(rows):
+            for term in _node_terms(types[row[1]], row[4].get('display_name')):
+                terms.append(EdxCourseNodeTerm(node_id=node_ids[index], term=term))
+        EdxCourseNodeTerm.objects.bulk_create(terms, batch_size=BATCH_SIZE)
+        edx_course.node_count = len(nodes)
+        edx_course.problem_count = len([node for node in nodes if node.node_type == 'problem'])
+        edx_course.save(update_fields=['node_count', 'problem_count'])
+
+
+def ensure_index(edx_course):
+    """
+    Index a course that was uploaded before courses were indexed at upload
+    time. Raises IOError if the course is not stored.
+    """
+    if edx_course.node_count:
+        return
+    compact = json.loads(storage.decompress(storage.read_course(edx_course)))
+    with transaction.atomic():
+        # Another request may have indexed the course while this one read it.
+        locked = _lock_course(edx_course)
+        if locked.node_count:
+            edx_course.node_count = locked.node_count
+            edx_course.problem_count = locked.problem_count
+        else:
+            build_index(edx_course, compact)
+
+
+def _lock_course(edx_course):
+    return EdxCourse.objects.select_for_update().get(id=edx_course.id)
+
+
+def outline(edx_course):
+    """
+    Return the nested structure of a course down to OUTLINE_DEPTH. Every node
+    has a child_count, including those whose children are left out.
+    """
+    nodes = EdxCourseNode.objects.filter(
+        edx_course=edx_course, depth__lte=OUTLINE_DEPTH
+    ).order_by('index')
+    expanded = {}
+    root = None
+    for node in nodes:
+        data = node.as_dict()
+        if node.parent_index >= 0:
+            expanded[node.parent_index].setdefault('children', []).append(data)
+        else:
+            root = data
+        expanded[node.index] = data
+    return root
+
+
+def lookup(edx_course, usage_id):
+    """
+    Return the node of a course with the given usage ID, or None if the course
+    has no such node (or has not been indexed).
+    """
+    return EdxCourseNode.objects.filter(
+        edx_course=edx_course, usage_id=usage_id
+    ).order_by('index').first()
+
+
+def lookup_many(edx_course, usage_ids):
+    """
+    Return a dict of the nodes of a course with any of the given usage IDs,
+    by usage ID, querying for up to BATCH_SIZE of them at a time.
+    """
+    nodes = {}
+    for start in xrange(0, len(usage_ids), BATCH_SIZE):
+        for node in EdxCourseNode.objects.filter(
+            edx_course=edx_course, usage_id__in=usage_ids[start:start + BATCH_SIZE]
+        ).order_by('-index'):
+            # As in lookup, the first node with a usage ID wins.
+            nodes[node.usage_id] = node
+    return nodes
+
+
+def children(edx_course, usage_id):
+    """
+    Return the children of the node with the given usage ID, or None if the
+    course has no such node.
+    """
+    parent = lookup(edx_course, usage_id)
+    if parent is None:
+        return None
+    nodes = EdxCourseNode.objects.filter(
+        edx_course=edx_course, parent_index=parent.index
+    ).order_by('index')
+    return [node.as_dict() for node in nodes]
+
+
+def search(query, node_type=None, min_score=None, limit=SEARCH_LIMIT):
+    """
+    Return the nodes, across all courses, that have a term starting with
+    each word of the query, optionally only those of a type or with at least
+    a given score. Nodes are ordered by course and then document order.
+    """
+    nodes = EdxCourseNode.objects.all()
+    words = _words(query)
+    for word in words:
+        # Each filter joins the terms separately, so nodes must match them all.
+        nodes = nodes.filter(terms__term__startswith=word)
+    if node_type:
+        nodes = nodes.filter(node_type=node_type)
+    elif not words:
+        return []
+    if min_score is not None:
+        nodes = nodes.filter(score__gte=min_score)
+    return list(
+        nodes.distinct().select_related('edx_course').order_by('edx_course_id', 'index')[:limit]
+    )
+
+
+def _node_terms(node_type, display_name):
+    terms = set(_words(display_name or ''))
+    if node_type:
+        terms.add(node_type.lower()[:MAX_TERM_LENGTH])
+    return terms
+
+
+def _words(text):
+    return [word.lower()[:MAX_TERM_LENGTH] for word in WORD.findall(text)]
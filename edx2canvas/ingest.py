@@ -0,0 +1,126 @@
+"""
+Ingestion of course structures uploaded by bin/parse_course.py.
+
+views.create_edx_course only queues an upload as an IngestJob. The work of
+decoding, validating, compressing, storing and indexing the course is done
+later by a worker (the process_jobs management command), so that a large
+upload does not hold up a web server process.
+"""
+import hashlib
+import json
+import logging
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+import catalog
+import course_cache
+import course_format
+import course_index
+import storage
+from models import EdxCourse, IngestJob
+
+log = logging.getLogger("edx2canvas.log")
+
+# The most an upload may hold once decompressed, so that a small gzip bomb
+# cannot exhaust the memory of the process that decodes it.
+MAX_UPLOAD_SIZE = getattr(settings, 'EDX_COURSE_MAX_UPLOAD_SIZE', 512 * 1024 * 1024)
+
+
+def queue_upload(payload, content_encoding=''):
+    """
+    Queue the body of an upload request to be ingested, and return its job.
+    """
+    return IngestJob.objects.create(payload=payload, content_encoding=content_encoding)
+
+
+def run_job(job):
+    """
+    Ingest the upload of a claimed job, and record the outcome on the job.
+    """
+    try:
+        edx_course = ingest(bytes(job.payload), job.content_encoding)
+    except ValueError as e:
+        job.status = IngestJob.FAILED
+        job.error = "Invalid upload: {}".format(e)
+    except Exception as e:
+        log.exception("Failed to ingest upload {}".format(job.id))
+        job.status = IngestJob.FAILED
+        job.error = "{}: {}".format(type(e).__name__, e)
+    else:
+        job.status = IngestJob.SUCCEEDED
+        job.edx_course = edx_course
+        job.payload = ''
+    job.finished = timezone.now()
+    job.save()
+
+
+def ingest(payload, content_encoding=''):
+    """
+    Store and index a course structure, given the body of the request that
+    uploaded it, and return its EdxCourse. Raises ValueError if the upload is
+    malformed.
+
+    The request body is a JSON object with the course's title, org, course,
+    run and key_version, and the parsed structure itself as 'body'. The body
+    may be gzip-compressed, and the structure may be given either as a nested
+    object or, as older versions of the script send it, as a JSON-encoded
+    string. Uploads larger than MAX_UPLOAD_SIZE once decompressed are refused.
+    """
+    data = json.loads(_decode(payload, content_encoding))
+    try:
+        title = data['title']
+        org = data['org']
+        course = data['course']
+        run = data['run']
+        key_version = data['key_version']
+        body = data['body']
+    except (KeyError, TypeError) as e:
+        raise ValueError("missing field {}".format(e))
+    if isinstance(body, basestring):
+        body = json.loads(body)
+    if not course_format.is_compact(body):
+        body = course_format.compact_course(body)
+
+    edx_course, __ = EdxCourse.objects.get_or_create(
+        org=org,
+        course=course,
+        run=run,
+        key_version=key_version,
+        defaults={'title': title}
+    )
+    edx_course.title = title
+
+    output = json.dumps(body, separators=(',', ':'))
+    course_cache.invalidate(edx_course)
+    storage.get_storage().write(
+        '%s.json.gz' % edx_course.id, storage.compress(output), content_encoding='gzip'
+    )
+    course_index.build_index(edx_course, body)
+    edx_course.content_hash = hashlib.sha1(output).hexdigest()
+    edx_course.save()
+    catalog.invalidate()
+    return edx_course
+
+
+
+def _decode(payload, content_encoding):
+    """
+    Return the JSON text of an upload, decompressing it if it is compressed.
+    Raises ValueError if it cannot be decompressed or is larger than
+    MAX_UPLOAD_SIZE.
+    """
+    if content_encoding.lower() == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            # Decompression stops one byte past the limit, however much more
+            # the payload would expand to.
+            payload = decompressor.decompress(payload, MAX_UPLOAD_SIZE + 1)
+            if len(payload) <= MAX_UPLOAD_SIZE:
+                payload += decompressor.flush()
+        except zlib.error as e:
+            raise ValueError("{}".format(e))
+    if len(payload) > MAX_UPLOAD_SIZE:
+        raise ValueError("larger than {} bytes".format(MAX_UPLOAD_SIZE))
+    return payload
@@ -0,0 +1,65 @@
+"""
+A queue of background jobs, kept in the database.
+
+Jobs are rows of the Job models (see models.Job), created in the PENDING
+state. Worker processes, started with the process_jobs management command,
+claim them one at a time and run them. A job whose worker died without
+finishing it is claimed again once JOB_TIMEOUT has passed, up to
+MAX_ATTEMPTS times.
+"""
+import datetime
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+import autopopulate
+import ingest
+from models import IngestJob, PopulateJob
+
+JOB_TIMEOUT = datetime.timedelta(minutes=30)
+
+MAX_ATTEMPTS = 3
+
+# The kinds of job that workers run, and the function that runs each.
+RUNNERS = [
+    (IngestJob, ingest.run_job),
+    (PopulateJob, autopopulate.run_job),
+]
+
+
+def run_next_job():
+    """
+    Claim and run the oldest runnable job of any kind. Returns the job, or
+    None if there was nothing to do.
+    """
+    for model, runner in RUNNERS:
+        job = claim_next_job(model)
+        if job is not None:
+            runner(job)
+            return job
+    return None
+
+
+def claim_next_job(model):
+    """
+    Mark the oldest runnable job of a kind as running, and return it. Returns
+    None if there are no runnable jobs.
+    """
+    now = timezone.now()
+    runnable = Q(status=model.PENDING) | Q(status=model.RUNNING, started__lt=now - JOB_TIMEOUT)
+    for job_id in model.objects.filter(runnable).order_by('id').values_list('id', flat=True)[:10]:
+        # Another worker may claim the same job first, in which case this
+        # updates nothing.
+        claimed = model.objects.filter(runnable, id=job_id).update(
+            status=model.RUNNING, started=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            job = model.objects.get(id=job_id)
+            if job.attempts > MAX_ATTEMPTS:
+                job.status = model.FAILED
+                job.error = 'Gave up after {} attempts'.format(MAX_ATTEMPTS)
+                job.finished = now
+                job.save()
+                continue
+            return job
+    return None
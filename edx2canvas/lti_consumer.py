@@ -7,12 +7,15 @@ from oauthlib.oauth1 import Client
 import urllib
 
 from models import EdxCourse
+import course_index
 
 @login_required()
 @require_http_methods(['GET'])
 def launch_lti_preview(request):
     """
     Generate a page that performs an LTI launch for the required edX content.
+    If the structure of the edX course has been indexed, the content must be
+    part of it.
     """
     try:
         usage_key = request.GET['usage_id']
@@ -23,6 +26,8 @@ def launch_lti_preview(request):
         course = EdxCourse.objects.get(id=course_id)
     except EdxCourse.DoesNotExist:
         return http.HttpResponseNotFound()
+    if course.node_count and course_index.lookup(course, usage_key) is None:
+        return http.HttpResponseNotFound()
     context = get_lti_context(course, usage_key)
     return render(request, 'edx2canvas/lti_launch.html', context)
 
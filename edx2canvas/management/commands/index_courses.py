@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from edx2canvas import course_index, storage
+from edx2canvas.models import EdxCourse
+
+
+class Command(BaseCommand):
+    help = ('Index the structure of courses uploaded before courses were indexed '
+            'at upload time, so that they can be searched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild the index of every course, not just unindexed ones.'
+        )
+
+    def handle(self, *args, **options):
+        edx_courses = EdxCourse.objects.all()
+        if not options['all']:
+            edx_courses = edx_courses.filter(node_count=0)
+        for edx_course in edx_courses:
+            try:
+                compact = json.loads(storage.decompress(storage.read_course(edx_course)))
+            except IOError:
+                self.stderr.write('Course {} is not stored'.format(edx_course.id))
+                continue
+            course_index.build_index(edx_course, compact)
+            self.stdout.write('Indexed {} ({} nodes)'.format(edx_course.title, edx_course.node_count))
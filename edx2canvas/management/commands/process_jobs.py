@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from edx2canvas import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs, such as ingesting uploaded courses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when there are no jobs left, rather than waiting for more.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0, metavar='SECONDS',
+            help='How often to look for new jobs when there are none (default: 2).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = jobs.run_next_job()
+            if job is not None:
+                self.stdout.write('{} {}: {}'.format(type(job).__name__, job.id, job.status))
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='edxcourse',
+            name='content_hash',
+            field=models.CharField(default=b'', max_length=40, blank=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0002_edxcourse_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EdxCourseNode',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('index', models.IntegerField()),
+                ('parent_index', models.IntegerField()),
+                ('depth', models.IntegerField()),
+                ('usage_id', models.CharField(default=b'', max_length=255, db_index=True, blank=True)),
+                ('node_type', models.CharField(max_length=64)),
+                ('score', models.IntegerField(default=0)),
+                ('child_count', models.IntegerField(default=0)),
+                ('attributes', models.TextField(default=b'{}')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='edxcourse',
+            name='node_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='edxcoursenode',
+            name='edx_course',
+            field=models.ForeignKey(related_name='nodes', to='edx2canvas.EdxCourse'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='edxcoursenode',
+            unique_together=set([('edx_course', 'index')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='edxcoursenode',
+            index_together=set([('edx_course', 'parent_index')]),
+        ),
+    ]
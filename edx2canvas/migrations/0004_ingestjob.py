@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0003_edxcoursenode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('status', models.CharField(default=b'pending', max_length=16, db_index=True, choices=[(b'pending', b'Pending'), (b'running', b'Running'), (b'succeeded', b'Succeeded'), (b'failed', b'Failed')])),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(default=b'', blank=True)),
+                ('payload', models.BinaryField()),
+                ('content_encoding', models.CharField(default=b'', max_length=16, blank=True)),
+                ('edx_course', models.ForeignKey(related_name='+', blank=True, to='edx2canvas.EdxCourse', null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
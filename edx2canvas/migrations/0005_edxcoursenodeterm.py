@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0004_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EdxCourseNodeTerm',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('term', models.CharField(max_length=64, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='edxcoursenode',
+            name='path',
+            field=models.TextField(default=b'[]'),
+        ),
+        migrations.AddField(
+            model_name='edxcoursenodeterm',
+            name='node',
+            field=models.ForeignKey(related_name='terms', to='edx2canvas.EdxCourseNode'),
+        ),
+    ]
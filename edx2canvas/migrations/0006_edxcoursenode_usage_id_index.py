@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0005_edxcoursenodeterm'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='edxcoursenode',
+            index_together=set([('edx_course', 'parent_index'), ('edx_course', 'usage_id')]),
+        ),
+    ]
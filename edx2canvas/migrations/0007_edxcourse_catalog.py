@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import migrations, models
+
+log = logging.getLogger("edx2canvas.log")
+
+
+def count_problems(apps, schema_editor):
+    EdxCourse = apps.get_model('edx2canvas', 'EdxCourse')
+    EdxCourseNode = apps.get_model('edx2canvas', 'EdxCourseNode')
+    for edx_course in EdxCourse.objects.filter(node_count__gt=0):
+        edx_course.problem_count = EdxCourseNode.objects.filter(
+            edx_course=edx_course, node_type='problem'
+        ).count()
+        edx_course.save(update_fields=['problem_count'])
+
+
+def merge_duplicate_courses(apps, schema_editor):
+    # Courses used to be matched on their title as well as their key, so a
+    # course re-uploaded under a new title has more than one row. The most
+    # recently created row is kept, and the upload jobs of the others are
+    # moved to it. The other rows are then deleted along with their node
+    # indexes, which describe the older uploads. Their stored files are left
+    # where they are, and logged.
+    EdxCourse = apps.get_model('edx2canvas', 'EdxCourse')
+    IngestJob = apps.get_model('edx2canvas', 'IngestJob')
+    survivors = {}
+    for edx_course in EdxCourse.objects.order_by('-id'):
+        key = (edx_course.org, edx_course.course, edx_course.run, edx_course.key_version)
+        survivor = survivors.setdefault(key, edx_course)
+        if survivor is edx_course:
+            continue
+        IngestJob.objects.filter(edx_course=edx_course).update(edx_course=survivor)
+        log.warning(
+            "Deleting EdxCourse %s, a duplicate of %s (%s); its stored files %s.json and %s.json.gz "
+            "are no longer used", edx_course.id, survivor.id, '/'.join(str(part) for part in key),
+            edx_course.id, edx_course.id
+        )
+        edx_course.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0006_edxcoursenode_usage_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='edxcourse',
+            name='problem_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_problems, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_courses, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='edxcourse',
+            unique_together=set([('org', 'course', 'run', 'key_version')]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0007_edxcourse_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanvasExternalTool',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('canvas_course_id', models.CharField(max_length=64)),
+                ('domain', models.CharField(max_length=255)),
+                ('tool_id', models.IntegerField(null=True, blank=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='canvasexternaltool',
+            unique_together=set([('canvas_course_id', 'domain')]),
+        ),
+    ]
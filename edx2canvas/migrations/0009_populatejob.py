@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0008_canvasexternaltool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopulateJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('status', models.CharField(default=b'pending', max_length=16, db_index=True, choices=[(b'pending', b'Pending'), (b'running', b'Running'), (b'succeeded', b'Succeeded'), (b'failed', b'Failed')])),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(default=b'', blank=True)),
+                ('canvas_course_id', models.CharField(max_length=64)),
+                ('lti_user_id', models.CharField(max_length=255)),
+                ('granularity', models.CharField(max_length=16, choices=[(b'subsection', b'Subsection'), (b'unit', b'Unit'), (b'component', b'Component')])),
+                ('create_assignments', models.BooleanField(default=False)),
+                ('item_count', models.IntegerField(default=0)),
+                ('edx_course', models.ForeignKey(related_name='+', to='edx2canvas.EdxCourse')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PopulateJobItem',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('index', models.IntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('usage_id', models.CharField(default=b'', max_length=255, blank=True)),
+                ('position', models.IntegerField()),
+                ('graded', models.BooleanField(default=False)),
+                ('points', models.IntegerField(default=0)),
+                ('canvas_id', models.IntegerField(null=True, blank=True)),
+                ('error', models.TextField(default=b'', blank=True)),
+                ('job', models.ForeignKey(related_name='items', to='edx2canvas.PopulateJob')),
+                ('module', models.ForeignKey(related_name='+', blank=True, to='edx2canvas.PopulateJobItem', null=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='populatejobitem',
+            unique_together=set([('job', 'index')]),
+        ),
+    ]
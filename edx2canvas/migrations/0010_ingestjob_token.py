@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import edx2canvas.models
+
+
+def give_jobs_tokens(apps, schema_editor):
+    # The default is only evaluated once for the rows that already exist.
+    IngestJob = apps.get_model('edx2canvas', 'IngestJob')
+    for job in IngestJob.objects.all():
+        job.token = edx2canvas.models.new_job_token()
+        job.save(update_fields=['token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edx2canvas', '0009_populatejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='token',
+            field=models.CharField(default=edx2canvas.models.new_job_token, max_length=32, editable=False),
+        ),
+        migrations.RunPython(give_jobs_tokens, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+import json
+
 from django.db import models
+from django.utils.crypto import get_random_string
 
 
 class EdxCourse(models.Model):
@@ -7,6 +10,15 @@ class EdxCourse(models.Model):
     course = models.CharField(max_length=32)
     run = models.CharField(max_length=32)
     key_version = models.IntegerField()
+    # SHA-1 of the stored course structure; changes whenever it is re-uploaded.
+    content_hash = models.CharField(max_length=40, blank=True, default='')
+    # Number of EdxCourseNode rows indexing the stored course structure, or 0
+    # if it has not been indexed yet, and how many of them are problems.
+    node_count = models.IntegerField(default=0)
+    problem_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('org', 'course', 'run', 'key_version')
 
     def course_key(self):
         if self.key_version == 0:
@@ -16,6 +28,174 @@ class EdxCourse(models.Model):
         raise NotImplementedError()
 
 
+class EdxCourseNode(models.Model):
+    """
+    One node of the structure of an EdxCourse. Nodes are numbered in document
+    order, as they are in the compact course format (see course_index.py).
+    """
+    edx_course = models.ForeignKey(EdxCourse, related_name='nodes')
+    index = models.IntegerField()
+    # Index of the node's parent, or -1 for the course itself.
+    parent_index = models.IntegerField()
+    depth = models.IntegerField()
+    usage_id = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    node_type = models.CharField(max_length=64)
+    score = models.IntegerField(default=0)
+    child_count = models.IntegerField(default=0)
+    # The node's remaining attributes (display_name, id, parent...) as JSON.
+    attributes = models.TextField(default='{}')
+    # The display names of the node's ancestors below the course, as JSON.
+    path = models.TextField(default='[]')
+
+    class Meta:
+        unique_together = ('edx_course', 'index')
+        index_together = [('edx_course', 'parent_index'), ('edx_course', 'usage_id')]
+
+    def as_dict(self):
+        """
+        Return the node as it appears in the nested course structure, without
+        its children but with the number of children it has.
+        """
+        node = json.loads(self.attributes)
+        node['type'] = self.node_type
+        node['score'] = self.score
+        if self.usage_id:
+            node['usage_id'] = self.usage_id
+        node['child_count'] = self.child_count
+        return node
+
+    def title(self):
+        """
+        The title to give the node in Canvas. As in the course selector, a
+        component is named after its unit and its type.
+        """
+        path = json.loads(self.path)
+        if self.depth > 3 and path:
+            return '{} ({})'.format(path[-1], self.node_type)
+        return json.loads(self.attributes).get('display_name') or self.node_type
+
+
+class EdxCourseNodeTerm(models.Model):
+    """
+    An entry in the search index of course nodes: a word of a node's display
+    name, or its type (see course_index.py).
+    """
+    node = models.ForeignKey(EdxCourseNode, related_name='terms')
+    term = models.CharField(max_length=64, db_index=True)
+
+
+class Job(models.Model):
+    """
+    A unit of background work, queued in the database and run by the
+    process_jobs management command (see jobs.py).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        abstract = True
+
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+
+def new_job_token():
+    return get_random_string(32)
+
+
+class IngestJob(Job):
+    """
+    A course structure uploaded by bin/parse_course.py, waiting to be stored
+    and indexed (see ingest.py).
+    """
+    # The body of the upload request, as it was sent. It is cleared once the
+    # course has been stored.
+    payload = models.BinaryField()
+    content_encoding = models.CharField(max_length=16, blank=True, default='')
+    edx_course = models.ForeignKey(EdxCourse, null=True, blank=True, related_name='+')
+    # Given to the uploader, which sends it back to follow the job's progress
+    # without logging in (see views.get_ingest_job).
+    token = models.CharField(max_length=32, default=new_job_token, editable=False)
+
+
+class PopulateJob(Job):
+    """
+    A request to fill a Canvas course with modules and module items for the
+    content of an edX course: a module for each chapter, containing an item
+    for each subsection, unit or component of it (see autopopulate.py).
+    """
+    SUBSECTION = 'subsection'
+    UNIT = 'unit'
+    COMPONENT = 'component'
+    GRANULARITY_CHOICES = (
+        (SUBSECTION, 'Subsection'),
+        (UNIT, 'Unit'),
+        (COMPONENT, 'Component'),
+    )
+
+    edx_course = models.ForeignKey(EdxCourse, related_name='+')
+    canvas_course_id = models.CharField(max_length=64)
+    # The user whose Canvas API token the job uses.
+    lti_user_id = models.CharField(max_length=255)
+    granularity = models.CharField(max_length=16, choices=GRANULARITY_CHOICES)
+    create_assignments = models.BooleanField(default=False)
+    # Number of PopulateJobItems, including modules.
+    item_count = models.IntegerField(default=0)
+
+
+class PopulateJobItem(models.Model):
+    """
+    A module, or a module item, that a PopulateJob creates. Its canvas_id is
+    recorded as soon as it has been created, so that a job that is resumed
+    after its worker died does not create it again.
+    """
+    job = models.ForeignKey(PopulateJob, related_name='items')
+    index = models.IntegerField()
+    # The module that a module item goes in, or None for a module.
+    module = models.ForeignKey('self', null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=255)
+    usage_id = models.CharField(max_length=255, blank=True, default='')
+    position = models.IntegerField()
+    graded = models.BooleanField(default=False)
+    points = models.IntegerField(default=0)
+    canvas_id = models.IntegerField(null=True, blank=True)
+    # Why the item could not be created, if it could not.
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = ('job', 'index')
+
+
+class CanvasExternalTool(models.Model):
+    """
+    The ID of the Open edX LTI tool installed in a Canvas course, so that it
+    does not have to be looked up in Canvas for every item added to the course
+    (see canvas_api.get_external_tool_id).
+    """
+    canvas_course_id = models.CharField(max_length=64)
+    domain = models.CharField(max_length=255)
+    # Null until the tool has been found or installed.
+    tool_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('canvas_course_id', 'domain')
+
+
 class CanvasApiAuthorization(models.Model):
     lti_user_id = models.CharField(max_length=255, unique=True, db_index=True)
     canvas_api_token = models.CharField(max_length=255)
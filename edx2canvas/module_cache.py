@@ -0,0 +1,171 @@
+"""
+Caching of the module lists of Canvas courses.
+
+Listing the modules of a Canvas course (with their items) takes several pages
+of API calls, so rather than list them again after every module or item the
+tool creates, the list is kept in the Django cache named by
+CANVAS_MODULE_CACHE and patched with the object Canvas returns for the new
+module or item. Each version of a list is identified by a hash of its
+content, which lets a client that sent the version it has be sent only what
+changed (see populate.module_list_response).
+
+The list is fetched from Canvas again when it is not cached, and when a patch
+does not fit the cached copy (e.g. because the course has been edited in
+Canvas since the list was fetched). If CANVAS_MODULE_CACHE is not set,
+nothing is cached and the list is fetched after every change.
+"""
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+import canvas_api
+
+# How long a module list may be cached, in seconds, in case the course is
+# edited in Canvas in a way that no patch reveals.
+CACHE_TIMEOUT = 60 * 60
+
+# Patches to the list of a course are serialized by a lock in the cache, held
+# for at most LOCK_TIMEOUT seconds. A request that waits LOCK_WAIT seconds for
+# it fetches the list from Canvas instead.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+
+
+def get_modules(api_auth, canvas_course_id, refresh=False):
+    """
+    Return (version, modules) for a Canvas course, fetching the list from
+    Canvas if it is not cached or refresh is True.
+    """
+    modules = None
+    cache = _cache()
+    if cache is not None and not refresh:
+        modules = cache.get(_key(canvas_course_id))
+    if modules is None:
+        modules = _fetch(api_auth, canvas_course_id)
+    return version_of(modules), modules
+
+
+def add_module(api_auth, canvas_course_id, module):
+    """
+    Record a module that has just been created in a Canvas course, as returned
+    by canvas_api.create_canvas_module. Returns (previous_version, version,
+    modules), where previous_version is the version of the list that the
+    module was added to, or None if the list had to be fetched from Canvas.
+    """
+    return _update(api_auth, canvas_course_id, lambda modules: _insert_module(modules, module))
+
+
+def add_module_item(api_auth, canvas_course_id, item):
+    """
+    Record a module item that has just been created in a Canvas course, as
+    returned by canvas_api.create_canvas_module_item. Returns the same as
+    add_module.
+    """
+    return add_module_items(api_auth, canvas_course_id, [item])
+
+
+def add_module_items(api_auth, canvas_course_id, items):
+    """
+    Record module items that have just been created in a Canvas course, in the
+    order they were created, as one change to its module list.
+    """
+    return _update(
+        api_auth, canvas_course_id, lambda modules: all(_insert_item(modules, item) for item in items)
+    )
+
+
+def version_of(modules):
+    return hashlib.sha1(json.dumps(modules, sort_keys=True)).hexdigest()
+
+
+def _update(api_auth, canvas_course_id, patch):
+    cache = _cache()
+    if cache is not None:
+        with _lock(cache, canvas_course_id) as locked:
+            modules = cache.get(_key(canvas_course_id)) if locked else None
+            if modules is not None:
+                previous_version = version_of(modules)
+                if patch(modules):
+                    cache.set(_key(canvas_course_id), modules, CACHE_TIMEOUT)
+                    return previous_version, version_of(modules), modules
+    modules = _fetch(api_auth, canvas_course_id)
+    return None, version_of(modules), modules
+
+
+def _fetch(api_auth, canvas_course_id):
+    modules = canvas_api.get_module_list(api_auth, canvas_course_id)
+    cache = _cache()
+    if cache is not None:
+        cache.set(_key(canvas_course_id), modules, CACHE_TIMEOUT)
+    return modules
+
+
+def _insert_module(modules, module):
+    """
+    Insert a new module into a list of modules at its position, returning
+    False if it does not fit.
+    """
+    position = module.get('position')
+    if not position or position > len(modules) + 1:
+        return False
+    if any(str(m['id']) == str(module['id']) for m in modules):
+        return False
+    module.setdefault('items', [])
+    modules.insert(position - 1, module)
+    _renumber(modules)
+    return True
+
+
+def _insert_item(modules, item):
+    """
+    Insert a new item into its module at its position, returning False if the
+    module is not in the list or the item does not fit.
+    """
+    module = next((m for m in modules if str(m['id']) == str(item.get('module_id'))), None)
+    # Canvas leaves out the items of modules that have too many to include.
+    if module is None or 'items' not in module:
+        return False
+    items = module['items']
+    position = item.get('position')
+    if not position or position > len(items) + 1:
+        return False
+    if any(str(i['id']) == str(item['id']) for i in items):
+        return False
+    items.insert(position - 1, item)
+    _renumber(items)
+    if 'items_count' in module:
+        module['items_count'] = len(items)
+    return True
+
+
+def _renumber(entries):
+    for position, entry in enumerate(entries, 1):
+        entry['position'] = position
+
+
+@contextmanager
+def _lock(cache, canvas_course_id):
+    lock_key = _key(canvas_course_id) + ':lock'
+    deadline = time.time() + LOCK_WAIT
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    while not locked and time.time() < deadline:
+        time.sleep(0.01)
+        locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    try:
+        yield locked
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def _key(canvas_course_id):
+    return 'edx2canvas:modules:{}'.format(canvas_course_id)
+
+
+def _cache():
+    alias = getattr(settings, 'CANVAS_MODULE_CACHE', None)
+    return caches[alias] if alias else None
@@ -1,10 +1,30 @@
+import json
+import logging
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.db import connection
+from django.core.urlresolvers import reverse
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound, JsonResponse
 from django.views.decorators.http import require_http_methods
 
-from models import CanvasApiAuthorization, EdxCourse
+from canvas_sdk.exceptions import CanvasAPIError
+from models import CanvasApiAuthorization, EdxCourse, PopulateJob
+import autopopulate
 import canvas_api
+import course_index
+import module_cache
+
+log = logging.getLogger("edx2canvas.log")
+
+# The most items that add_to_canvas_batch accepts, and the number of threads
+# that it creates them with.
+# The most items add_to_canvas_batch creates in one request, so that it finishes
+# well within the request timeout. Larger fills go through start_populate_job.
+MAX_BATCH_SIZE = 50
+BATCH_CONCURRENCY = getattr(settings, 'CANVAS_BATCH_CONCURRENCY', 4)
 
 @login_required
 @require_http_methods(['POST'])
@@ -29,17 +49,19 @@ def add_to_canvas(request):
      - position: the zero-based index of the new item in the module list.
      - usage_id: an edX-defined identifier for the content to import.
      - graded: 'true' if an assignment should be created, 'false' if not.
+     - points: the number of points the assignment is worth, if graded.
+
+    The response is the module list of the Canvas course, or just the new
+    module item as 'item' (see module_list_response).
+
+    If the structure of the edX course has been indexed (see course_index.py),
+    the usage_id must be one of its nodes. The title is then optional, and
+    the points are taken from the course structure rather than the request.
     """
     try:
         edx_course_id = request.POST['edx_course_id']
         canvas_course_id = request.POST['canvas_course_id']
-        module_id = request.POST['module_id']
-        title = request.POST['title']
-        position = request.POST['position']
         usage_id = request.POST['usage_id']
-        graded = request.POST['graded'].lower() not in ('false', '0')
-        if graded:
-            points = request.POST['points']
         canvas_user_id = request.session['LTI_LAUNCH']['user_id']
     except KeyError as e:
         return HttpResponseBadRequest(e)
@@ -48,29 +70,82 @@ def add_to_canvas(request):
         edx_course = EdxCourse.objects.get(id=edx_course_id)
     except EdxCourse.DoesNotExist:
         return HttpResponseBadRequest()
-    edx_course_key = edx_course.course_key()
+
+    node = None
+    if edx_course.node_count:
+        node = course_index.lookup(edx_course, usage_id)
+        if node is None:
+            return HttpResponseBadRequest('Unknown usage_id')
+    try:
+        item = _plan_module_item(edx_course, node, request.POST)
+    except (KeyError, ValueError) as e:
+        return HttpResponseBadRequest(e)
 
     try:
         canvas_auth = CanvasApiAuthorization.objects.get(lti_user_id=canvas_user_id)
     except CanvasApiAuthorization.DoesNotExist:
         return HttpResponseForbidden()
 
-    external_tool_id = canvas_api.get_external_tool_id(canvas_auth, canvas_course_id)
+    created = _create_module_item(canvas_auth, canvas_course_id, item)
+    update = module_cache.add_module_item(canvas_auth, canvas_course_id, created)
+    return module_list_response(
+        request.POST.get('modules_version'), canvas_course_id, update, {'item': created}
+    )
 
-    if graded:
-        canvas_api.create_assignment_with_module_item(
-            canvas_auth, title, canvas_course_id, module_id, position,
-            external_tool_id, get_lti_url_for_usage_id(edx_course_key, usage_id),
-            points
-        )
-    else:
-        canvas_api.create_canvas_module_item(
-            canvas_auth, title, canvas_course_id, module_id, position,
-            external_tool_id, get_lti_url_for_usage_id(edx_course_key, usage_id)
-        )
+@login_required
+@require_http_methods(['POST'])
+def add_to_canvas_batch(request):
+    """
+    Create many module items in one Canvas course, as add_to_canvas does for
+    one, resolving the Open edX LTI tool and the edX courses and nodes of the
+    items once for the whole batch.
+
+    The request body is a JSON object with:
+     - canvas_course_id: a Canvas-defined course identifier.
+     - items: a list of up to MAX_BATCH_SIZE objects, each with the POST
+       parameters of add_to_canvas other than canvas_course_id.
+     - modules_version: optionally, the version of the module list that the
+       client has (see module_list_response).
+    If any item is invalid, none of them are created. To fill a course with
+    more items than that, use start_populate_job, which creates them in the
+    background and can resume after a failure.
+
+    The items of each module are created one at a time, in order of position,
+    so that each one ends up at the position asked for. Different modules are
+    filled concurrently, by up to BATCH_CONCURRENCY threads.
+
+    The response has 'results', with one object for each item, in the order
+    given: {'status': 'created', 'item': <the new module item>} or
+    {'status': 'failed', 'error': <the reason>}. It also has either the module
+    list of the course after the batch, or just the new items as 'items' (see
+    module_list_response).
+    """
+    try:
+        batch = json.loads(request.body)
+        canvas_course_id = batch['canvas_course_id']
+        items_params = batch['items']
+        canvas_user_id = request.session['LTI_LAUNCH']['user_id']
+    except (ValueError, KeyError, TypeError) as e:
+        return HttpResponseBadRequest(e)
+    if not isinstance(items_params, list) or len(items_params) > MAX_BATCH_SIZE:
+        return HttpResponseBadRequest('items must be a list of at most {}'.format(MAX_BATCH_SIZE))
 
-    module_list = canvas_api.get_module_list(canvas_auth, canvas_course_id)
-    return JsonResponse({'id': canvas_course_id, 'modules': module_list}, safe=False)
+    try:
+        items = _plan_module_items(items_params)
+    except (ValueError, KeyError, TypeError) as e:
+        return HttpResponseBadRequest(e)
+
+    try:
+        canvas_auth = CanvasApiAuthorization.objects.get(lti_user_id=canvas_user_id)
+    except CanvasApiAuthorization.DoesNotExist:
+        return HttpResponseForbidden()
+
+    external_tool_id = canvas_api.get_external_tool_id(canvas_auth, canvas_course_id)
+    results, created = create_module_items(canvas_auth, canvas_course_id, items, external_tool_id)
+    update = module_cache.add_module_items(canvas_auth, canvas_course_id, created)
+    return module_list_response(
+        batch.get('modules_version'), canvas_course_id, update, {'items': created}, results=results
+    )
 
 @login_required
 @require_http_methods(['POST'])
@@ -84,6 +159,10 @@ def create_canvas_module(request):
     - 'module_name': A name to give to the newly-created module.
     - 'position': A zero-based index into the module list, indicating where to
       insert the new module.
+
+    The response has the ID of the new module as 'module_id', and either the
+    module list of the course or just the new module as 'module' (see
+    module_list_response).
     """
     try:
         canvas_course_id = request.POST['canvas_course_id']
@@ -100,8 +179,268 @@ def create_canvas_module(request):
     module = canvas_api.create_canvas_module(
         canvas_auth, canvas_course_id, name, position
     )
-    module_list = canvas_api.get_module_list(canvas_auth, canvas_course_id)
-    return JsonResponse({'module_id': module['id'], 'modules': module_list}, safe=False)
+    update = module_cache.add_module(canvas_auth, canvas_course_id, module)
+    return module_list_response(
+        request.POST.get('modules_version'), canvas_course_id, update, {'module': module},
+        module_id=module['id']
+    )
+
+@login_required
+@require_http_methods(['POST'])
+def start_populate_job(request):
+    """
+    Queue a job to fill a Canvas course with the content of an edX course in
+    the background (see autopopulate.py).
+
+    This method expects the following POST parameters:
+    - 'edx_course_id': an ID into the EdxCourse model.
+    - 'canvas_course_id': the ID of the Canvas course to fill.
+    - 'granularity': 'subsection', 'unit' or 'component'; each module item
+      launches one piece of content of this kind.
+    - 'create_assignments': 'true' if problems should be added as graded
+      assignments.
+
+    The response is a 202 Accepted with the job_id of the job and its
+    item_count. Its progress can be followed with get_populate_job. If the
+    structure of the edX course is not stored, the response is a 404 Not
+    Found with an error.
+    """
+    try:
+        edx_course_id = request.POST['edx_course_id']
+        canvas_course_id = request.POST['canvas_course_id']
+        granularity = request.POST['granularity']
+        create_assignments = request.POST.get('create_assignments', 'false').lower() not in ('false', '0')
+        canvas_user_id = request.session['LTI_LAUNCH']['user_id']
+    except KeyError as e:
+        return HttpResponseBadRequest(e)
+    if granularity not in autopopulate.LEAF_DEPTHS:
+        return HttpResponseBadRequest('Unknown granularity')
+
+    try:
+        edx_course = EdxCourse.objects.get(id=edx_course_id)
+    except (EdxCourse.DoesNotExist, ValueError):
+        return HttpResponseBadRequest()
+    try:
+        CanvasApiAuthorization.objects.get(lti_user_id=canvas_user_id)
+    except CanvasApiAuthorization.DoesNotExist:
+        return HttpResponseForbidden()
+
+    try:
+        job = autopopulate.queue_populate(
+            edx_course, canvas_course_id, canvas_user_id, granularity, create_assignments
+        )
+    except IOError:
+        log.exception("Could not read the structure of edX course {}".format(edx_course.id))
+        return JsonResponse({'error': 'The structure of this edX course could not be read'}, status=404)
+    response = JsonResponse({'job_id': job.id, 'item_count': job.item_count}, status=202)
+    response['Location'] = '{}?job_id={}'.format(reverse('edx2canvas:populate_job'), job.id)
+    return response
+
+@login_required
+@require_http_methods(['GET'])
+def get_populate_job(request):
+    """
+    Report the progress of a job queued by start_populate_job, for the user
+    who started it.
+
+    Returns a JSON object with:
+    - job_id: the ID of the job.
+    - status: one of 'pending', 'running', 'succeeded' or 'failed'.
+    - item_count: the number of modules and module items to create.
+    - created: the number of them that have been created.
+    - failed: the number of them that could not be created.
+    - error: a description of the problem, if there was one.
+    """
+    try:
+        job_id = request.GET['job_id']
+        canvas_user_id = request.session['LTI_LAUNCH']['user_id']
+    except KeyError:
+        return HttpResponseBadRequest()
+    try:
+        job = PopulateJob.objects.get(id=job_id, lti_user_id=canvas_user_id)
+    except (PopulateJob.DoesNotExist, ValueError):
+        return HttpResponseNotFound()
+    created, failed = autopopulate.progress(job)
+    response = JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'item_count': job.item_count,
+        'created': created,
+        'failed': failed,
+        'error': job.error,
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def module_list_response(client_version, canvas_course_id, update, change, **fields):
+    """
+    Return the module list of a Canvas course after a change, given the result
+    of the module_cache update that recorded it, and any other fields to
+    include in the response.
+
+    If client_version (the 'modules_version' parameter of the request) is the
+    version of the list that was changed, only the change (a dict of fields)
+    is returned, with 'previous_version' set to that version. Otherwise the
+    whole list is returned as 'modules'. Either way, 'modules_version' is the
+    version of the list after the change.
+    """
+    previous_version, version, modules = update
+    response = dict(fields, id=canvas_course_id, modules_version=version)
+    if client_version and client_version == previous_version:
+        response.update(change, previous_version=previous_version)
+    else:
+        response['modules'] = modules
+    return JsonResponse(response)
+
+def _plan_module_item(edx_course, node, params):
+    """
+    Work out the module item to create for a piece of edX content, from the
+    parameters of add_to_canvas and the content's node in the course index
+    (or None if the course has not been indexed). Returns a dict of the
+    arguments for _create_module_item. Raises KeyError if a parameter that is
+    needed is missing, or ValueError if the position is not a number.
+    """
+    graded = str(params['graded']).lower() not in ('false', '0')
+    item = {
+        'module_id': params['module_id'],
+        'position': int(params['position']),
+        'graded': graded,
+        'lti_url': get_lti_url_for_usage_id(edx_course.course_key(), params['usage_id']),
+    }
+    if node is not None:
+        item['title'] = params.get('title') or node.title()
+        item['points'] = node.score
+    else:
+        item['title'] = params['title']
+        item['points'] = params['points'] if graded else None
+    return item
+
+def _plan_module_items(items_params):
+    """
+    Work out the module items to create for a batch, looking up the edX
+    courses and nodes of all of them at once. Raises ValueError if any item
+    refers to an unknown course or node, or KeyError if it lacks a parameter.
+    """
+    edx_course_ids = set(params['edx_course_id'] for params in items_params)
+    edx_courses = EdxCourse.objects.in_bulk(list(edx_course_ids))
+    nodes = {}
+    for edx_course in edx_courses.values():
+        if edx_course.node_count:
+            usage_ids = [
+                params['usage_id'] for params in items_params
+                if str(params['edx_course_id']) == str(edx_course.id)
+            ]
+            nodes[edx_course.id] = course_index.lookup_many(edx_course, usage_ids)
+
+    items = []
+    for params in items_params:
+        edx_course = edx_courses.get(int(params['edx_course_id']))
+        if edx_course is None:
+            raise ValueError('Unknown edx_course_id: {}'.format(params['edx_course_id']))
+        node = None
+        if edx_course.id in nodes:
+            node = nodes[edx_course.id].get(params['usage_id'])
+            if node is None:
+                raise ValueError('Unknown usage_id: {}'.format(params['usage_id']))
+        items.append(_plan_module_item(edx_course, node, params))
+    return items
+
+def _create_module_item(canvas_auth, canvas_course_id, item, external_tool_id=None):
+    """
+    Create a module item (and its assignment, if it is graded) in Canvas, as
+    planned by _plan_module_item. Returns the new module item.
+    """
+    if item['graded']:
+        assignment = create_with_external_tool(
+            canvas_auth, canvas_course_id,
+            lambda external_tool_id: canvas_api.create_assignment(
+                canvas_auth, item['title'], canvas_course_id, external_tool_id, item['lti_url'], item['points']
+            ),
+            external_tool_id
+        )
+        # The module item does not refer to the tool, so it is not retried with
+        # another one, which would create the assignment a second time.
+        return canvas_api.create_assignment_module_item(
+            canvas_auth, item['title'], canvas_course_id, item['module_id'], item['position'],
+            assignment['id']
+        )
+    return create_with_external_tool(
+        canvas_auth, canvas_course_id,
+        lambda external_tool_id: canvas_api.create_canvas_module_item(
+            canvas_auth, item['title'], canvas_course_id, item['module_id'], item['position'],
+            external_tool_id, item['lti_url']
+        ),
+        external_tool_id
+    )
+
+def create_module_items(canvas_auth, canvas_course_id, items, external_tool_id, checkpoint=None):
+    """
+    Create a batch of module items, as planned by _plan_module_item, filling
+    each module in order of position and up to BATCH_CONCURRENCY modules at a
+    time. Returns the result for each item, and the items that were created in
+    the order they were created in each module.
+
+    If checkpoint is given, it is called with the index and the result of
+    each item as soon as the item has been dealt with.
+    """
+    modules = OrderedDict()
+    for index, item in enumerate(items):
+        modules.setdefault(str(item['module_id']), []).append(index)
+    for indices in modules.values():
+        indices.sort(key=lambda index: items[index]['position'])
+    results = [None] * len(items)
+
+    def fill_module(indices):
+        try:
+            for index in indices:
+                try:
+                    new_item = _create_module_item(
+                        canvas_auth, canvas_course_id, items[index], external_tool_id
+                    )
+                    results[index] = {'status': 'created', 'item': new_item}
+                except Exception as e:
+                    log.exception("Failed to create module item %s of a batch", index)
+                    results[index] = {'status': 'failed', 'error': str(e)}
+                if checkpoint is not None:
+                    checkpoint(index, results[index])
+        finally:
+            # Each thread has its own database connection.
+            connection.close()
+
+    if modules:
+        pool = ThreadPool(min(BATCH_CONCURRENCY, len(modules)))
+        try:
+            pool.map(fill_module, modules.values())
+        finally:
+            pool.close()
+            pool.join()
+    created = [
+        results[index]['item']
+        for indices in modules.values() for index in indices
+        if results[index]['status'] == 'created'
+    ]
+    return results, created
+
+def create_with_external_tool(canvas_auth, canvas_course_id, create_item, external_tool_id=None):
+    """
+    Call create_item with the ID of the Open edX LTI tool in a Canvas course,
+    looking it up if it is not given. The ID is remembered between calls, so
+    if Canvas rejects the item it is looked up again, in case the tool has
+    been removed from the course, and the item is created again if the tool
+    has changed. create_item must make a single Canvas object, so that a
+    rejected call has created nothing.
+    """
+    if external_tool_id is None:
+        external_tool_id = canvas_api.get_external_tool_id(canvas_auth, canvas_course_id)
+    try:
+        return create_item(external_tool_id)
+    except CanvasAPIError as e:
+        if e.status_code not in (400, 404):
+            raise
+        current_tool_id = canvas_api.get_external_tool_id(canvas_auth, canvas_course_id, refresh=True)
+        if current_tool_id == external_tool_id:
+            raise
+        return create_item(current_tool_id)
 
 def get_lti_url_for_usage_id(edx_course_key, usage_id):
     return "{}/lti_provider/courses/{}/{}".format(
@@ -13,8 +13,8 @@ $(document).ready(function () {
 });
 
 function initializeEdxCourseSelector() {
-    $('#edx_class_selector li').on('click', function () {
-        var data = {edx_course_id: $(this).data("id")};
+    $('#edx_class_selector').on('click', 'li[data-id]', function () {
+        var data = {edx_course_id: $(this).data("id"), format: 'outline'};
         $.get("/edx2canvas/edx_course", data).done(
             function (data) {
                 var dropdownText = data['display_name'];
@@ -23,34 +23,154 @@ function initializeEdxCourseSelector() {
                 populateEdxCourse(data)
             });
     });
+    // Only the first page of a large catalog is in the page; the rest is
+    // found by searching it on the server.
+    var filterTimer = null;
+    $('#edx_catalog_filter').on('click', function (e) {
+        e.stopPropagation()
+    }).on('keyup', function () {
+        var query = $(this).val();
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(function () {
+            filterEdxCatalog(query)
+        }, 250)
+    });
+}
+
+function filterEdxCatalog(query) {
+    $.get("/edx2canvas/edx_course/catalog", {q: query}).done(
+        function (data) {
+            var menu = $('#edx_class_selector .dropdown-menu');
+            menu.children('li[data-id]').remove();
+            for (var idx = 0; idx < data.courses.length; idx++) {
+                var item = $('<li role="presentation"><a role="menuitem" tabindex="-1" href="#"></a></li>');
+                item.attr('data-id', data.courses[idx].id);
+                item.find('a').text(data.courses[idx].title);
+                menu.append(item)
+            }
+        });
 }
 
+// Render a course outline (or a whole course). The units of a subsection, and
+// the components of a unit, are rendered with it if they are present, or
+// fetched when it is first expanded if not.
 function populateEdxCourse(data) {
     $("#edx_structure").empty();
     $("#edx_structure").data('course_id', data.id);
     var context = {course_id: data.id, children: data.children};
     $("#edx_structure").html(Handlebars.compile($("#edx-panel-group-template").html())(context));
     intializeEdxDragging(data);
+    for (section_idx in data.children) {
+        var section = data.children[section_idx];
+        for (subsection_idx in section.children) {
+            var subsection = section.children[subsection_idx];
+            if (subsection.children) {
+                renderEdxChildren($("#subsectionFromList" + subsection.id), subsection.children)
+            }
+        }
+    }
     initializeNavigation()
 }
 
+function loadEdxChildren(element, callback) {
+    if (element.data('loaded') || element.data('child_count') == 0) {
+        callback();
+        return
+    }
+    var data = {edx_course_id: element.data('course_id'), usage_id: element.data('usage_id')};
+    $.get("/edx2canvas/edx_course/children", data).done(
+        function (response) {
+            renderEdxChildren(element, response.children);
+            callback()
+        });
+}
+
+// Add the units of a subsection, or the components of a unit, to the page.
+function renderEdxChildren(element, children) {
+    var isSubsection = element.hasClass('nav_subsection');
+    var template = isSubsection ? "#edx-unit-group-template" : "#edx-component-group-template";
+    var context = {course_id: element.data('course_id'), unit_title: element.data('title'), children: children};
+    element.append(Handlebars.compile($(template).html())(context));
+    element.data('loaded', true);
+    element.children(".nav_unit, .nav_component").hide();
+    for (idx in children) {
+        var child = children[idx];
+        if (isSubsection) {
+            Sortable.create($("#unitFromList" + child.id)[0], edXSortableParams());
+            if (child.children) {
+                renderEdxChildren($("#unitFromList" + child.id), child.children)
+            }
+        } else {
+            Sortable.create($("#componentFromList" + child.id)[0], edXSortableParams())
+        }
+    }
+}
+
+// The module list of the Canvas course, as last sent by the server. Requests
+// that add to it send its version, and get back either just what they added
+// or, if the list has changed in the meantime, the whole list (see
+// edx2canvas/module_cache.py).
+var canvasCourse = null;
+
 function populateCanvasCourse(data, selected, padEmpty) {
+    if (!updateCanvasCourse(data)) {
+        return
+    }
     $("#canvas_structure").empty();
+    var modules = $.extend(true, [], canvasCourse.modules);
     if (padEmpty) {
-        for (var idx in data['modules']) {
-            var module = data['modules'][idx];
+        for (var idx in modules) {
+            var module = modules[idx];
             if (module.items.length == 0) {
                 module.items.push({id: 0, title: 'Drag edX content here.'})
             }
         }
     }
-    var context = {modules: data['modules']};
+    var context = {modules: modules};
     $("#canvas_structure").html(Handlebars.compile($("#canvas-panel-group-template").html())(context));
-    $("#canvas_structure").data('course_id', data['id']);
+    $("#canvas_structure").data('course_id', canvasCourse.id);
     if (selected != null) {
         $(selected).addClass("in")
     }
-    intializeCanvasDragging(data['modules'])
+    intializeCanvasDragging(modules)
+}
+
+// Bring canvasCourse up to date with a response from the server. Returns
+// false if the response is a change to an older version of the list, which
+// a whole list received since then already includes.
+function updateCanvasCourse(data) {
+    if (data.modules) {
+        canvasCourse = {id: data.id, modules: data.modules, modules_version: data.modules_version};
+        return true
+    }
+    if (canvasCourse == null || data.previous_version != canvasCourse.modules_version) {
+        return false
+    }
+    if (data.module) {
+        insertAtPosition(canvasCourse.modules, $.extend({items: []}, data.module))
+    }
+    var items = data.items || (data.item ? [data.item] : []);
+    for (var itemIdx = 0; itemIdx < items.length; itemIdx++) {
+        for (var idx in canvasCourse.modules) {
+            if (canvasCourse.modules[idx].id == items[itemIdx].module_id) {
+                insertAtPosition(canvasCourse.modules[idx].items, items[itemIdx])
+            }
+        }
+    }
+    canvasCourse.modules_version = data.modules_version;
+    return true
+}
+
+// Insert a module or item into a list at its (one-based) Canvas position.
+function insertAtPosition(list, entry) {
+    list.splice(entry.position - 1, 0, entry);
+    for (var idx = 0; idx < list.length; idx++) {
+        list[idx].position = idx + 1
+    }
+}
+
+function canvasModulesVersion() {
+    return canvasCourse == null ? null : canvasCourse.modules_version
 }
 
 function intializeEdxDragging(data) {
@@ -60,15 +180,7 @@ function intializeEdxDragging(data) {
             Sortable.create($("#fromList" + section.id)[0], edXSortableParams());
             for (subsection_idx in section.children) {
                 var subsection = section.children[subsection_idx];
-                Sortable.create($("#subsectionFromList" + subsection.id)[0], edXSortableParams());
-                for (unit_idx in subsection.children) {
-                    var unit = subsection.children[unit_idx];
-                    Sortable.create($("#unitFromList" + unit.id)[0], edXSortableParams());
-                    for (component_id in unit.children) {
-                        var component = unit.children[component_id];
-                        Sortable.create($("#componentFromList" + component.id)[0], edXSortableParams())
-                    }
-                }
+                Sortable.create($("#subsectionFromList" + subsection.id)[0], edXSortableParams())
             }
         }
     }
@@ -101,24 +213,30 @@ function canvasSortableParams() {
 }
 
 function initializeNavigation() {
-    $(".subsection_expand").on('click', function (e) {
-        clearNavHighlight();
-        $(".nav_unit").hide();
-        $(".nav_component").hide();
-        unit = $(this).parent().parent();
-        unit.children(".nav_unit").slideDown();
-        updateLtiFrame(unit);
-        unit.addClass('highlighted_element')
+    // Units and components are added to the page as they are expanded, so
+    // their handlers are bound to #edx_structure.
+    $("#edx_structure").off('click').on('click', '.subsection_expand', function (e) {
+        var unit = $(this).parent().parent();
+        loadEdxChildren(unit, function () {
+            clearNavHighlight();
+            $(".nav_unit").hide();
+            $(".nav_component").hide();
+            unit.children(".nav_unit").slideDown();
+            updateLtiFrame(unit);
+            unit.addClass('highlighted_element')
+        })
     });
-    $(".unit_expand").on('click', function (e) {
-        clearNavHighlight();
-        $(".nav_component").hide();
-        component = $(this).parent().parent();
-        component.children(".nav_component").slideDown();
-        updateLtiFrame(component);
-        component.addClass('highlighted_element')
+    $("#edx_structure").on('click', '.unit_expand', function (e) {
+        var component = $(this).parent().parent();
+        loadEdxChildren(component, function () {
+            clearNavHighlight();
+            $(".nav_component").hide();
+            component.children(".nav_component").slideDown();
+            updateLtiFrame(component);
+            component.addClass('highlighted_element')
+        })
     });
-    $(".component_expand").on('click', function (e) {
+    $("#edx_structure").on('click', '.component_expand', function (e) {
         clearNavHighlight();
         component = $(this).parent().parent();
         updateLtiFrame(component);
@@ -153,7 +271,8 @@ function moduleDragged(evt) {
         title: $(evt.item).data("title"),
         position: evt.newIndex + 1,
         graded: $(evt.item).data("type") == "problem",
-        points: $(evt.item).data("points")
+        points: $(evt.item).data("points"),
+        modules_version: canvasModulesVersion()
     };
     evt.item.innerText = "Adding to Canvas...";
     $.post("/edx2canvas/add_to_canvas", data).done(
@@ -163,6 +282,7 @@ function moduleDragged(evt) {
 }
 
 function addToCanvas(data) {
+    data.modules_version = canvasModulesVersion();
     $.post("/edx2canvas/add_to_canvas", data).done(
         function (data) {
             populateCanvasCourse(data, null, true)
@@ -176,7 +296,7 @@ function initializeAutopopulation() {
         console.log("Populating. Creating assignments: " + createAssignments);
         var granularity = $("#autopopulate_granularity").find(".selected_granularity").prop('value')
         if (granularity != undefined) {
-            autoPopulate(".nav_" + granularity, createAssignments)
+            startPopulateJob(granularity, createAssignments)
         }
     })
     $("#autopopulate_granularity").find(".btn").on('click', function () {
@@ -187,81 +307,44 @@ function initializeAutopopulation() {
     })
 }
 
-function autoPopulate(leafSelector, createAssignments) {
-    totalCalls = 0;
-    $('.edx-panel').each(function () {
-        var name = $(this).find('a').html().trim();
-        if (name != null && name.length > 0) {
-            totalCalls++;
-            $(this).find(leafSelector).each(function () {
-                totalCalls++
-            })
-        }
-    });
-    callsMade = 0;
-    $('#button_bar').hide()
-    var progress = $('#populate_progress_bar')
-    progress.show()
-
-    var position = 0
-    $('.edx-panel').each(function () {
-        var name = $(this).find('a').html().trim();
-        if (name != null && name.length > 0) {
-            var module_data = {
-                canvas_course_id: $('#canvas_structure').data('course_id'),
-                module_name: $(this).find('a').html().trim(),
-                position: position++
-            };
-            $.ajax({
-                type: "POST",
-                url: "/edx2canvas/create_canvas_module",
-                data: module_data,
-                success: autoPopulateChildren($(this), leafSelector, createAssignments)
-            });
-        }
-    })
+// The Canvas course is filled by a job on the server (see
+// edx2canvas/autopopulate.py), which carries on if the page is closed. The
+// page just follows its progress.
+function startPopulateJob(granularity, createAssignments) {
+    var data = {
+        edx_course_id: $("#edx_structure").data('course_id'),
+        canvas_course_id: $('#canvas_structure').data('course_id'),
+        granularity: granularity,
+        create_assignments: createAssignments
+    };
+    $('#button_bar').hide();
+    $('#progress-bar').css('width', "0%");
+    $('#populate_progress_bar').show();
+    $.post("/edx2canvas/populate/new", data).done(
+        function (response) {
+            pollPopulateJob(response.job_id)
+        });
 }
 
-function autoPopulateChildren(parent, leafSelector, createAssignments) {
-    return function (response) {
-        updateProcess();
-        populateCanvasCourse(response, null, true);
-        var module_id = response.module_id;
-        var position = 0;
-        parent.find(leafSelector).each(function () {
-            if (filterElement($(this).data("type"))) {
-                updateProcess()
-            } else {
-                var module_item_data = {
-                    usage_id: $(this).data("usage_id"),
-                    module_id: module_id,
-                    edx_course_id: $(this).data("course_id"),
-                    canvas_course_id: $('#canvas_structure').data('course_id'),
-                    title: $(this).data('title'),
-                    position: position++,
-                    graded: $(this).data("points") != 0 && createAssignments,
-                    points: $(this).data("points")
-                };
-                $.post("/edx2canvas/add_to_canvas", module_item_data).done(
-                    function (response) {
-                        updateProcess()
-                        populateCanvasCourse(response, '.canvas-collapse', false);
+function pollPopulateJob(jobId) {
+    $.get("/edx2canvas/populate/job", {job_id: jobId}).done(
+        function (job) {
+            var percentage = job.item_count ? (job.created + job.failed) / job.item_count * 100 : 100;
+            $('#progress-bar').css('width', percentage + "%");
+            if (job.status == 'succeeded' || job.status == 'failed') {
+                if (job.error) {
+                    console.log("Populating finished: " + job.error)
+                }
+                $('#populate_progress_bar').hide();
+                $('#button_bar').show();
+                $.get("/edx2canvas/canvas_modules", {course_id: $('#canvas_structure').data('course_id')}).done(
+                    function (data) {
+                        populateCanvasCourse(data, null, true)
                     });
+            } else {
+                setTimeout(function () {
+                    pollPopulateJob(jobId)
+                }, 1000)
             }
-        })
-    }
-}
-
-function filterElement(type) {
-    return type == 'discussion'
+        });
 }
-
-function updateProcess() {
-    callsMade++;
-    var percentage = callsMade / totalCalls * 100
-    $('#progress-bar').css('width', percentage + "%")
-    if (callsMade == totalCalls) {
-        $('#populate_progress_bar').hide()
-        $('#button_bar').show()
-    }
-}
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Storage backends for uploaded course structures.
+
+Each backend stores files by name, and raises IOError when asked to read a
+file that does not exist:
+
+- FileSystemStorage keeps them in a local directory.
+- S3Storage keeps them in a folder of an S3 bucket.
+- MemoryStorage keeps them in a dict, for tests.
+
+A CachingStorage can be put in front of a remote backend to keep copies of
+the files it reads on local disk.
+
+get_storage() returns the backend configured in the settings: S3 if
+STORE_FILES_IN_S3 is set, or the courses/ directory otherwise, cached in
+COURSES_CACHE_DIRECTORY if that is set.
+"""
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+
+from boto.exception import S3ResponseError
+from boto.s3.connection import S3Connection
+from django.conf import settings
+
+import course_format
+
+log = logging.getLogger("edx2canvas.log")
+
+
+class CourseStorage(object):
+
+    def read(self, name, version=None):
+        """
+        Return the contents of a file. The version, if given, identifies the
+        current contents of the file (such as its content hash), and is used
+        by caching backends to tell stale copies from current ones.
+        """
+        raise NotImplementedError()
+
+    def write(self, name, data, content_encoding=None):
+        raise NotImplementedError()
+
+
+class FileSystemStorage(CourseStorage):
+
+    def __init__(self, directory='courses'):
+        self.directory = directory
+
+    def read(self, name, version=None):
+        with open(os.path.join(self.directory, name), 'rb') as infile:
+            return infile.read()
+
+    def write(self, name, data, content_encoding=None):
+        # Write to a temporary file and rename it into place, so that readers
+        # never see a partly written file.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                outfile.write(data)
+            os.rename(temp_path, os.path.join(self.directory, name))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def delete(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+
+class S3Storage(CourseStorage):
+    """
+    Stores files in a folder of an S3 bucket. The connection and bucket
+    handles are created once per thread of each process and then reused, so
+    that their HTTP connections are kept alive between requests.
+    """
+    def __init__(self, bucket_name, folder='', connection_factory=S3Connection):
+        self.bucket_name = bucket_name
+        self.folder = folder or ''
+        self.connection_factory = connection_factory
+        self._local = threading.local()
+
+    def read(self, name, version=None):
+        key = self._bucket().new_key(self._key_name(name))
+        try:
+            return key.get_contents_as_string()
+        except S3ResponseError as e:
+            if e.status == 404:
+                raise IOError("No such course file: {}".format(key.name))
+            raise
+
+    def write(self, name, data, content_encoding=None):
+        log.info("writing file to s3")
+        headers = {'Content-Type': 'application/json'}
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        key = self._bucket().new_key(self._key_name(name))
+        key.set_contents_from_string(data, headers=headers)
+
+    def _key_name(self, name):
+        return os.path.join(self.folder, name)
+
+    def _bucket(self):
+        # Handles inherited from a parent process are not shared with it.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = self.connection_factory()
+            # Skip the HEAD request that checks that the bucket exists.
+            self._local.bucket = connection.get_bucket(self.bucket_name, validate=False)
+            self._local.pid = os.getpid()
+        return self._local.bucket
+
+
+class MemoryStorage(CourseStorage):
+
+    def __init__(self):
+        self.files = {}
+
+    def read(self, name, version=None):
+        try:
+            return self.files[name]
+        except KeyError:
+            raise IOError("No such course file: {}".format(name))
+
+    def write(self, name, data, content_encoding=None):
+        self.files[name] = data
+
+
+class CachingStorage(CourseStorage):
+    """
+    Reads files through a local directory. Only files read with a version are
+    cached, and only the most recently read version of each is kept.
+    """
+    def __init__(self, backend, cache_directory):
+        self.backend = backend
+        self.cache = FileSystemStorage(cache_directory)
+
+    def read(self, name, version=None):
+        if not version:
+            return self.backend.read(name)
+        cached_name = self._cached_name(name, version)
+        try:
+            return self.cache.read(cached_name)
+        except IOError:
+            pass
+        data = self.backend.read(name, version)
+        for path in glob.glob(os.path.join(self.cache.directory, self._cached_name(name, '*'))):
+            self.cache.delete(os.path.basename(path))
+        self.cache.write(cached_name, data)
+        return data
+
+    def write(self, name, data, content_encoding=None):
+        self.backend.write(name, data, content_encoding)
+
+    def _cached_name(self, name, version):
+        return '{}.{}'.format(version, name)
+
+
+def compress(data):
+    """
+    Compress data with gzip, as courses are stored.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def read_course(edx_course):
+    """
+    Return the stored compact JSON for a course, gzip-compressed. Courses
+    uploaded before courses were stored compressed are converted as they are
+    read. Raises IOError if the course does not exist.
+    """
+    storage = get_storage()
+    try:
+        return storage.read('%s.json.gz' % edx_course.id, edx_course.content_hash)
+    except IOError:
+        course = json.loads(storage.read('%s.json' % edx_course.id))
+        if not course_format.is_compact(course):
+            course = course_format.compact_course(course)
+        return compress(json.dumps(course, separators=(',', ':')))
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = _create_storage()
+    return _storage
+
+
+def _create_storage():
+    if getattr(settings, 'STORE_FILES_IN_S3', False):
+        storage = S3Storage(settings.COURSES_BUCKET, settings.COURSES_FOLDER)
+        cache_directory = getattr(settings, 'COURSES_CACHE_DIRECTORY', None)
+        if cache_directory:
+            if not os.path.isdir(cache_directory):
+                os.makedirs(cache_directory)
+            storage = CachingStorage(storage, cache_directory)
+        return storage
+    return FileSystemStorage()
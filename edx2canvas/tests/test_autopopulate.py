@@ -0,0 +1,140 @@
+from django.test import TestCase
+from mock import patch
+
+from edx2canvas import autopopulate, course_format, course_index, jobs
+from edx2canvas.models import CanvasApiAuthorization, EdxCourse, PopulateJob, PopulateJobItem
+
+
+def node(node_type, node_id, parent, children=(), score=0):
+    return {
+        'type': node_type, 'id': node_id, 'parent': parent, 'score': score,
+        'display_name': node_id.title(),
+        'usage_id': 'block-v1:org+course+run+type@{}+block@{}'.format(node_type, node_id),
+        'children': list(children),
+    }
+
+
+class SerialPool(object):
+    """
+    Runs the work given to a ThreadPool in the calling thread, where the test
+    database can be seen.
+    """
+    def __init__(self, processes):
+        pass
+
+    def map(self, function, iterable):
+        return map(function, iterable)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class TestAutopopulate(TestCase):
+
+    def setUp(self):
+        super(TestAutopopulate, self).setUp()
+        self.edx_course = EdxCourse.objects.create(
+            title='title', org='org', course='course', run='run', key_version=1
+        )
+        course = node('course', 'run', None, [
+            node('chapter', 'ch1', 'run', [
+                node('sequential', 'seq1', 'ch1', [
+                    node('vertical', 'vert1', 'seq1', [
+                        node('problem', 'p1', 'vert1', score=2),
+                        node('discussion', 'd1', 'vert1'),
+                    ]),
+                ]),
+            ]),
+            node('chapter', 'ch2', 'run', [
+                node('sequential', 'seq2', 'ch2', [
+                    node('vertical', 'vert2', 'seq2', [node('html', 'h1', 'vert2')]),
+                    node('vertical', 'vert3', 'seq2', [node('html', 'h2', 'vert3')]),
+                ]),
+            ]),
+        ])
+        course_index.build_index(self.edx_course, course_format.compact_course(course))
+        CanvasApiAuthorization.objects.create(lti_user_id='user', canvas_api_token='token')
+        for name, return_value in [
+            ('get_external_tool_id', 12),
+            ('create_canvas_module', None),
+            ('create_canvas_module_item', None),
+            ('create_assignment', None),
+            ('create_assignment_module_item', None),
+            ('throttle_state', {}),
+        ]:
+            new_patch = patch('edx2canvas.canvas_api.' + name, return_value=return_value)
+            setattr(self, name, new_patch.start())
+            self.addCleanup(new_patch.stop)
+        self.create_canvas_module.side_effect = lambda auth, course_id, title, position: {'id': 100 + position}
+        item = lambda auth, title, course_id, module_id, position, *args: {'id': module_id * 10 + position}
+        self.create_canvas_module_item.side_effect = item
+        self.create_assignment.side_effect = lambda *args: {'id': 999}
+        self.create_assignment_module_item.side_effect = item
+        for new_patch in [
+            patch('edx2canvas.module_cache.get_modules'),
+            patch('edx2canvas.populate.ThreadPool', SerialPool),
+        ]:
+            new_patch.start()
+            self.addCleanup(new_patch.stop)
+
+    def queue(self, granularity, create_assignments=True):
+        return autopopulate.queue_populate(self.edx_course, '256', 'user', granularity, create_assignments)
+
+    def test_plan_components(self):
+        job = self.queue(PopulateJob.COMPONENT)
+        items = job.items.order_by('index')
+        self.assertEqual(job.item_count, 5)
+        self.assertEqual(
+            [(item.title, item.module_id is None, item.position, item.graded) for item in items],
+            [
+                ('Ch1', True, 1, False), ('Vert1 (problem)', False, 1, True),
+                ('Ch2', True, 2, False), ('Vert2 (html)', False, 1, False), ('Vert3 (html)', False, 2, False),
+            ]
+        )
+
+    def test_plan_subsections(self):
+        job = self.queue(PopulateJob.SUBSECTION, create_assignments=False)
+        self.assertEqual(
+            list(job.items.order_by('index').values_list('title', flat=True)),
+            ['Ch1', 'Seq1', 'Ch2', 'Seq2']
+        )
+
+    def test_run_job(self):
+        job = self.queue(PopulateJob.COMPONENT)
+        self.assertEqual(jobs.run_next_job(), job)
+        job = PopulateJob.objects.get(id=job.id)
+        self.assertEqual(job.status, PopulateJob.SUCCEEDED)
+        self.assertEqual(autopopulate.progress(job), (5, 0))
+        self.assertEqual(
+            list(job.items.order_by('index').values_list('canvas_id', flat=True)),
+            [101, 1011, 102, 1021, 1022]
+        )
+        self.assertEqual(self.create_assignment.call_count, 1)
+        self.assertEqual(self.create_assignment_module_item.call_count, 1)
+        self.assertEqual(self.create_canvas_module_item.call_count, 2)
+
+    def test_resumes_from_checkpoint(self):
+        job = self.queue(PopulateJob.COMPONENT)
+        job.items.filter(index__in=(1, 2)).update(canvas_id=1)
+        autopopulate.run_job(job)
+        self.assertEqual(self.create_canvas_module.call_count, 1)
+        self.assertEqual(self.create_assignment.call_count, 0)
+        self.assertEqual(self.create_canvas_module_item.call_count, 2)
+
+    def test_failed_item(self):
+        self.create_canvas_module_item.side_effect = ValueError('no')
+        job = self.queue(PopulateJob.COMPONENT)
+        autopopulate.run_job(job)
+        self.assertEqual(job.status, PopulateJob.SUCCEEDED)
+        self.assertEqual(job.error, '2 items could not be created')
+        self.assertEqual(autopopulate.progress(job), (3, 2))
+
+    def test_failed_module(self):
+        self.create_canvas_module.side_effect = ValueError('no')
+        job = self.queue(PopulateJob.COMPONENT)
+        autopopulate.run_job(job)
+        self.assertEqual(job.status, PopulateJob.FAILED)
+        self.assertEqual(PopulateJobItem.objects.filter(canvas_id__isnull=False).count(), 0)
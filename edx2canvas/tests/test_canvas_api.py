@@ -0,0 +1,231 @@
+from unittest import TestCase
+from django.test import TestCase as DjangoTestCase, override_settings
+from mock import patch, MagicMock
+
+from canvas_sdk.exceptions import CanvasAPIError
+
+from edx2canvas import canvas_api
+from edx2canvas.models import CanvasApiAuthorization, CanvasExternalTool
+from edx2canvas.throttle import Throttle
+
+
+def canvas_response(status_code=200, remaining=None, text=''):
+    response = MagicMock(status_code=status_code, text=text, headers={})
+    if remaining is not None:
+        response.headers['X-Rate-Limit-Remaining'] = str(remaining)
+    return response
+
+
+class TestContextCache(TestCase):
+
+    def setUp(self):
+        super(TestContextCache, self).setUp()
+        self.now = 1000
+        self.cache = canvas_api.ContextCache(
+            max_contexts=2, idle_timeout=60, pool_size=4, max_concurrency=8, clock=lambda: self.now
+        )
+        new_patch = patch(
+            'edx2canvas.canvas_api.PooledRequestContext', side_effect=lambda *args, **kwargs: MagicMock()
+        )
+        self.context_mock = new_patch.start()
+        self.addCleanup(new_patch.stop)
+
+    def test_reuses_context(self):
+        context = self.cache.get('token1')
+        self.assertIs(self.cache.get('token1'), context)
+        self.assertIsNot(self.cache.get('token2'), context)
+
+    def test_contexts_share_adapter(self):
+        self.cache.get('token1')
+        self.cache.get('token2')
+        first_adapter = self.context_mock.call_args_list[0][0][0]
+        second_adapter = self.context_mock.call_args_list[1][0][0]
+        self.assertIs(first_adapter, second_adapter)
+        self.assertEqual(self.context_mock.call_args[1]['auth_token'], 'token2')
+
+    def test_evict(self):
+        context = self.cache.get('token1')
+        self.cache.evict('token1')
+        self.assertIsNot(self.cache.get('token1'), context)
+
+    def test_evicts_idle_contexts(self):
+        context = self.cache.get('token1')
+        self.now += 60
+        self.assertIsNot(self.cache.get('token1'), context)
+
+    def test_evicts_least_recently_used(self):
+        first = self.cache.get('token1')
+        second = self.cache.get('token2')
+        self.cache.get('token1')
+        self.cache.get('token3')
+        self.assertIs(self.cache.get('token1'), first)
+        self.assertIsNot(self.cache.get('token2'), second)
+
+
+class TestThrottle(TestCase):
+
+    def setUp(self):
+        super(TestThrottle, self).setUp()
+        self.throttle = Throttle(max_concurrency=8)
+
+    def test_starts_at_half_concurrency(self):
+        self.assertEqual(self.throttle.state()['limit'], 4)
+
+    def test_raises_limit_while_quota_lasts(self):
+        for _ in range(40):
+            self.throttle.record(canvas_response(remaining=600))
+        self.assertEqual(self.throttle.state()['limit'], 8)
+        self.assertEqual(self.throttle.state()['remaining'], 600)
+
+    def test_halves_limit_when_quota_runs_low(self):
+        self.throttle.record(canvas_response(remaining=100))
+        self.assertEqual(self.throttle.state()['limit'], 2)
+        self.assertFalse(self.throttle.was_throttled())
+
+    def test_halves_limit_when_throttled(self):
+        with self.throttle:
+            self.throttle.record(canvas_response(403, text='403 Forbidden (Rate Limit Exceeded)'))
+            self.assertTrue(self.throttle.was_throttled())
+        self.assertEqual(self.throttle.state()['limit'], 2)
+        self.assertEqual(self.throttle.state()['throttled_count'], 1)
+        with self.throttle:
+            self.assertFalse(self.throttle.was_throttled())
+
+    def test_counts_calls_in_flight(self):
+        with self.throttle:
+            self.assertEqual(self.throttle.state()['in_flight'], 1)
+        self.assertEqual(self.throttle.state()['in_flight'], 0)
+
+
+class TestRetries(TestCase):
+
+    def setUp(self):
+        super(TestRetries, self).setUp()
+        self.api_auth = CanvasApiAuthorization(canvas_api_token='token')
+        self.context = MagicMock(throttle=Throttle(max_concurrency=8))
+        for name, kwargs in (
+            ('_get_context', {'return_value': self.context}),
+            ('time.sleep', {}),
+        ):
+            new_patch = patch('edx2canvas.canvas_api.' + name, **kwargs)
+            new_patch.start()
+            self.addCleanup(new_patch.stop)
+
+    def failing(self, status_code, throttled=False, failures=1):
+        calls = []
+
+        def method(context, *args):
+            calls.append(args)
+            if len(calls) <= failures:
+                if throttled:
+                    context.throttle.record(canvas_response(403, text='Rate Limit Exceeded'))
+                raise CanvasAPIError(status_code)
+            return 'result'
+        return method, calls
+
+    def test_retries_throttled_writes(self):
+        method, calls = self.failing(403, throttled=True)
+        self.assertEqual(canvas_api._write(self.api_auth, method, '256'), 'result')
+        self.assertEqual(calls, [('256',), ('256',)])
+
+    def test_retries_server_errors_on_reads(self):
+        method, calls = self.failing(503)
+        self.assertEqual(canvas_api._read(self.api_auth, method), 'result')
+        self.assertEqual(len(calls), 2)
+
+    def test_does_not_retry_server_errors_on_writes(self):
+        method, calls = self.failing(503)
+        with self.assertRaises(CanvasAPIError):
+            canvas_api._write(self.api_auth, method)
+        self.assertEqual(len(calls), 1)
+
+    def test_does_not_retry_other_errors(self):
+        method, calls = self.failing(404)
+        with self.assertRaises(CanvasAPIError):
+            canvas_api._read(self.api_auth, method)
+        self.assertEqual(len(calls), 1)
+
+    def test_gives_up(self):
+        method, calls = self.failing(503, failures=canvas_api.MAX_ATTEMPTS)
+        with self.assertRaises(CanvasAPIError):
+            canvas_api._read(self.api_auth, method)
+        self.assertEqual(len(calls), canvas_api.MAX_ATTEMPTS)
+
+
+class TestGetAllPages(TestCase):
+
+    url = 'https://canvas.example.com/api/v1/courses/256/modules?include%5B%5D=items&page={}&per_page=100'
+
+    def setUp(self):
+        super(TestGetAllPages, self).setUp()
+        self.api_auth = CanvasApiAuthorization(canvas_api_token='token')
+        self.pages = {}
+        new_patch = patch('edx2canvas.canvas_api._read', side_effect=self.read)
+        self.read_mock = new_patch.start()
+        self.addCleanup(new_patch.stop)
+        self.method = MagicMock(__name__='list_modules')
+
+    def read(self, api_auth, method, *args, **kwargs):
+        if method is self.method:
+            return self.pages[1]
+        return self.pages[canvas_api._page_number(args[0])]
+
+    def add_page(self, number, data, next=True, last=None):
+        links = {}
+        if next:
+            links['next'] = {'url': self.url.format(number + 1)}
+        if last:
+            links['last'] = {'url': self.url.format(last)}
+        self.pages[number] = MagicMock(links=links, json=lambda: list(data))
+
+    def fetched_urls(self):
+        return sorted(call[0][2] for call in self.read_mock.call_args_list[1:])
+
+    def test_single_page(self):
+        self.add_page(1, [1, 2], next=False)
+        self.assertEqual(canvas_api._get_all_pages(self.api_auth, self.method, '256', 'items'), [1, 2])
+        self.read_mock.assert_called_once_with(self.api_auth, self.method, '256', 'items', per_page=100)
+
+    def test_fetches_known_pages(self):
+        self.add_page(1, [1, 2], last=3)
+        self.add_page(2, [3, 4], last=3)
+        self.add_page(3, [5], next=False, last=3)
+        self.assertEqual(canvas_api._get_all_pages(self.api_auth, self.method), [1, 2, 3, 4, 5])
+        self.assertEqual(self.fetched_urls(), [self.url.format(2), self.url.format(3)])
+
+    def test_follows_next_without_last(self):
+        self.add_page(1, [1, 2])
+        self.add_page(2, [3, 4])
+        self.add_page(3, [5], next=False)
+        self.assertEqual(canvas_api._get_all_pages(self.api_auth, self.method), [1, 2, 3, 4, 5])
+
+    def test_page_urls_with_bookmarks(self):
+        response = MagicMock(links={
+            'next': {'url': 'https://canvas.example.com/api/v1/courses?page=bookmark:WzFd'},
+            'last': {'url': 'https://canvas.example.com/api/v1/courses?page=bookmark:WzVd'},
+        })
+        self.assertIsNone(canvas_api._page_urls(response))
+
+
+@override_settings(EXTERNAL_TOOL_DOMAIN='edx.example.com')
+class TestGetExternalToolId(DjangoTestCase):
+
+    def setUp(self):
+        super(TestGetExternalToolId, self).setUp()
+        self.api_auth = CanvasApiAuthorization(canvas_api_token='token')
+        new_patch = patch('edx2canvas.canvas_api._find_or_install_external_tool', return_value=12)
+        self.find_mock = new_patch.start()
+        self.addCleanup(new_patch.stop)
+
+    def test_remembers_tool(self):
+        self.assertEqual(canvas_api.get_external_tool_id(self.api_auth, '256'), 12)
+        self.assertEqual(canvas_api.get_external_tool_id(self.api_auth, '256'), 12)
+        self.assertEqual(self.find_mock.call_count, 1)
+        tool = CanvasExternalTool.objects.get()
+        self.assertEqual((tool.canvas_course_id, tool.domain), ('256', 'edx.example.com'))
+
+    def test_refresh(self):
+        canvas_api.get_external_tool_id(self.api_auth, '256')
+        self.find_mock.return_value = 13
+        self.assertEqual(canvas_api.get_external_tool_id(self.api_auth, '256', refresh=True), 13)
+        self.assertEqual(CanvasExternalTool.objects.get().tool_id, 13)
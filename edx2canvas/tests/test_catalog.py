@@ -0,0 +1,47 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from mock import patch
+
+from edx2canvas import catalog
+from edx2canvas.models import EdxCourse
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog'},
+}
+
+
+@override_settings(CACHES=CACHES, EDX_COURSE_CATALOG_CACHE='catalog')
+class TestCatalog(TestCase):
+
+    def setUp(self):
+        super(TestCatalog, self).setUp()
+        self.addCleanup(caches['catalog'].clear)
+        for title, run in (('Physics', '2015'), ('Astronomy', '2016'), ('Physics', '2016')):
+            EdxCourse.objects.create(title=title, org='HarvardX', course=title[:4], run=run, key_version=1)
+
+    def test_catalog(self):
+        courses = catalog.get_catalog()
+        self.assertEqual([course['title'] for course in courses], ['Astronomy', 'Physics', 'Physics'])
+        self.assertEqual(sorted(courses[0]), sorted(catalog.FIELDS))
+
+    def test_filter_and_page(self):
+        total, courses = catalog.search_catalog('phys', offset=1, limit=5)
+        self.assertEqual(total, 2)
+        self.assertEqual([course['run'] for course in courses], ['2016'])
+
+    def test_catalog_is_cached(self):
+        with patch.object(caches['catalog'], 'get', return_value=['cached']):
+            self.assertEqual(catalog.get_catalog(), ['cached'])
+
+    def test_invalidate(self):
+        catalog.get_catalog()
+        EdxCourse.objects.create(title='Biology', org='HarvardX', course='Bio', run='2016', key_version=1)
+        catalog.invalidate()
+        self.assertEqual(len(catalog.get_catalog()), 4)
+
+    @override_settings(EDX_COURSE_CATALOG_CACHE=None)
+    def test_not_cached_without_shared_cache(self):
+        catalog.get_catalog()
+        EdxCourse.objects.create(title='Biology', org='HarvardX', course='Bio', run='2016', key_version=1)
+        self.assertEqual(len(catalog.get_catalog()), 4)
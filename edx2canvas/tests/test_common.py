@@ -1,3 +1,4 @@
+from boto.exception import S3ResponseError
 from django.conf import settings
 from unittest import TestCase
 from mock import patch, MagicMock
@@ -68,3 +69,41 @@ class TestBase(TestCase):
 
     def get_template(self, template):
         return 'edx2canvas/{}.html'.format(template)
+
+
+class LocalS3Connection(object):
+    """
+    A stand-in for boto's S3Connection that keeps buckets in memory, so that
+    S3 storage can be tested offline.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.get_bucket_calls = 0
+
+    def get_bucket(self, bucket_name, validate=True):
+        self.get_bucket_calls += 1
+        return self.buckets.setdefault(bucket_name, LocalS3Bucket(bucket_name))
+
+
+class LocalS3Bucket(object):
+    def __init__(self, name):
+        self.name = name
+        self.keys = {}
+
+    def new_key(self, key_name):
+        return LocalS3Key(self, key_name)
+
+
+class LocalS3Key(object):
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def get_contents_as_string(self):
+        try:
+            return self.bucket.keys[self.name][0]
+        except KeyError:
+            raise S3ResponseError(404, 'Not Found')
+
+    def set_contents_from_string(self, data, headers=None):
+        self.bucket.keys[self.name] = (data, headers or {})
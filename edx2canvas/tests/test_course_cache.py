@@ -0,0 +1,63 @@
+from unittest import TestCase
+from mock import patch
+
+from edx2canvas import course_cache
+from edx2canvas.models import EdxCourse
+
+
+class TestLRUCache(TestCase):
+
+    def setUp(self):
+        super(TestLRUCache, self).setUp()
+        self.cache = course_cache.LRUCache(10)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('missing'))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 'aaaa')
+        self.cache.set('b', 'bbbb')
+        self.cache.get('a')
+        self.cache.set('c', 'cccc')
+        self.assertEqual(self.cache.get('a'), 'aaaa')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 'cccc')
+        self.assertEqual(self.cache.size, 8)
+
+    def test_replacing_entry_updates_size(self):
+        self.cache.set('a', 'aaaa')
+        self.cache.set('a', 'aa')
+        self.assertEqual(self.cache.size, 2)
+
+    def test_oversized_entry_is_not_cached(self):
+        self.cache.set('a', 'a' * 11)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 0)
+
+
+class TestCourseCache(TestCase):
+
+    def setUp(self):
+        super(TestCourseCache, self).setUp()
+        self.edx_course = EdxCourse(id=7, content_hash='hash1')
+        new_patch = patch('edx2canvas.course_cache._local_cache', course_cache.LRUCache(1024))
+        new_patch.start()
+        self.addCleanup(new_patch.stop)
+
+    def test_store_and_lookup(self):
+        course_cache.store(self.edx_course, 'compact', '{"nodes": []}')
+        self.assertEqual(course_cache.lookup(self.edx_course, 'compact'), '{"nodes": []}')
+        self.assertIsNone(course_cache.lookup(self.edx_course, 'nested'))
+
+    def test_new_content_hash_misses(self):
+        course_cache.store(self.edx_course, 'compact', '{}')
+        self.edx_course.content_hash = 'hash2'
+        self.assertIsNone(course_cache.lookup(self.edx_course, 'compact'))
+
+    def test_invalidate(self):
+        other_course = EdxCourse(id=8, content_hash='hash1')
+        course_cache.store(self.edx_course, 'compact', '{}')
+        course_cache.store(other_course, 'compact', '{}')
+        course_cache.invalidate(self.edx_course)
+        self.assertIsNone(course_cache.lookup(self.edx_course, 'compact'))
+        self.assertEqual(course_cache.lookup(other_course, 'compact'), '{}')
@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from edx2canvas import course_format
+
+
+class TestCourseFormat(TestCase):
+
+    def setUp(self):
+        super(TestCourseFormat, self).setUp()
+        self.course = {
+            'type': 'course', 'id': 'run', 'score': 2, 'display_name': 'Course',
+            'usage_id': 'block-v1:org+course+run+type@course+block@run',
+            'children': [{
+                'type': 'chapter', 'id': 'ch1', 'parent': 'run', 'score': 2,
+                'display_name': 'Chapter 1',
+                'usage_id': 'block-v1:org+course+run+type@chapter+block@ch1',
+                'children': [{
+                    'type': 'problem', 'id': 'p1', 'parent': 'ch1', 'score': 2,
+                    'usage_id': 'block-v1:org+course+run+type@problem+block@p1',
+                }, {
+                    'type': 'problem', 'parent': 'ch1', 'score': 1,
+                    'display_name': 'Inline problem',
+                }],
+            }, {
+                'type': 'wiki', 'id': None, 'parent': 'run', 'score': 0,
+                'usage_id': 'block-v1:org+course+run+type@wiki+block@None',
+            }],
+        }
+
+    def test_round_trip(self):
+        compact = course_format.compact_course(self.course)
+        self.assertEqual(course_format.expand_course(compact), self.course)
+
+    def test_is_compact(self):
+        self.assertTrue(course_format.is_compact(course_format.compact_course(self.course)))
+        self.assertFalse(course_format.is_compact(self.course))
+
+    def test_usage_prefix_is_interned(self):
+        compact = course_format.compact_course(self.course)
+        self.assertEqual(compact['usage_prefix'], 'block-v1:org+course+run+type@')
+        self.assertEqual(compact['nodes'][1][3], 'chapter+block@ch1')
+
+    def test_nodes_are_in_document_order(self):
+        compact = course_format.compact_course(self.course)
+        self.assertEqual(
+            [(parent, compact['types'][type_index]) for parent, type_index, __, __, __ in compact['nodes']],
+            [(-1, 'course'), (0, 'chapter'), (1, 'problem'), (1, 'problem'), (0, 'wiki')]
+        )
+
+    def test_parent_is_not_stored(self):
+        compact = course_format.compact_course(self.course)
+        self.assertNotIn('parent', compact['nodes'][2][4])
+
+    def test_mismatched_parent_is_stored(self):
+        self.course['children'][0]['parent'] = 'elsewhere'
+        compact = course_format.compact_course(self.course)
+        self.assertEqual(compact['nodes'][1][4]['parent'], 'elsewhere')
+        self.assertEqual(course_format.expand_course(compact), self.course)
@@ -0,0 +1,142 @@
+import json
+
+from django.test import TestCase
+from mock import patch
+
+from edx2canvas import course_format, course_index, storage
+from edx2canvas.models import EdxCourse, EdxCourseNode, EdxCourseNodeTerm
+
+
+class TestCourseIndex(TestCase):
+
+    def setUp(self):
+        super(TestCourseIndex, self).setUp()
+        self.edx_course = EdxCourse.objects.create(
+            title='title', org='org', course='course', run='run', key_version=1
+        )
+        self.course = {
+            'type': 'course', 'id': 'run', 'score': 1, 'display_name': 'Course',
+            'usage_id': 'block-v1:org+course+run+type@course+block@run',
+            'children': [{
+                'type': 'chapter', 'id': 'ch1', 'parent': 'run', 'score': 1,
+                'display_name': 'Chapter 1',
+                'usage_id': 'block-v1:org+course+run+type@chapter+block@ch1',
+                'children': [{
+                    'type': 'sequential', 'id': 'seq1', 'parent': 'ch1', 'score': 1,
+                    'display_name': 'Subsection 1',
+                    'usage_id': 'block-v1:org+course+run+type@sequential+block@seq1',
+                    'children': [{
+                        'type': 'vertical', 'id': 'vert1', 'parent': 'seq1', 'score': 1,
+                        'display_name': 'Unit 1',
+                        'usage_id': 'block-v1:org+course+run+type@vertical+block@vert1',
+                        'children': [{
+                            'type': 'problem', 'id': 'p1', 'parent': 'vert1', 'score': 1,
+                            'display_name': 'Newton\'s Laws',
+                            'usage_id': 'block-v1:org+course+run+type@problem+block@p1',
+                        }],
+                    }],
+                }],
+            }],
+        }
+        course_index.build_index(self.edx_course, course_format.compact_course(self.course))
+
+    def test_build_index(self):
+        self.assertEqual(self.edx_course.node_count, 5)
+        self.assertEqual(
+            list(EdxCourseNode.objects.order_by('index').values_list('node_type', 'depth', 'child_count')),
+            [('course', 0, 1), ('chapter', 1, 1), ('sequential', 2, 1), ('vertical', 3, 1), ('problem', 4, 0)]
+        )
+
+    def test_rebuild_replaces_index(self):
+        del self.course['children'][0]['children']
+        course_index.build_index(self.edx_course, course_format.compact_course(self.course))
+        self.assertEqual(self.edx_course.node_count, 2)
+        self.assertEqual(EdxCourseNode.objects.filter(edx_course=self.edx_course).count(), 2)
+
+    def test_ensure_index(self):
+        EdxCourseNode.objects.all().delete()
+        EdxCourse.objects.filter(id=self.edx_course.id).update(node_count=0)
+        edx_course = EdxCourse.objects.get(id=self.edx_course.id)
+        stored = storage.compress(json.dumps(course_format.compact_course(self.course)))
+        with patch('edx2canvas.storage.read_course', return_value=stored):
+            course_index.ensure_index(edx_course)
+        self.assertEqual(edx_course.node_count, 5)
+        self.assertEqual(EdxCourseNode.objects.filter(edx_course=edx_course).count(), 5)
+
+    def test_ensure_index_skips_course_indexed_meanwhile(self):
+        # The course as it was read before another request indexed it.
+        edx_course = EdxCourse.objects.get(id=self.edx_course.id)
+        edx_course.node_count = 0
+        stored = storage.compress(json.dumps(course_format.compact_course(self.course)))
+        with patch('edx2canvas.storage.read_course', return_value=stored), \
+                patch('edx2canvas.course_index.build_index') as build_mock:
+            course_index.ensure_index(edx_course)
+        self.assertFalse(build_mock.called)
+        self.assertEqual(edx_course.node_count, 5)
+
+    def test_outline(self):
+        outline = course_index.outline(self.edx_course)
+        sequential = outline['children'][0]['children'][0]
+        self.assertEqual(sequential['display_name'], 'Subsection 1')
+        self.assertEqual(sequential['parent'], 'ch1')
+        self.assertEqual(sequential['child_count'], 1)
+        self.assertNotIn('children', sequential)
+
+    def test_children(self):
+        children = course_index.children(
+            self.edx_course, 'block-v1:org+course+run+type@vertical+block@vert1'
+        )
+        self.assertEqual(children, [{
+            'type': 'problem', 'id': 'p1', 'parent': 'vert1', 'score': 1, 'child_count': 0,
+            'display_name': 'Newton\'s Laws',
+            'usage_id': 'block-v1:org+course+run+type@problem+block@p1',
+        }])
+
+    def test_children_of_unknown_node(self):
+        self.assertIsNone(course_index.children(self.edx_course, 'block-v1:unknown'))
+
+    def test_lookup(self):
+        node = course_index.lookup(self.edx_course, 'block-v1:org+course+run+type@problem+block@p1')
+        self.assertEqual(node.title(), 'Unit 1 (problem)')
+        self.assertEqual(node.score, 1)
+        node = course_index.lookup(self.edx_course, 'block-v1:org+course+run+type@vertical+block@vert1')
+        self.assertEqual(node.title(), 'Unit 1')
+        self.assertIsNone(course_index.lookup(self.edx_course, 'block-v1:unknown'))
+
+    def test_lookup_many(self):
+        problem = 'block-v1:org+course+run+type@problem+block@p1'
+        vertical = 'block-v1:org+course+run+type@vertical+block@vert1'
+        nodes = course_index.lookup_many(self.edx_course, [problem, vertical, 'block-v1:unknown'])
+        self.assertEqual(sorted(nodes), [problem, vertical])
+        self.assertEqual(nodes[problem].node_type, 'problem')
+
+    def test_path(self):
+        node = EdxCourseNode.objects.get(edx_course=self.edx_course, node_type='problem')
+        self.assertEqual(json.loads(node.path), ['Chapter 1', 'Subsection 1', 'Unit 1'])
+
+    def test_search(self):
+        [node] = course_index.search('newt law')
+        self.assertEqual(node.usage_id, 'block-v1:org+course+run+type@problem+block@p1')
+
+    def test_search_requires_every_word(self):
+        self.assertEqual(course_index.search('newton chapter'), [])
+
+    def test_search_by_type(self):
+        self.assertEqual(
+            [node.node_type for node in course_index.search('', node_type='vertical')], ['vertical']
+        )
+        self.assertEqual(len(course_index.search('problem')), 1)
+
+    def test_search_by_score(self):
+        self.assertEqual(len(course_index.search('newton', min_score=1)), 1)
+        self.assertEqual(course_index.search('newton', min_score=2), [])
+
+    def test_empty_search(self):
+        self.assertEqual(course_index.search(''), [])
+
+    def test_rebuild_replaces_terms(self):
+        self.course['children'][0]['children'][0]['children'][0]['children'][0]['display_name'] = 'Kepler'
+        course_index.build_index(self.edx_course, course_format.compact_course(self.course))
+        self.assertEqual(course_index.search('newton'), [])
+        self.assertEqual(len(course_index.search('kepler')), 1)
+        self.assertFalse(EdxCourseNodeTerm.objects.filter(term='newton').exists())
@@ -0,0 +1,150 @@
+import json
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from mock import patch
+
+from edx2canvas import catalog, course_format, ingest, jobs, storage
+from edx2canvas.models import EdxCourse, IngestJob
+
+
+def process_settings(name):
+    """
+    Settings for one of several processes, each with its own default cache,
+    that share only the 'shared' cache.
+    """
+    locmem = 'django.core.cache.backends.locmem.LocMemCache'
+    return override_settings(
+        CACHES={
+            'default': {'BACKEND': locmem, 'LOCATION': name},
+            'shared': {'BACKEND': locmem, 'LOCATION': 'shared'},
+        },
+        EDX_COURSE_CATALOG_CACHE='shared',
+    )
+
+
+class TestIngest(TestCase):
+
+    def setUp(self):
+        super(TestIngest, self).setUp()
+        self.storage = storage.MemoryStorage()
+        new_patch = patch('edx2canvas.storage.get_storage', return_value=self.storage)
+        new_patch.start()
+        self.addCleanup(new_patch.stop)
+        self.course = {'type': 'course', 'id': 'run', 'score': 0, 'display_name': 'Course'}
+        self.upload = {
+            'title': 'Course', 'org': 'org', 'course': 'course', 'run': 'run',
+            'key_version': 1, 'body': self.course,
+        }
+        self.addCleanup(self.clear_caches)
+
+    def clear_caches(self):
+        for name in ('web', 'worker'):
+            with process_settings(name):
+                caches['default'].clear()
+                caches['shared'].clear()
+
+    def test_ingest(self):
+        edx_course = ingest.ingest(json.dumps(self.upload))
+        stored = json.loads(storage.decompress(self.storage.files['{}.json.gz'.format(edx_course.id)]))
+        self.assertEqual(stored, course_format.compact_course(self.course))
+        self.assertEqual(edx_course.node_count, 1)
+        self.assertEqual(len(edx_course.content_hash), 40)
+
+    def test_ingest_gzipped(self):
+        edx_course = ingest.ingest(storage.compress(json.dumps(self.upload)), 'gzip')
+        self.assertEqual(EdxCourse.objects.get().id, edx_course.id)
+
+    def test_ingest_string_body(self):
+        self.upload['body'] = json.dumps(self.course)
+        edx_course = ingest.ingest(json.dumps(self.upload))
+        self.assertIn('{}.json.gz'.format(edx_course.id), self.storage.files)
+
+    def test_reupload_updates_course(self):
+        first = ingest.ingest(json.dumps(self.upload))
+        self.upload['title'] = 'Renamed course'
+        second = ingest.ingest(json.dumps(self.upload))
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(EdxCourse.objects.get().title, 'Renamed course')
+
+    def test_upload_reaches_catalog_of_other_processes(self):
+        with process_settings('web'):
+            self.assertEqual(catalog.get_catalog(), [])
+        with process_settings('worker'):
+            ingest.ingest(json.dumps(self.upload))
+        with process_settings('web'):
+            self.assertEqual([course['title'] for course in catalog.get_catalog()], ['Course'])
+
+    def test_missing_field(self):
+        del self.upload['run']
+        with self.assertRaises(ValueError):
+            ingest.ingest(json.dumps(self.upload))
+
+    def test_corrupt_gzip(self):
+        with self.assertRaises(ValueError):
+            ingest.ingest('not gzip', 'gzip')
+
+    def test_oversized_upload(self):
+        payload = json.dumps(self.upload)
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(payload) - 1):
+            with self.assertRaises(ValueError):
+                ingest.ingest(storage.compress(payload), 'gzip')
+
+    def test_oversized_uncompressed_upload(self):
+        payload = json.dumps(self.upload)
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(payload) - 1):
+            with self.assertRaises(ValueError):
+                ingest.ingest(payload)
+
+    def test_upload_at_size_limit(self):
+        payload = json.dumps(self.upload)
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(payload)):
+            ingest.ingest(storage.compress(payload), 'gzip')
+
+    def test_run_oversized_job(self):
+        job = ingest.queue_upload(storage.compress(json.dumps(self.upload)), 'gzip')
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', 10):
+            jobs.run_next_job()
+        job = IngestJob.objects.get(id=job.id)
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertEqual(job.error, 'Invalid upload: larger than 10 bytes')
+
+    def test_run_job(self):
+        job = ingest.queue_upload(json.dumps(self.upload))
+        self.assertEqual(jobs.run_next_job(), job)
+        job = IngestJob.objects.get(id=job.id)
+        self.assertEqual(job.status, IngestJob.SUCCEEDED)
+        self.assertEqual(job.edx_course, EdxCourse.objects.get())
+        self.assertEqual(bytes(job.payload), '')
+
+    def test_run_invalid_job(self):
+        job = ingest.queue_upload('{}')
+        jobs.run_next_job()
+        job = IngestJob.objects.get(id=job.id)
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertTrue(job.error.startswith('Invalid upload'))
+
+
+class TestJobQueue(TestCase):
+
+    def test_no_jobs(self):
+        self.assertIsNone(jobs.claim_next_job(IngestJob))
+
+    def test_claims_oldest_job_once(self):
+        first = IngestJob.objects.create(payload='')
+        IngestJob.objects.create(payload='')
+        self.assertEqual(jobs.claim_next_job(IngestJob), first)
+        self.assertNotEqual(jobs.claim_next_job(IngestJob), first)
+        self.assertIsNone(jobs.claim_next_job(IngestJob))
+
+    def test_reclaims_abandoned_job(self):
+        job = IngestJob.objects.create(payload='')
+        jobs.claim_next_job(IngestJob)
+        IngestJob.objects.filter(id=job.id).update(started=job.created - jobs.JOB_TIMEOUT)
+        self.assertEqual(jobs.claim_next_job(IngestJob), job)
+
+    def test_gives_up_after_max_attempts(self):
+        job = IngestJob.objects.create(payload='', status=IngestJob.RUNNING, attempts=jobs.MAX_ATTEMPTS)
+        IngestJob.objects.filter(id=job.id).update(started=job.created - jobs.JOB_TIMEOUT)
+        self.assertIsNone(jobs.claim_next_job(IngestJob))
+        self.assertEqual(IngestJob.objects.get(id=job.id).status, IngestJob.FAILED)
@@ -40,6 +40,14 @@ class LaunchLtiPreviewTests(test_common.TestBase):
             'Expected Not Found status code when edX course does not exist'
         )
 
+    @patch('edx2canvas.course_index.lookup')
+    def test_unknown_usage_id(self, lookup_mock):
+        lookup_mock.return_value = None
+        self.edx_course.node_count = 5
+        response = lti_consumer.launch_lti_preview(self.request)
+        lookup_mock.assert_called_once_with(self.edx_course, self.edx_usage_id)
+        self.assertEqual(response.status_code, 404)
+
 @ddt.ddt
 class GetLtiContextTests(test_common.TestBase):
 
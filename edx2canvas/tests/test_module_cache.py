@@ -0,0 +1,79 @@
+from django.test import SimpleTestCase, override_settings
+from django.core.cache import caches
+from mock import patch
+
+from edx2canvas import module_cache
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'modules': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'modules'},
+}
+
+
+@override_settings(CACHES=CACHES, CANVAS_MODULE_CACHE='modules')
+class TestModuleCache(SimpleTestCase):
+
+    def setUp(self):
+        super(TestModuleCache, self).setUp()
+        self.api_auth = object()
+        self.modules = [
+            {'id': 1, 'position': 1, 'items': [{'id': 10, 'position': 1}]},
+            {'id': 2, 'position': 2, 'items': []},
+        ]
+        new_patch = patch('edx2canvas.canvas_api.get_module_list', return_value=self.modules)
+        self.fetch_mock = new_patch.start()
+        self.addCleanup(new_patch.stop)
+        self.addCleanup(caches['modules'].clear)
+
+    def test_get_modules_is_cached(self):
+        version, modules = module_cache.get_modules(self.api_auth, 256)
+        self.assertEqual(module_cache.get_modules(self.api_auth, 256), (version, modules))
+        self.assertEqual(self.fetch_mock.call_count, 1)
+        self.assertEqual(version, module_cache.version_of(self.modules))
+
+    def test_refresh(self):
+        module_cache.get_modules(self.api_auth, 256)
+        module_cache.get_modules(self.api_auth, 256, refresh=True)
+        self.assertEqual(self.fetch_mock.call_count, 2)
+
+    def test_add_module_item(self):
+        version, __ = module_cache.get_modules(self.api_auth, 256)
+        previous_version, new_version, modules = module_cache.add_module_item(
+            self.api_auth, 256, {'id': 11, 'module_id': 1, 'position': 1}
+        )
+        self.assertEqual(previous_version, version)
+        self.assertEqual([item['id'] for item in modules[0]['items']], [11, 10])
+        self.assertEqual([item['position'] for item in modules[0]['items']], [1, 2])
+        self.assertEqual(module_cache.get_modules(self.api_auth, 256), (new_version, modules))
+        self.assertEqual(self.fetch_mock.call_count, 1)
+
+    def test_add_module(self):
+        module_cache.get_modules(self.api_auth, 256)
+        __, __, modules = module_cache.add_module(self.api_auth, 256, {'id': 3, 'position': 2})
+        self.assertEqual([module['id'] for module in modules], [1, 3, 2])
+        self.assertEqual(modules[1]['items'], [])
+        self.assertEqual(modules[2]['position'], 3)
+
+    def test_item_of_unknown_module_refetches(self):
+        module_cache.get_modules(self.api_auth, 256)
+        previous_version, __, __ = module_cache.add_module_item(
+            self.api_auth, 256, {'id': 11, 'module_id': 5, 'position': 1}
+        )
+        self.assertIsNone(previous_version)
+        self.assertEqual(self.fetch_mock.call_count, 2)
+
+    def test_item_past_end_of_module_refetches(self):
+        module_cache.get_modules(self.api_auth, 256)
+        module_cache.add_module_item(self.api_auth, 256, {'id': 11, 'module_id': 2, 'position': 3})
+        self.assertEqual(self.fetch_mock.call_count, 2)
+
+    def test_uncached_list_is_fetched(self):
+        previous_version, __, __ = module_cache.add_module(self.api_auth, 256, {'id': 3, 'position': 1})
+        self.assertIsNone(previous_version)
+        self.assertEqual(self.fetch_mock.call_count, 1)
+
+    @override_settings(CANVAS_MODULE_CACHE=None)
+    def test_no_cache(self):
+        module_cache.get_modules(self.api_auth, 256)
+        module_cache.get_modules(self.api_auth, 256)
+        self.assertEqual(self.fetch_mock.call_count, 2)
@@ -0,0 +1,99 @@
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'bin'))
+import generate_course
+import parse_course
+
+
+class TestWaitForJob(TestCase):
+
+    def setUp(self):
+        super(TestWaitForJob, self).setUp()
+        self.session = MagicMock()
+        self.job = {'job_id': 7, 'token': 'abc'}
+        new_patch = patch('time.sleep')
+        new_patch.start()
+        self.addCleanup(new_patch.stop)
+
+    def respond(self, *responses):
+        self.session.get.side_effect = [
+            MagicMock(status_code=status_code, json=MagicMock(return_value=body))
+            for status_code, body in responses
+        ]
+
+    def test_sends_token(self):
+        self.respond((200, {'status': 'succeeded'}))
+        self.assertEqual(parse_course.wait_for_job(self.job, 'http://server', self.session), {'status': 'succeeded'})
+        self.assertEqual(self.session.get.call_args[1]['params'], {'job_id': 7, 'token': 'abc'})
+
+    def test_waits_for_job(self):
+        self.respond((200, {'status': 'running'}), (200, {'status': 'succeeded'}))
+        parse_course.wait_for_job(self.job, 'http://server', self.session)
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_failed_job(self):
+        self.respond((200, {'status': 'failed', 'error': 'Invalid upload'}))
+        with self.assertRaises(parse_course.UploadError):
+            parse_course.wait_for_job(self.job, 'http://server', self.session)
+
+    def test_status_unavailable(self):
+        self.respond((403, None))
+        self.assertIsNone(parse_course.wait_for_job(self.job, 'http://server', self.session))
+
+
+class TestParserParity(TestCase):
+    """
+    The tarball and directory sources, the worker pool, the parse cache and
+    each XML engine are optimisations only: they must all give the same course.
+    """
+
+    def setUp(self):
+        super(TestParserParity, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.tarball = os.path.join(self.tmp_dir, 'course.tgz')
+        generate_course.CourseGenerator(chapters=2, sequentials=2, verticals=2, components=4).write_tarball(
+            self.tarball
+        )
+        self.directory = os.path.join(self.tmp_dir, 'export')
+        archive = tarfile.open(self.tarball)
+        archive.extractall(self.directory)
+        archive.close()
+        self.expected = self.parse(self.tarball)
+
+    def parse(self, path, workers=1, cache_dir=None, engine='etree'):
+        cache = parse_course.ParseCache(cache_dir) if cache_dir else None
+        parser = parse_course.EdXMLParser(
+            parse_course.open_course_source(path), workers=workers, cache=cache, engine=engine
+        )
+        return parser.get_course()
+
+    def test_course_is_parsed(self):
+        self.assertEqual(self.expected['id'], '2016')
+        self.assertTrue(self.expected['children'])
+
+    def test_directory_source(self):
+        self.assertEqual(self.parse(self.directory), self.expected)
+
+    def test_workers(self):
+        self.assertEqual(self.parse(self.tarball, workers=2), self.expected)
+        self.assertEqual(self.parse(self.directory, workers=2), self.expected)
+
+    def test_cache(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.assertEqual(self.parse(self.tarball, cache_dir=cache_dir), self.expected)
+        self.assertTrue(os.listdir(cache_dir))
+        self.assertEqual(self.parse(self.tarball, cache_dir=cache_dir), self.expected)
+        self.assertEqual(self.parse(self.directory, workers=2, cache_dir=cache_dir), self.expected)
+
+    def test_engines(self):
+        for engine in sorted(parse_course.ENGINES):
+            self.assertEqual(self.parse(self.tarball, engine=engine), self.expected)
+            self.assertEqual(self.parse(self.directory, workers=2, engine=engine), self.expected)
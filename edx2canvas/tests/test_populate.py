@@ -2,10 +2,12 @@ import ddt
 from django.contrib.auth.models import User
 import django.http
 import json
-from mock import patch
+from mock import patch, ANY
+from canvas_sdk.exceptions import CanvasAPIError
 
 import test_common
 import edx2canvas.populate as populate
+import edx2canvas.module_cache as module_cache
 import edx2canvas.models as models
 
 def create_request(canvas_user_id, post_params):
@@ -43,7 +45,8 @@ class AddToCanvasTests(test_common.TestBase):
         body = json.loads(response.content)
         expected_response = {
             'modules': self.module_list,
-            'id': self.canvas_course_id
+            'id': self.canvas_course_id,
+            'modules_version': module_cache.version_of(self.module_list)
         }
         self.assertEqual(
             response.status_code, 200,
@@ -66,19 +69,47 @@ class AddToCanvasTests(test_common.TestBase):
         )
         self.check_response(response)
 
-    @patch('edx2canvas.canvas_api.create_assignment_with_module_item')
-    def test_add_assignment(self, create_assignment):
+    @patch('edx2canvas.canvas_api.create_assignment_module_item')
+    @patch('edx2canvas.canvas_api.create_assignment', return_value={'id': 9})
+    def test_add_assignment(self, create_assignment, create_module_item):
         self.request.POST['graded'] = 'true'
+        self.request.POST['points'] = 10
         response = populate.add_to_canvas(self.request)
         create_assignment.assert_called_with(
             self.canvas_api_authorization, self.content_title, self.canvas_course_id,
-            self.canvas_module_id, self.module_position,
             self.canvas_external_tool_id, '{}/lti_provider/courses/{}/{}'.format(
                 self.edx_url_base, self.edx_course_key, self.edx_usage_id
-            )
+            ), 10
+        )
+        create_module_item.assert_called_with(
+            self.canvas_api_authorization, self.content_title, self.canvas_course_id,
+            self.canvas_module_id, self.module_position, 9
         )
         self.check_response(response)
 
+    @patch('edx2canvas.canvas_api.create_assignment_module_item')
+    @patch('edx2canvas.canvas_api.create_assignment', return_value={'id': 9})
+    def test_assignment_is_not_created_twice(self, create_assignment, create_module_item):
+        create_module_item.side_effect = CanvasAPIError(status_code=404)
+        self.setup_patch('edx2canvas.canvas_api.get_external_tool_id', None).side_effect = [12, 13]
+        self.request.POST['graded'] = 'true'
+        self.request.POST['points'] = 10
+        with self.assertRaises(CanvasAPIError):
+            populate.add_to_canvas(self.request)
+        self.assertEqual(create_assignment.call_count, 1)
+        self.assertEqual(create_module_item.call_count, 1)
+
+    @patch('edx2canvas.canvas_api.create_assignment_module_item')
+    @patch('edx2canvas.canvas_api.create_assignment')
+    def test_rejected_assignment_is_retried_with_current_tool(self, create_assignment, create_module_item):
+        create_assignment.side_effect = [CanvasAPIError(status_code=400), {'id': 9}]
+        self.setup_patch('edx2canvas.canvas_api.get_external_tool_id', None).side_effect = [12, 13]
+        self.request.POST['graded'] = 'true'
+        self.request.POST['points'] = 10
+        populate.add_to_canvas(self.request)
+        self.assertEqual(create_assignment.call_args_list[1][0][3], 13)
+        self.assertEqual(create_module_item.call_args[0][5], 9)
+
     @ddt.data(
         'edx_course_id',
         'canvas_course_id',
@@ -96,6 +127,62 @@ class AddToCanvasTests(test_common.TestBase):
             'Expected Bad Request status when parameter {} missing'.format(param)
         )
 
+    @patch('edx2canvas.canvas_api.create_assignment_module_item')
+    @patch('edx2canvas.canvas_api.create_assignment', return_value={'id': 9})
+    def test_indexed_course_fills_in_metadata(self, create_assignment, create_module_item):
+        self.edx_course.node_count = 5
+        node = models.EdxCourseNode(
+            node_type='problem', depth=4, score=3, attributes='{}', path='["Unit 1"]'
+        )
+        self.setup_patch('edx2canvas.course_index.lookup', node)
+        self.request.POST['graded'] = 'true'
+        self.request.POST['points'] = 100
+        del self.request.POST['title']
+        populate.add_to_canvas(self.request)
+        create_assignment.assert_called_with(
+            self.canvas_api_authorization, 'Unit 1 (problem)', self.canvas_course_id,
+            self.canvas_external_tool_id, ANY, 3
+        )
+
+    def test_indexed_course_unknown_usage_id(self):
+        self.edx_course.node_count = 5
+        self.setup_patch('edx2canvas.course_index.lookup', None)
+        response = populate.add_to_canvas(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_removed_external_tool_is_looked_up_again(self, create_module_item):
+        create_module_item.side_effect = [CanvasAPIError(status_code=404), None]
+        self.setup_patch('edx2canvas.canvas_api.get_external_tool_id', None).side_effect = [12, 13]
+        response = populate.add_to_canvas(self.request)
+        self.assertEqual(create_module_item.call_args_list[1][0][5], 13)
+        self.check_response(response)
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_error_with_current_external_tool_is_raised(self, create_module_item):
+        create_module_item.side_effect = CanvasAPIError(status_code=404)
+        with self.assertRaises(CanvasAPIError):
+            populate.add_to_canvas(self.request)
+        self.assertEqual(create_module_item.call_count, 1)
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_returns_only_new_item_to_current_client(self, create_module_item):
+        item = {'id': 7, 'module_id': self.canvas_module_id, 'position': 5}
+        create_module_item.return_value = item
+        self.setup_patch('edx2canvas.module_cache.add_module_item', ('v1', 'v2', self.module_list))
+        self.request.POST['modules_version'] = 'v1'
+        response = populate.add_to_canvas(self.request)
+        self.assertEqual(json.loads(response.content), {
+            'id': self.canvas_course_id, 'modules_version': 'v2', 'previous_version': 'v1', 'item': item
+        })
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_returns_whole_list_to_out_of_date_client(self, create_module_item):
+        self.setup_patch('edx2canvas.module_cache.add_module_item', ('v1', 'v2', self.module_list))
+        self.request.POST['modules_version'] = 'v0'
+        response = populate.add_to_canvas(self.request)
+        self.assertEqual(json.loads(response.content)['modules'], self.module_list)
+
     def test_missing_edx_course(self):
         with patch('edx2canvas.models.EdxCourse.objects.get') as get_mock:
             get_mock.side_effect = models.EdxCourse.DoesNotExist()
@@ -137,7 +224,9 @@ class CreateCanvasModuleTests(test_common.TestBase):
         body = json.loads(response.content)
         expected_response = {
             'modules': self.module_list,
-            'module_id': self.canvas_module_id
+            'module_id': self.canvas_module_id,
+            'id': self.canvas_course_id,
+            'modules_version': module_cache.version_of(self.module_list)
         }
         self.assertEqual(
             response.status_code, 200,
@@ -198,3 +287,133 @@ class AutoPopulateTests(test_common.TestBase):
             'edx2canvas.canvas_api.create_canvas_module',
             self.module
         )
+
+class AddToCanvasBatchTests(test_common.TestBase):
+    def setUp(self):
+        super(AddToCanvasBatchTests, self).setUp()
+        self.edx_course.id = self.edx_course_id
+        self.setup_patch('edx2canvas.models.EdxCourse.objects.in_bulk', {self.edx_course_id: self.edx_course})
+        self.tool_mock = self.setup_patch(
+            'edx2canvas.canvas_api.get_external_tool_id',
+            self.canvas_external_tool_id
+        )
+        self.items = [
+            self.item_params(module_id=1, position=2, usage_id='u2'),
+            self.item_params(module_id=2, position=1, usage_id='u3'),
+            self.item_params(module_id=1, position=1, usage_id='u1'),
+        ]
+        self.request = create_request(self.canvas_user_id, {})
+        self.set_body({'canvas_course_id': self.canvas_course_id, 'items': self.items})
+
+    def item_params(self, **params):
+        return dict(params, edx_course_id=self.edx_course_id, title='title', graded='false')
+
+    def set_body(self, body):
+        self.request._body = json.dumps(body)
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_creates_items_in_order_of_position(self, create_module_item):
+        create_module_item.side_effect = lambda auth, title, course_id, module_id, position, *args: {
+            'id': position, 'module_id': module_id, 'position': position, 'url': args[1]
+        }
+        response = populate.add_to_canvas_batch(self.request)
+        body = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body['modules'], self.module_list)
+        self.assertEqual(
+            [result['item']['url'].rsplit('/', 1)[1] for result in body['results']], ['u2', 'u3', 'u1']
+        )
+        module_calls = [call[0][4] for call in create_module_item.call_args_list if call[0][3] == 1]
+        self.assertEqual(module_calls, [1, 2])
+        self.tool_mock.assert_called_once_with(self.canvas_api_authorization, self.canvas_course_id)
+
+    @patch('edx2canvas.canvas_api.create_canvas_module_item')
+    def test_failed_item(self, create_module_item):
+        create_module_item.side_effect = lambda auth, title, course_id, module_id, position, *args: {
+            'id': 7, 'module_id': module_id, 'position': position
+        } if module_id == 1 else self.fail_item()
+        body = json.loads(populate.add_to_canvas_batch(self.request).content)
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'failed', 'created'])
+
+    def fail_item(self):
+        raise CanvasAPIError(status_code=500)
+
+    def test_unknown_edx_course(self):
+        self.items[1]['edx_course_id'] = 1000
+        self.set_body({'canvas_course_id': self.canvas_course_id, 'items': self.items})
+        response = populate.add_to_canvas_batch(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_indexed_course_unknown_usage_id(self):
+        self.edx_course.node_count = 5
+        self.setup_patch('edx2canvas.course_index.lookup_many', {'u1': models.EdxCourseNode()})
+        response = populate.add_to_canvas_batch(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_body(self):
+        self.request._body = 'not json'
+        response = populate.add_to_canvas_batch(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_item_parameter(self):
+        del self.items[0]['position']
+        self.set_body({'canvas_course_id': self.canvas_course_id, 'items': self.items})
+        response = populate.add_to_canvas_batch(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_items(self):
+        items = [dict(self.items[0], position=position) for position in range(populate.MAX_BATCH_SIZE + 1)]
+        self.set_body({'canvas_course_id': self.canvas_course_id, 'items': items})
+        response = populate.add_to_canvas_batch(self.request)
+        self.assertEqual(response.status_code, 400)
+
+class PopulateJobTests(test_common.TestBase):
+    def setUp(self):
+        super(PopulateJobTests, self).setUp()
+        post_params = dict(
+            edx_course_id=self.edx_course_id,
+            canvas_course_id=self.canvas_course_id,
+            granularity='unit',
+            create_assignments='true',
+        )
+        self.request = create_request(self.canvas_user_id, post_params)
+        self.job = models.PopulateJob(id=5, item_count=3, status=models.PopulateJob.RUNNING)
+        self.queue_mock = self.setup_patch('edx2canvas.autopopulate.queue_populate', self.job)
+
+    def test_start_job(self):
+        response = populate.start_populate_job(self.request)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content), {'job_id': 5, 'item_count': 3})
+        self.assertTrue(response['Location'].endswith('?job_id=5'))
+        self.queue_mock.assert_called_once_with(
+            self.edx_course, self.canvas_course_id, self.canvas_user_id, 'unit', True
+        )
+
+    def test_start_job_course_not_stored(self):
+        self.queue_mock.side_effect = IOError
+        response = populate.start_populate_job(self.request)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', json.loads(response.content))
+
+    def test_start_job_unknown_granularity(self):
+        self.request.POST['granularity'] = 'chapter'
+        response = populate.start_populate_job(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_job(self):
+        self.request.method = 'GET'
+        self.request.GET = {'job_id': '5'}
+        self.setup_patch('edx2canvas.models.PopulateJob.objects.get', self.job)
+        self.setup_patch('edx2canvas.autopopulate.progress', (2, 1))
+        response = populate.get_populate_job(self.request)
+        self.assertEqual(json.loads(response.content), {
+            'job_id': 5, 'status': 'running', 'item_count': 3, 'created': 2, 'failed': 1, 'error': ''
+        })
+
+    def test_get_missing_job(self):
+        self.request.method = 'GET'
+        self.request.GET = {'job_id': '5'}
+        with patch('edx2canvas.models.PopulateJob.objects.get') as get_mock:
+            get_mock.side_effect = models.PopulateJob.DoesNotExist()
+            response = populate.get_populate_job(self.request)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from edx2canvas import storage
+import test_common
+
+
+class TestFileSystemStorage(TestCase):
+
+    def setUp(self):
+        super(TestFileSystemStorage, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = storage.FileSystemStorage(self.directory)
+
+    def test_write_and_read(self):
+        self.storage.write('1.json.gz', 'contents')
+        self.assertEqual(self.storage.read('1.json.gz'), 'contents')
+        self.assertEqual(os.listdir(self.directory), ['1.json.gz'])
+
+    def test_read_missing(self):
+        with self.assertRaises(IOError):
+            self.storage.read('missing.json.gz')
+
+
+class TestS3Storage(TestCase):
+
+    def setUp(self):
+        super(TestS3Storage, self).setUp()
+        self.connection = test_common.LocalS3Connection()
+        self.storage = storage.S3Storage('courses', 'dev', lambda: self.connection)
+
+    def test_write_and_read(self):
+        self.storage.write('1.json.gz', 'contents', content_encoding='gzip')
+        self.assertEqual(self.storage.read('1.json.gz'), 'contents')
+        data, headers = self.connection.buckets['courses'].keys['dev/1.json.gz']
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+    def test_read_missing(self):
+        with self.assertRaises(IOError):
+            self.storage.read('missing.json.gz')
+
+    def test_bucket_is_reused(self):
+        self.storage.write('1.json.gz', 'contents')
+        self.storage.read('1.json.gz')
+        self.storage.read('1.json.gz')
+        self.assertEqual(self.connection.get_bucket_calls, 1)
+
+
+class TestCachingStorage(TestCase):
+
+    def setUp(self):
+        super(TestCachingStorage, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.backend = storage.MemoryStorage()
+        self.storage = storage.CachingStorage(self.backend, self.directory)
+        self.backend.write('1.json.gz', 'version 1')
+
+    def test_read_through(self):
+        self.assertEqual(self.storage.read('1.json.gz', 'v1'), 'version 1')
+        del self.backend.files['1.json.gz']
+        self.assertEqual(self.storage.read('1.json.gz', 'v1'), 'version 1')
+
+    def test_new_version_replaces_cached_copy(self):
+        self.storage.read('1.json.gz', 'v1')
+        self.storage.write('1.json.gz', 'version 2')
+        self.assertEqual(self.storage.read('1.json.gz', 'v2'), 'version 2')
+        self.assertEqual(os.listdir(self.directory), ['v2.1.json.gz'])
+
+    def test_unversioned_reads_are_not_cached(self):
+        self.storage.read('1.json.gz')
+        self.assertEqual(os.listdir(self.directory), [])
@@ -1,13 +1,16 @@
 import ddt
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
 import django.http
 import json
 from lxml import etree
 from mock import patch, ANY, DEFAULT, MagicMock
 from canvas_sdk.exceptions import CanvasAPIError
 
+import edx2canvas.course_format as course_format
 import edx2canvas.views as views
 import edx2canvas.models as models
+import edx2canvas.module_cache as module_cache
+import edx2canvas.storage as storage
 import test_common
 
 @ddt.ddt
@@ -113,12 +116,16 @@ class TestMainView(test_common.TestBase):
 
     @patch('edx2canvas.views.render')
     def test_main_context(self, render_mock):
+        catalog_page = [{'id': self.edx_course_id, 'title': self.edx_course.title}]
+        self.setup_patch('edx2canvas.views.catalog.search_catalog', (150, catalog_page))
         views.main(self.request)
         context = dict(
             canvas_modules=json.dumps({
-                'modules': self.module_list, 'id': self.canvas_course_id
+                'id': self.canvas_course_id, 'modules': self.module_list,
+                'modules_version': module_cache.version_of(self.module_list)
             }),
-            edx_courses=[self.edx_course]
+            edx_courses=catalog_page,
+            edx_course_count=150
         )
         render_mock.assert_called_once_with(
             self.request, self.get_template('index'), context
@@ -178,8 +185,31 @@ class TestGetCanvasModules(test_common.TestBase):
         response = views.get_canvas_modules(self.request)
         self.assertEqual(
             json.loads(response.content),
-            {'id': self.canvas_course_id, 'modules': self.module_list}
+            {
+                'id': self.canvas_course_id, 'modules': self.module_list,
+                'modules_version': module_cache.version_of(self.module_list)
+            }
+        )
+
+    def test_get_modules_etag(self):
+        response = views.get_canvas_modules(self.request)
+        self.assertIn('ETag', response)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_get_modules_not_modified(self):
+        etag = views.get_canvas_modules(self.request)['ETag']
+        self.request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = views.get_canvas_modules(self.request)
+        self.assertEqual(
+            response.status_code, 304,
+            'Expected Not Modified status code when the ETag matches'
         )
+        self.assertEqual(response['ETag'], etag)
+
+    def test_get_modules_changed(self):
+        self.request.META['HTTP_IF_NONE_MATCH'] = '"stale"'
+        response = views.get_canvas_modules(self.request)
+        self.assertEqual(response.status_code, 200)
 
     def test_main_with_missing_launch_session(self):
         del self.request.session['LTI_LAUNCH']
@@ -214,6 +244,7 @@ class TestGetCanvasModules(test_common.TestBase):
             'Expected Forbidden status code if no API key exists. Got: {}'.format(response.status_code)
         )
 
+@ddt.ddt
 class TestGetEdxCourse(test_common.TestBase):
     def setUp(self):
         super(TestGetEdxCourse, self).setUp()
@@ -221,7 +252,9 @@ class TestGetEdxCourse(test_common.TestBase):
         self.request.method = 'GET'
         self.request.GET = {'edx_course_id': self.canvas_course_id}
         self.request.user = User()
-        self.parsed_course = 'A parsed edX course'
+        self.request.META = {}
+        self.course = {'type': 'course', 'id': 'run', 'score': 0, 'display_name': 'Course'}
+        self.stored_course = storage.compress(json.dumps(course_format.compact_course(self.course)))
 
     def test_main_with_missing_course_id(self):
         del self.request.GET['edx_course_id']
@@ -239,3 +272,247 @@ class TestGetEdxCourse(test_common.TestBase):
             response.status_code, 404,
             'Expected Not Found status code when edX course does not exist'
         )
+
+    @patch('edx2canvas.views.storage.read_course')
+    def test_not_modified(self, read_mock):
+        self.edx_course.content_hash = 'abc123'
+        self.request.META['HTTP_IF_NONE_MATCH'] = '"abc123-{}-nested"'.format(self.canvas_course_id)
+        response = views.get_edx_course(self.request)
+        self.assertEqual(
+            response.status_code, 304,
+            'Expected Not Modified status code when the ETag matches'
+        )
+        self.assertFalse(read_mock.called)
+
+    @patch('edx2canvas.views.storage.read_course')
+    def test_etag(self, read_mock):
+        read_mock.return_value = self.stored_course
+        self.edx_course.content_hash = 'abc123'
+        self.edx_course.id = self.canvas_course_id
+        response = views.get_edx_course(self.request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"abc123-{}-nested"'.format(self.canvas_course_id))
+        self.assertEqual(response['Cache-Control'], views.COURSE_CACHE_CONTROL)
+
+    @patch('edx2canvas.views.storage.read_course')
+    def test_compact_gzip_pass_through(self, read_mock):
+        read_mock.return_value = self.stored_course
+        self.request.GET['format'] = 'compact'
+        self.request.META['HTTP_ACCEPT_ENCODING'] = 'gzip, deflate'
+        response = views.get_edx_course(self.request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(''.join(response.streaming_content), self.stored_course)
+        self.assertEqual(response['X-Edx-Course-Id'], str(self.canvas_course_id))
+
+    @ddt.data('gzip;q=0', 'gzip; q=0.0, deflate', '*;q=0', 'deflate')
+    @patch('edx2canvas.views.storage.read_course')
+    def test_compact_gzip_refused(self, accept_encoding, read_mock):
+        read_mock.return_value = self.stored_course
+        self.request.GET['format'] = 'compact'
+        self.request.META['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        response = views.get_edx_course(self.request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @ddt.data('gzip;q=0.5', 'deflate, *', 'GZIP')
+    @patch('edx2canvas.views.storage.read_course')
+    def test_compact_gzip_accepted(self, accept_encoding, read_mock):
+        read_mock.return_value = self.stored_course
+        self.request.GET['format'] = 'compact'
+        self.request.META['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        response = views.get_edx_course(self.request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @patch('edx2canvas.views.storage.read_course')
+    def test_compact_without_gzip(self, read_mock):
+        read_mock.return_value = self.stored_course
+        self.request.GET['format'] = 'compact'
+        response = views.get_edx_course(self.request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(
+            json.loads(''.join(response.streaming_content)),
+            course_format.compact_course(self.course)
+        )
+
+    @patch('edx2canvas.views.course_index.outline')
+    def test_outline(self, outline_mock):
+        outline_mock.return_value = {'display_name': 'Course', 'children': []}
+        self.edx_course.node_count = 1
+        self.request.GET['format'] = 'outline'
+        response = views.get_edx_course(self.request)
+        self.assertEqual(
+            json.loads(response.content),
+            {'id': self.canvas_course_id, 'display_name': 'Course', 'children': []}
+        )
+
+
+@ddt.ddt
+class TestGetEdxCourseChildren(test_common.TestBase):
+    def setUp(self):
+        super(TestGetEdxCourseChildren, self).setUp()
+        self.request = django.http.HttpRequest()
+        self.request.method = 'GET'
+        self.request.GET = {'edx_course_id': self.edx_course_id, 'usage_id': self.edx_usage_id}
+        self.request.user = User()
+        self.request.META = {}
+        self.edx_course.node_count = 1
+        self.children_mock = self.setup_patch('edx2canvas.views.course_index.children', [])
+
+    @ddt.data('edx_course_id', 'usage_id')
+    def test_missing_param(self, param):
+        del self.request.GET[param]
+        response = views.get_edx_course_children(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_node(self):
+        self.children_mock.return_value = None
+        response = views.get_edx_course_children(self.request)
+        self.assertEqual(response.status_code, 404)
+
+    def test_children(self):
+        self.children_mock.return_value = [{'type': 'problem', 'child_count': 0}]
+        response = views.get_edx_course_children(self.request)
+        self.children_mock.assert_called_with(self.edx_course, self.edx_usage_id)
+        self.assertEqual(json.loads(response.content), {
+            'usage_id': self.edx_usage_id, 'children': [{'type': 'problem', 'child_count': 0}]
+        })
+
+
+class TestCreateEdxCourse(test_common.TestBase):
+    def setUp(self):
+        super(TestCreateEdxCourse, self).setUp()
+        self.request = django.http.HttpRequest()
+        self.request.method = 'POST'
+        self.request.META = {'HTTP_CONTENT_ENCODING': 'gzip'}
+        self.upload = json.dumps({'title': 'Course', 'body': {'type': 'course'}})
+        self.request._body = storage.compress(self.upload)
+        self.queue_mock = self.setup_patch(
+            'edx2canvas.views.ingest.queue_upload', models.IngestJob(id=7, token='abc')
+        )
+        self.setup_patch('edx2canvas.views.reverse', '/edx2canvas/edx_course/job')
+
+    def test_upload_is_queued(self):
+        response = views.create_edx_course(self.request)
+        self.queue_mock.assert_called_once_with(self.request._body, 'gzip')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content), {'job_id': 7, 'token': 'abc'})
+        self.assertEqual(response['Location'], '/edx2canvas/edx_course/job?job_id=7&token=abc')
+
+    def test_uncompressed_upload(self):
+        self.request.META = {}
+        self.request._body = self.upload
+        response = views.create_edx_course(self.request)
+        self.queue_mock.assert_called_once_with(self.upload, '')
+        self.assertEqual(response.status_code, 202)
+
+    def test_oversized_upload(self):
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(self.request._body) - 1):
+            response = views.create_edx_course(self.request)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.queue_mock.called)
+
+    def test_oversized_content_length(self):
+        self.request.META['CONTENT_LENGTH'] = str(len(self.request._body) + 1)
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(self.request._body)):
+            response = views.create_edx_course(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_is_not_decompressed(self):
+        # Uploads that expand past the limit are refused by the worker.
+        upload = json.dumps({'title': 'Course' * 1000})
+        self.request._body = storage.compress(upload)
+        with patch('edx2canvas.ingest.MAX_UPLOAD_SIZE', len(upload) - 1):
+            response = views.create_edx_course(self.request)
+        self.assertEqual(response.status_code, 202)
+
+
+class TestGetIngestJob(test_common.TestBase):
+    def setUp(self):
+        super(TestGetIngestJob, self).setUp()
+        self.request = django.http.HttpRequest()
+        self.request.method = 'GET'
+        self.request.GET = {'job_id': 7}
+        self.request.user = User()
+        self.job = models.IngestJob(id=7, status=models.IngestJob.FAILED, error='Invalid upload', token='abc')
+        self.setup_patch('edx2canvas.models.IngestJob.objects.defer', MagicMock())
+        models.IngestJob.objects.defer.return_value.get.return_value = self.job
+
+    def test_missing_job_id(self):
+        del self.request.GET['job_id']
+        response = views.get_ingest_job(self.request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_job_status(self):
+        response = views.get_ingest_job(self.request)
+        self.assertEqual(json.loads(response.content), {
+            'job_id': 7, 'status': 'failed', 'edx_course_id': None, 'error': 'Invalid upload'
+        })
+
+    def test_anonymous_request_refused(self):
+        self.request.user = AnonymousUser()
+        response = views.get_ingest_job(self.request)
+        self.assertEqual(response.status_code, 403)
+
+    def test_job_token(self):
+        self.request.user = AnonymousUser()
+        self.request.GET['token'] = 'abc'
+        response = views.get_ingest_job(self.request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_job_token(self):
+        self.request.user = AnonymousUser()
+        self.request.GET['token'] = 'guess'
+        response = views.get_ingest_job(self.request)
+        self.assertEqual(response.status_code, 403)
+
+
+class TestSearchEdxCourses(test_common.TestBase):
+    def setUp(self):
+        super(TestSearchEdxCourses, self).setUp()
+        self.request = django.http.HttpRequest()
+        self.request.method = 'GET'
+        self.request.GET = {'q': 'newton', 'type': 'problem', 'min_score': '1'}
+        self.request.user = User()
+        self.edx_course.id = self.edx_course_id
+        self.node = models.EdxCourseNode(
+            edx_course=self.edx_course, usage_id=self.edx_usage_id, node_type='problem', score=2,
+            attributes=json.dumps({'display_name': 'Newton'}), path=json.dumps(['Chapter 1'])
+        )
+        self.search_mock = self.setup_patch('edx2canvas.views.course_index.search', [self.node])
+
+    def test_search(self):
+        response = views.search_edx_courses(self.request)
+        self.search_mock.assert_called_once_with('newton', 'problem', 1)
+        self.assertEqual(json.loads(response.content), {'results': [{
+            'edx_course_id': self.edx_course_id,
+            'course_title': self.edx_course.title,
+            'usage_id': self.edx_usage_id,
+            'display_name': 'Newton',
+            'type': 'problem',
+            'score': 2,
+            'path': ['Chapter 1'],
+        }]})
+
+    def test_invalid_min_score(self):
+        self.request.GET['min_score'] = 'lots'
+        response = views.search_edx_courses(self.request)
+        self.assertEqual(response.status_code, 400)
+
+
+class TestGetEdxCatalog(test_common.TestBase):
+    def setUp(self):
+        super(TestGetEdxCatalog, self).setUp()
+        self.request = django.http.HttpRequest()
+        self.request.method = 'GET'
+        self.request.GET = {'q': 'phys', 'offset': '10', 'limit': '1000'}
+        self.request.user = User()
+        self.search_mock = self.setup_patch('edx2canvas.views.catalog.search_catalog', (11, [{'id': 1}]))
+
+    def test_catalog(self):
+        response = views.get_edx_catalog(self.request)
+        self.search_mock.assert_called_once_with('phys', 10, views.catalog.PAGE_SIZE)
+        self.assertEqual(json.loads(response.content), {'total': 11, 'courses': [{'id': 1}]})
+
+    def test_invalid_offset(self):
+        self.request.GET['offset'] = 'first'
+        response = views.get_edx_catalog(self.request)
+        self.assertEqual(response.status_code, 400)
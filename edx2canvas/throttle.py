@@ -0,0 +1,102 @@
+"""
+Adaptive limits on concurrent calls to the Canvas API.
+
+Canvas rate-limits each API token with a leaky bucket: every request costs
+some of the token's quota (reported in the X-Request-Cost header), which
+refills over time, and what is left is reported in X-Rate-Limit-Remaining.
+A request made with the quota used up is refused with a 403 Forbidden (Rate
+Limit Exceeded).
+
+A Throttle limits how many calls may be made with one token at a time, and
+adjusts that limit from the responses it sees, additive-increase /
+multiplicative-decrease: the limit grows by about one for each limit's worth
+of responses that leave plenty of quota, and halves whenever the quota runs
+low or a request is throttled. Many threads working for one token (as
+populate.create_module_items does) then settle at the most concurrency that
+Canvas will sustain.
+"""
+import logging
+import threading
+
+log = logging.getLogger("edx2canvas.log")
+
+# Below this much remaining quota, the limit is decreased rather than raised.
+LOW_QUOTA = 150
+
+
+class Throttle(object):
+
+    def __init__(self, max_concurrency, name=''):
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self.limit = max(1.0, max_concurrency / 2.0)
+        self.in_flight = 0
+        self.remaining = None
+        self.last_cost = None
+        self.throttled_count = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def __enter__(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        self._local.throttled = False
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def record(self, response, *args, **kwargs):
+        """
+        Adjust the limit from a response from Canvas. This is a requests
+        response hook, so it is called in the thread that made the request.
+        """
+        remaining = _float_header(response, 'X-Rate-Limit-Remaining')
+        cost = _float_header(response, 'X-Request-Cost')
+        throttled = response.status_code == 403 and 'Rate Limit Exceeded' in response.text
+        with self._condition:
+            if remaining is not None:
+                self.remaining = remaining
+            if cost is not None:
+                self.last_cost = cost
+            if throttled:
+                self.throttled_count += 1
+            if throttled or (remaining is not None and remaining < LOW_QUOTA):
+                self.limit = max(1.0, self.limit / 2)
+                log.info("Canvas API throttled: %s", self.state())
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                self._condition.notify_all()
+        if throttled:
+            self._local.throttled = True
+
+    def was_throttled(self):
+        """
+        Whether the last request made by this thread was refused because the
+        rate limit was exceeded.
+        """
+        return getattr(self._local, 'throttled', False)
+
+    def state(self):
+        """
+        Return the current state of the throttle, for logging.
+        """
+        return {
+            'name': self.name,
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'remaining': self.remaining,
+            'last_cost': self.last_cost,
+            'throttled_count': self.throttled_count,
+        }
+
+
+def _float_header(response, header):
+    try:
+        return float(response.headers[header])
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -5,11 +5,18 @@ urlpatterns = patterns('',
     url(r'^lti_launch$', 'edx2canvas.views.lti_launch', name='lti_launch'),
     url(r'^main$', 'edx2canvas.views.main', name='main'),
     url(r'^canvas_modules$', 'edx2canvas.views.get_canvas_modules', name='canvas_modules'),
+    url(r'^edx_course/catalog$', 'edx2canvas.views.get_edx_catalog', name='edx_catalog'),
     url(r'^edx_course$', 'edx2canvas.views.get_edx_course', name='edx_course'),
+    url(r'^edx_course/children$', 'edx2canvas.views.get_edx_course_children', name='edx_course_children'),
+    url(r'^edx_course/search$', 'edx2canvas.views.search_edx_courses', name='search_edx_courses'),
     url(r'^edx_course/new$', 'edx2canvas.views.create_edx_course', name='create_edx_course'),
+    url(r'^edx_course/job$', 'edx2canvas.views.get_ingest_job', name='ingest_job'),
     url(r'^tool_config$', 'edx2canvas.views.tool_config', name='tool_config'),
 
     url(r'^add_to_canvas$', 'edx2canvas.populate.add_to_canvas', name='add_to_canvas'),
+    url(r'^add_to_canvas/batch$', 'edx2canvas.populate.add_to_canvas_batch', name='add_to_canvas_batch'),
+    url(r'^populate/new$', 'edx2canvas.populate.start_populate_job', name='start_populate_job'),
+    url(r'^populate/job$', 'edx2canvas.populate.get_populate_job', name='populate_job'),
     url(r'^create_canvas_module$', 'edx2canvas.populate.create_canvas_module', name='create_canvas_module'),
 
     url(r'^lti_preview', 'edx2canvas.lti_consumer.launch_lti_preview', name='launch_lti_preview'),
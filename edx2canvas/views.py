@@ -1,22 +1,35 @@
+import hashlib
 import json
 import logging
 from django.shortcuts import render, redirect
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags, quote_etag
 from ims_lti_py.tool_config import ToolConfig
 import django.http as http
-from models import CanvasApiAuthorization, EdxCourse
+from models import CanvasApiAuthorization, EdxCourse, IngestJob
 from canvas_sdk.exceptions import CanvasAPIError
 import canvas_api
-from boto.s3.connection import S3Connection
-from boto.s3.key import Key
-from django.conf import settings
-import os
+import catalog
+import course_cache
+import course_format
+import course_index
+import ingest
+import module_cache
+import storage
+import zlib
 
 TOOL_NAME = "edx2canvas"
 
+# Course structures only change when a course is re-uploaded, so browsers may
+# reuse them for a few minutes before revalidating.
+COURSE_CACHE_CONTROL = 'private, max-age=300'
+
+# Size of the chunks in which stored courses are streamed to the browser.
+STREAM_CHUNK_SIZE = 64 * 1024
+
 log = logging.getLogger("edx2canvas.log")
 
 @require_http_methods(['GET'])
@@ -64,8 +77,9 @@ def lti_launch(request):
 def main(request):
     """
     Launch the main page of the authoring app. Create a context that includes
-    all available edX courses and the module structure of the Canvas course from
-    which the tool was launched.
+    the first page of the catalog of edX courses (see catalog.py), the number
+    of courses in it, and the module structure of the Canvas course from which
+    the tool was launched.
     """
     try:
         canvas_course_id = request.session['LTI_LAUNCH']['custom_canvas_course_id']
@@ -73,24 +87,58 @@ def main(request):
     except KeyError:
         return http.HttpResponseBadRequest()
 
-    edx_courses = EdxCourse.objects.all()
     try:
         canvas_auth = CanvasApiAuthorization.objects.get(lti_user_id=canvas_user_id)
     except CanvasApiAuthorization.DoesNotExist:
         return canvas_api.start_oauth(request, canvas_user_id)
 
     try:
-        canvas_modules = canvas_api.get_module_list(canvas_auth, canvas_course_id)
+        # The course may have been edited in Canvas since the tool was last
+        # used, so its module list is always fetched afresh on launch.
+        modules_version, canvas_modules = module_cache.get_modules(
+            canvas_auth, canvas_course_id, refresh=True
+        )
     except CanvasAPIError as e:
         if e.status_code == 401:
+            canvas_api.forget_token(canvas_auth.canvas_api_token)
             return canvas_api.start_oauth(request, canvas_user_id)
         raise
+    edx_course_count, edx_courses = catalog.search_catalog()
     return render(request, 'edx2canvas/index.html', {
         'edx_courses': edx_courses,
-        'canvas_modules': json.dumps({'id': canvas_course_id, 'modules': canvas_modules})
+        'edx_course_count': edx_course_count,
+        'canvas_modules': json.dumps({
+            'id': canvas_course_id, 'modules': canvas_modules, 'modules_version': modules_version
+        })
     })
 
 
+@login_required()
+@require_http_methods(['GET'])
+def get_edx_catalog(request):
+    """
+    Fetch a page of the catalog of uploaded edX courses, for the course
+    selector.
+
+    The GET parameters are all optional:
+    - q: only include courses whose title, org, course or run contain this.
+    - offset: the index of the first course to return.
+    - limit: the number of courses to return (at most catalog.PAGE_SIZE).
+
+    Returns a JSON object with:
+    - total: the number of courses that match q.
+    - courses: the page of courses, with their id, title, org, course, run,
+      key_version, node_count and problem_count.
+    """
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(int(request.GET.get('limit', catalog.PAGE_SIZE)), catalog.PAGE_SIZE)
+    except ValueError:
+        return http.HttpResponseBadRequest()
+    total, courses = catalog.search_catalog(request.GET.get('q', ''), offset, limit)
+    return http.JsonResponse({'total': total, 'courses': courses})
+
+
 @login_required()
 @require_http_methods(['GET'])
 def get_canvas_modules(request):
@@ -101,6 +149,11 @@ def get_canvas_modules(request):
     Returns a JSON object with:
     - id: the Canvas course ID.
     - modules: a list of Canvas module objects.
+    - modules_version: the version of the list (see module_cache.py).
+
+    The list is served from the module cache if it is there. The response
+    carries the version of the list as its ETag, and a request whose
+    If-None-Match header matches it gets a 304 Not Modified instead.
     """
     try:
         canvas_course_id = request.GET['course_id']
@@ -111,9 +164,13 @@ def get_canvas_modules(request):
         canvas_auth = CanvasApiAuthorization.objects.get(lti_user_id=canvas_user_id)
     except CanvasApiAuthorization.DoesNotExist:
         return http.HttpResponseForbidden()
-    module_list = canvas_api.get_module_list(canvas_auth, canvas_course_id)
-    return http.JsonResponse(
-        {'id': request.GET['course_id'], 'modules': module_list}, safe=False
+    version, module_list = module_cache.get_modules(canvas_auth, canvas_course_id)
+    content = json.dumps({'id': canvas_course_id, 'modules': module_list, 'modules_version': version})
+    # The module list changes whenever the course is edited, so the browser
+    # must always revalidate it.
+    return _conditional_response(
+        request, version, 'private, no-cache',
+        lambda: http.HttpResponse(content, content_type='application/json')
     )
 
 
@@ -126,96 +183,312 @@ def get_edx_course(request):
     Returns a JSON representation of the edX course structure. Note that this
     JSON object is a direct parsing of the edX course XML structure, and may
     change with little or no warning if the edX export format is modified.
+
+    If the 'format' GET parameter is 'compact', the structure is returned as a
+    flat node table (see course_format.py) rather than as a nested tree. The
+    compact form is streamed exactly as it is stored, gzip-compressed, without
+    being parsed; the course ID is sent in the X-Edx-Course-Id header rather
+    than in the body. If the client does not accept gzip, the stored bytes are
+    decompressed as they are streamed.
+
+    If 'format' is 'outline', only the course's chapters and sequentials are
+    returned, each with a child_count. The rest of the course can be fetched
+    as it is needed from get_edx_course_children.
+
+    The course selector only asks for the outline. The nested and compact
+    forms are kept for other clients of this endpoint that need a whole
+    course at once; compact is the cheaper of the two to serve, as it is sent
+    as it is stored.
+
+    The stored course is cached (see course_cache.py) until the course is
+    re-uploaded. Responses carry an ETag based on the stored course's content
+    hash, so a conditional request for an unchanged course gets a 304 Not
+    Modified without the course being loaded at all.
     """
     try:
         course_id = request.GET['edx_course_id']
     except KeyError:
         return http.HttpResponseBadRequest()
+    representation = request.GET.get('format')
+    if representation not in course_cache.FORMATS:
+        representation = 'nested'
+    compact = representation == 'compact'
     try:
         edx_course = EdxCourse.objects.get(id=course_id)
     except EdxCourse.DoesNotExist:
         return http.HttpResponseNotFound()
 
-    input_filename = '%s.json' % course_id
-
-    if settings.STORE_FILES_IN_S3:
-        try:
-            courses_bucket_name = getattr(settings, 'COURSES_BUCKET', None)
-            # get the bucket
-            log.info("reading file from s3")
-            conn = S3Connection()
-            courses_bucket = conn.get_bucket(courses_bucket_name)
-            path = getattr(settings, 'COURSES_FOLDER', None)
-            full_key_name = os.path.join(path, input_filename)
-            k = Key(courses_bucket)
-            k.key = full_key_name
-            k.content_type = 'application/json'
-            k.content_encoding = 'UTF-8'
-            parsed = json.loads(k.get_contents_as_string())
-            k.close()
+    gzipped = compact and _accepts_gzip(request)
+    if edx_course.content_hash:
+        etag = _course_etag(edx_course.content_hash, course_id, representation, gzipped)
+        if _etag_matches(request, etag):
+            return _not_modified(etag, COURSE_CACHE_CONTROL)
+
+    if compact:
+        content = course_cache.lookup(edx_course, 'compact')
+        if content is None:
+            try:
+                content = storage.read_course(edx_course)
+            except IOError:
+                return http.HttpResponseNotFound()
+            course_cache.store(edx_course, 'compact', content)
+        build_response = lambda: _stream_course(content, gzipped)
+    elif representation == 'outline':
+        content = course_cache.lookup(edx_course, 'outline')
+        if content is None:
+            try:
+                course_index.ensure_index(edx_course)
+            except IOError:
+                return http.HttpResponseNotFound()
+            parsed = course_index.outline(edx_course)
             parsed['id'] = course_id
-            return http.JsonResponse(parsed, safe=False)
-        except IOError:
-            return http.HttpResponseNotFound()
+            content = json.dumps(parsed)
+            course_cache.store(edx_course, 'outline', content)
+        build_response = lambda: http.HttpResponse(content, content_type='application/json')
     else:
-        try:
-            with open("courses/{}.json".format(course_id)) as infile:
-                parsed = json.load(infile)
-                parsed['id'] = course_id
-                return http.JsonResponse(parsed, safe=False)
-        except IOError:
-            return http.HttpResponseNotFound()
+        content = course_cache.lookup(edx_course, 'nested')
+        if content is None:
+            try:
+                stored = storage.read_course(edx_course)
+            except IOError:
+                return http.HttpResponseNotFound()
+            parsed = course_format.expand_course(json.loads(storage.decompress(stored)))
+            parsed['id'] = course_id
+            content = json.dumps(parsed)
+            course_cache.store(edx_course, 'nested', content)
+        build_response = lambda: http.HttpResponse(content, content_type='application/json')
+
+    if not edx_course.content_hash:
+        # Courses uploaded before content hashes were stored.
+        etag = _course_etag(hashlib.sha1(content).hexdigest(), course_id, representation, gzipped)
+    response = _conditional_response(request, etag, COURSE_CACHE_CONTROL, build_response)
+    response['X-Edx-Course-Id'] = course_id
+    if compact:
+        response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@login_required()
+@require_http_methods(['GET'])
+def get_edx_course_children(request):
+    """
+    Fetch the children of one node of an edX course, so that a course outline
+    (see get_edx_course) can be expanded on demand.
+
+    Returns a JSON object with:
+    - usage_id: the usage ID of the node.
+    - children: the node's children, without their own children. Each child
+      has a child_count giving the number of children it has.
+    """
+    try:
+        course_id = request.GET['edx_course_id']
+        usage_id = request.GET['usage_id']
+    except KeyError:
+        return http.HttpResponseBadRequest()
+    try:
+        edx_course = EdxCourse.objects.get(id=course_id)
+    except EdxCourse.DoesNotExist:
+        return http.HttpResponseNotFound()
+
+    representation = 'children-' + hashlib.sha1(usage_id.encode('utf-8')).hexdigest()
+    if edx_course.content_hash:
+        etag = _course_etag(edx_course.content_hash, course_id, representation, False)
+        if _etag_matches(request, etag):
+            return _not_modified(etag, COURSE_CACHE_CONTROL)
+    try:
+        course_index.ensure_index(edx_course)
+    except IOError:
+        return http.HttpResponseNotFound()
+    children = course_index.children(edx_course, usage_id)
+    if children is None:
+        return http.HttpResponseNotFound()
+    content = json.dumps({'usage_id': usage_id, 'children': children})
+    if not edx_course.content_hash:
+        etag = _course_etag(hashlib.sha1(content).hexdigest(), course_id, representation, False)
+    return _conditional_response(
+        request, etag, COURSE_CACHE_CONTROL,
+        lambda: http.HttpResponse(content, content_type='application/json')
+    )
+
+
 
+@login_required()
+@require_http_methods(['GET'])
+def search_edx_courses(request):
+    """
+    Search the nodes of every uploaded edX course.
+
+    The 'q' GET parameter holds the words to search for; a node matches if
+    each word starts one of the words of its display name, or its type.
+    Results can be limited to a node type with 'type', and to nodes worth at
+    least some number of points with 'min_score'.
+
+    Returns a JSON object with:
+    - results: the matching nodes, each with its edx_course_id, course_title,
+      usage_id, display_name, type, score and path (the display names of the
+      chapter, sequential and so on that contain it).
+    """
+    query = request.GET.get('q', '')
+    node_type = request.GET.get('type')
+    try:
+        min_score = int(request.GET['min_score']) if request.GET.get('min_score') else None
+    except ValueError:
+        return http.HttpResponseBadRequest()
+    nodes = course_index.search(query, node_type, min_score)
+    results = []
+    for node in nodes:
+        attributes = json.loads(node.attributes)
+        results.append({
+            'edx_course_id': node.edx_course_id,
+            'course_title': node.edx_course.title,
+            'usage_id': node.usage_id,
+            'display_name': attributes.get('display_name'),
+            'type': node.node_type,
+            'score': node.score,
+            'path': json.loads(node.path),
+        })
+    return http.JsonResponse({'results': results})
 
 
 @require_http_methods(['POST'])
 def create_edx_course(request):
+    """
+    Accept a course structure uploaded by bin/parse_course.py.
+
+    The upload is queued to be stored in the background (see ingest.py), and
+    the response is a 202 Accepted with a JSON object giving the job_id of
+    the upload and a token. Its progress can be followed with
+    get_ingest_job.
+
+    Uploads larger than ingest.MAX_UPLOAD_SIZE are refused with a 400 Bad
+    Request. Only the size of the request is checked here; the worker
+    decompresses the upload, and fails the job if it is too large once
+    decompressed.
+    """
     try:
-        data = json.loads(request.body)
-        title = data['title']
-        org = data['org']
-        course = data['course']
-        run = data['run']
-        key_version = data['key_version']
-        body = json.loads(data['body'])
-
-        edx_course, __ = EdxCourse.objects.get_or_create(
-            title=title,
-            org=org,
-            course=course,
-            run=run,
-            key_version=key_version
-        )
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    # The Content-Length is checked before the body is read.
+    if content_length > ingest.MAX_UPLOAD_SIZE or len(request.body) > ingest.MAX_UPLOAD_SIZE:
+        return http.HttpResponseBadRequest("Invalid upload: larger than {} bytes".format(ingest.MAX_UPLOAD_SIZE))
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
+    job = ingest.queue_upload(request.body, content_encoding)
+    response = http.JsonResponse({'job_id': job.id, 'token': job.token}, status=202)
+    response['Location'] = '{}?job_id={}&token={}'.format(reverse('edx2canvas:ingest_job'), job.id, job.token)
+    return response
+
+
+@require_http_methods(['GET'])
+def get_ingest_job(request):
+    """
+    Report the progress of a course upload queued by create_edx_course.
 
-    except KeyError as e:
-        log.info("{}".format(e))
+    Returns a JSON object with:
+    - job_id: the ID of the upload job.
+    - status: one of 'pending', 'running', 'succeeded' or 'failed'.
+    - edx_course_id: the ID of the stored course, once the job has succeeded.
+    - error: a description of the problem, if the job has failed.
+
+    The caller must be logged in, or give the token that create_edx_course
+    returned for the job, as bin/parse_course.py does.
+    """
+    try:
+        job_id = request.GET['job_id']
+    except KeyError:
         return http.HttpResponseBadRequest()
+    try:
+        job = IngestJob.objects.defer('payload').get(id=job_id)
+    except (IngestJob.DoesNotExist, ValueError):
+        return http.HttpResponseNotFound()
+    token = request.GET.get('token')
+    if not request.user.is_authenticated() and not (token and constant_time_compare(token, job.token)):
+        return http.HttpResponseForbidden()
+    response = http.JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'edx_course_id': job.edx_course_id,
+        'error': job.error,
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _accepts_gzip(request):
+    """
+    Whether a request's Accept-Encoding header allows a gzip response, by
+    naming gzip or '*' with a non-zero q-value.
+    """
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        params = coding.split(';')
+        name = params[0].strip().lower()
+        quality = 1.0
+        for param in params[1:]:
+            key, __, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def _etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+
 
-    output_filename = '%s.json' % edx_course.id
-    output = json.dumps(body, indent=4)
-
-    if settings.STORE_FILES_IN_S3:
-        try:
-            utf8_output = output.encode('utf-8')
-            courses_bucket_name = getattr(settings, 'COURSES_BUCKET', None)
-            # get the bucket
-            log.info("writing file to s3")
-            conn = S3Connection()
-            courses_bucket = conn.get_bucket(courses_bucket_name)
-            path = getattr(settings, 'COURSES_FOLDER', None)
-            full_key_name = os.path.join(path, output_filename)
-            k = Key(courses_bucket)
-            k.key = full_key_name
-            k.content_type = 'application/json'
-            k.content_encoding = 'UTF-8'
-            k.set_contents_from_string(utf8_output)
-            k.close()
-        except Exception as e:
-            log.info("{}".format(e))
-            return http.HttpResponseServerError()
+def _not_modified(etag, cache_control):
+    response = http.HttpResponseNotModified()
+    response['ETag'] = quote_etag(etag)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _conditional_response(request, etag, cache_control, build_response):
+    """
+    Return a 304 Not Modified if the request's If-None-Match matches etag, or
+    else the response from build_response with validators added.
+    """
+    if _etag_matches(request, etag):
+        return _not_modified(etag, cache_control)
+    response = build_response()
+    response['ETag'] = quote_etag(etag)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _course_etag(content_hash, course_id, representation, gzipped):
+    etag = '{}-{}-{}'.format(content_hash, course_id, representation)
+    return etag + '-gzip' if gzipped else etag
+
+
+def _stream_course(compressed, gzipped):
+    """
+    Stream a stored (gzip-compressed) course, either as it is or decompressing
+    it on the way out.
+    """
+    chunks = (
+        compressed[start:start + STREAM_CHUNK_SIZE]
+        for start in xrange(0, len(compressed), STREAM_CHUNK_SIZE)
+    )
+    if gzipped:
+        response = http.StreamingHttpResponse(chunks, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = len(compressed)
     else:
-        with open("courses/{}.json".format(edx_course.id), 'w') as outfile:
-            outfile.write(json.dumps(body, indent=4))
+        response = http.StreamingHttpResponse(_decompress_chunks(chunks), content_type='application/json')
+    return response
 
 
-    return HttpResponse(status=201)
+def _decompress_chunks(chunks):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
@@ -213,4 +213,26 @@ CANVAS_OAUTH_CLIENT_ID = SECURE_SETTINGS.get('canvas_oauth_client_id', None)
 CANVAS_OAUTH_CLIENT_KEY = SECURE_SETTINGS.get('canvas_oauth_client_key', None)
 
 COURSES_BUCKET = SECURE_SETTINGS.get('courses_bucket', None)
-COURSES_FOLDER = SECURE_SETTINGS.get('courses_folder', 'dev')
\ No newline at end of file
+COURSES_FOLDER = SECURE_SETTINGS.get('courses_folder', 'dev')
+# If set, courses read from S3 are also kept in this local directory.
+COURSES_CACHE_DIRECTORY = SECURE_SETTINGS.get('courses_cache_directory', None)
+
+# Course structures served to the browser are cached in each process, up to
+# this many bytes, and also in this Django cache (if set) across processes.
+EDX_COURSE_CACHE_MAX_BYTES = SECURE_SETTINGS.get('edx_course_cache_max_bytes', 64 * 1024 * 1024)
+EDX_COURSE_SHARED_CACHE = SECURE_SETTINGS.get('edx_course_shared_cache', None)
+
+# Uploaded course structures larger than this many bytes are refused: by the
+# upload view if the request is larger, and by the worker if the structure is
+# larger once decompressed.
+EDX_COURSE_MAX_UPLOAD_SIZE = SECURE_SETTINGS.get('edx_course_max_upload_size', 512 * 1024 * 1024)
+
+# The Django cache in which the catalog of uploaded courses is kept. It must be
+# shared by the web processes and the process_jobs worker, which invalidates it
+# when a course is uploaded; if it is not set, the catalog is not cached.
+EDX_COURSE_CATALOG_CACHE = SECURE_SETTINGS.get('edx_course_catalog_cache', None)
+
+# The Django cache in which the module lists of Canvas courses are kept and
+# patched as the tool adds to them. It must be shared by every process that
+# serves the tool; if it is not set, module lists are not cached.
+CANVAS_MODULE_CACHE = SECURE_SETTINGS.get('canvas_module_cache', None)